@@ -1,3 +1,6 @@
+import importlib
+import logging
+
 from flask import Flask
 from flask_cors import CORS 
 # 1. Import your Blueprint objects
@@ -5,11 +8,48 @@ from routes.main_routes import main_bp
 from routes.blog_routes import blog_bp
 from routes.macro_routes import macro_bp
 from routes.bess_routes import bess_bp
+from routes.search_routes import search_bp
+from services import delivery, metrics
+from services.migrations import migrate
+
+# Each of these adds tens of MB and up to a second to a process that imports
+# it, and most requests never touch them, so the modules that use them import
+# them on first use through a small helper (_pandas(), _plotly(), _markdown())
+# rather than at the top. A preloading gunicorn master imports them up front
+# instead, so every worker shares the pages copy-on-write (gunicorn.conf.py).
+HEAVY_MODULES = ('pandas', 'plotly.graph_objects', 'plotly.io', 'markdown', 'numpy_financial')
+
+def preload_heavy_modules():
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+def use_gunicorn_logging():
+    """
+    Under gunicorn, the routes.* and services.* module loggers write to its
+    error log with its format and level; elsewhere their warnings reach
+    stderr through Python's last-resort handler.
+    """
+    gunicorn_error = logging.getLogger('gunicorn.error')
+    if not gunicorn_error.handlers:
+        return
+    for name in ('routes', 'services'):
+        logger = logging.getLogger(name)
+        logger.handlers = gunicorn_error.handlers
+        logger.setLevel(gunicorn_error.level)
+        logger.propagate = False
 
 def create_app():
     """Creates and configures the Flask application."""
     app = Flask(__name__)
+    use_gunicorn_logging()
     CORS(app) 
+    # Bring headlines.db up to the current schema (no-op once migrated)
+    migrate()
+    # Request timing, Server-Timing headers and GET /metrics
+    metrics.init_app(app)
+    # Hashed static URLs, immutable caching, gzip/brotli (registered after metrics so it is timed)
+    delivery.init_app(app)
+
     # 2. Register the main blueprint
     app.register_blueprint(main_bp)
 
@@ -19,6 +59,8 @@ def create_app():
 
     app.register_blueprint(bess_bp, url_prefix='/bess')
 
+    app.register_blueprint(search_bp, url_prefix='/search')
+
     return app
 
 if __name__ == '__main__':
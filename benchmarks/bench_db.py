@@ -0,0 +1,109 @@
+# runtimes_app/benchmarks/bench_db.py
+# Concurrent read/write stress test: request-style readers against a scraper-style writer,
+# comparing connect-per-request in rollback-journal mode with the pooled WAL layer in services/db.py.
+# Run from the repo root: python -m benchmarks.bench_db [--readers 8] [--seconds 5]
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from services import db
+
+READ_QUERIES = (
+    "SELECT * FROM reuters_headlines_summary ORDER BY timestamp DESC LIMIT 1",
+    "SELECT * FROM reuters_headlines ORDER BY timestamp DESC LIMIT 5",
+)
+WRITE_BATCH = 5000
+
+
+def legacy_read(path):
+    conn = sqlite3.connect(path)
+    for sql in READ_QUERIES:
+        conn.execute(sql).fetchall()
+    conn.close()
+
+
+def legacy_write(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO reuters_headlines(timestamp, news) VALUES(?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def run(mode, path, readers, seconds):
+    if mode == 'pooled':
+        read_pool = db.ConnectionPool(path, readonly=True, size=readers)
+        write_conn = db.connect(path)
+
+        def read():
+            with read_pool.connection() as conn:
+                for sql in READ_QUERIES:
+                    conn.execute(sql).fetchall()
+
+        def write(rows):
+            write_conn.execute('BEGIN IMMEDIATE')
+            write_conn.executemany("INSERT INTO reuters_headlines(timestamp, news) VALUES(?, ?)", rows)
+            write_conn.commit()
+    else:
+        read = lambda: legacy_read(path)
+        write = lambda rows: legacy_write(path, rows)
+
+    stop = time.perf_counter() + seconds
+    latencies, errors, writes = [], [0], [0]
+    lock = threading.Lock()
+
+    def reader():
+        local = []
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                read()
+                local.append(time.perf_counter() - start)
+            except sqlite3.OperationalError:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    def writer():
+        n = 0
+        while time.perf_counter() < stop:
+            rows = [(time.strftime('%Y-%m-%d %H:%M:%S'), f"stress headline {n}-{i}") for i in range(WRITE_BATCH)]
+            try:
+                write(rows)
+                writes[0] += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    errors[0] += 1
+            n += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+
+    lat = np.array(latencies) * 1000
+    print(f"{mode:<8} reads/s {len(lat) / seconds:9.0f}  p50 {np.percentile(lat, 50):7.2f} ms  "
+          f"p95 {np.percentile(lat, 95):7.2f} ms  p99 {np.percentile(lat, 99):7.2f} ms  "
+          f"write batches {writes[0]:4d}  lock errors {errors[0]}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('legacy', 'pooled'):
+            path = os.path.join(tmp, f'{mode}.db')
+            shutil.copy(db.DB_FILE, path)
+            conn = sqlite3.connect(path)
+            conn.execute('PRAGMA journal_mode = DELETE') # the repo file may already be WAL
+            conn.close()
+            run(mode, path, args.readers, args.seconds)
@@ -0,0 +1,96 @@
+# runtimes_app/benchmarks/bench_delivery.py
+# Bytes on the wire for the main pages: the HTML plus every same-origin
+# /static/ asset it references, with no compression, gzip and (if the Brotli
+# package is installed) brotli, on a first visit and on a repeat visit
+# (immutable assets come from the browser cache, the page revalidates).
+# Load time is modelled for a slow link: two round trips (page, then its
+# assets in parallel) plus transfer time. Cross-origin scripts are listed
+# but not counted.
+# Run from the repo root: python -m benchmarks.bench_delivery [--mbps 10] [--rtt-ms 60]
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.stub_upstream import StubUpstream
+
+PAGES = ('/', '/macro/', '/blog/')
+_ASSET = re.compile(r'(?:src|href)="((?:https?:)?//[^"]+\.(?:js|css)|/static/[^"]+)"')
+
+
+def wire_bytes(client, url, encoding, etag=None):
+    headers = {'Accept-Encoding': encoding}
+    if etag:
+        headers['If-None-Match'] = etag
+    response = client.get(url, headers=headers)
+    return response, len(response.data)
+
+
+def measure(client, page, encoding, mbps, rtt_ms):
+    response, page_bytes = wire_bytes(client, page, encoding)
+    html = client.get(page).get_data(as_text=True) # identity, for the asset links
+    local = [url for url in _ASSET.findall(html) if url.startswith('/static/')]
+    external = [url for url in _ASSET.findall(html) if not url.startswith('/static/')]
+    asset_bytes = sum(wire_bytes(client, url, encoding)[1] for url in local)
+
+    # Repeat visit: the page revalidates; hashed assets are fresh in the cache
+    etag = response.headers.get('ETag')
+    _, repeat_bytes = wire_bytes(client, page, encoding, etag)
+    cached = all('immutable' in client.get(url).headers.get('Cache-Control', '') for url in local)
+    if not cached:
+        repeat_bytes += asset_bytes
+
+    def model_ms(n_bytes, round_trips):
+        return round_trips * rtt_ms + n_bytes * 8 / (mbps * 1e6) * 1000
+
+    first = page_bytes + asset_bytes
+    return {'page': page_bytes, 'assets': asset_bytes, 'first': first, 'repeat': repeat_bytes,
+            'first_ms': model_ms(first, 2 if local else 1), 'repeat_ms': model_ms(repeat_bytes, 1),
+            'external': external}
+
+
+def compression_cost(client, page, encoding, runs=20):
+    client.get(page, headers={'Accept-Encoding': encoding}) # warm caches
+    start = time.perf_counter()
+    for _ in range(runs):
+        client.get(page, headers={'Accept-Encoding': encoding})
+    return (time.perf_counter() - start) / runs * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mbps', type=float, default=10, help='modelled link bandwidth')
+    parser.add_argument('--rtt-ms', type=float, default=60, help='modelled round-trip time')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='runtimes-bench-')
+    try:
+        with StubUpstream(latency_ms=1) as stub:
+            os.environ.update(DB_FILE=os.path.join(tmp, 'headlines.db'), **stub.env())
+            if 'services.db' in sys.modules:
+                raise RuntimeError("services.db was imported before the benchmark environment was set")
+            from benchmarks.generate_db import generate
+            from app import create_app
+            from services import delivery
+
+            generate(os.environ['DB_FILE'], 1000, 50)
+            client = create_app().test_client()
+            encodings = ['identity', 'gzip'] + (['br'] if delivery.brotli is not None else [])
+            print(f"Modelled link: {args.mbps:g} Mbit/s, {args.rtt_ms:g} ms RTT")
+            for page in PAGES:
+                print(page)
+                for encoding in encodings:
+                    m = measure(client, page, encoding, args.mbps, args.rtt_ms)
+                    print(f"  {encoding:<9} page {m['page'] / 1024:8.1f} KB   assets {m['assets'] / 1024:8.1f} KB   "
+                          f"first visit {m['first'] / 1024:8.1f} KB {m['first_ms']:7.0f} ms   "
+                          f"repeat {m['repeat'] / 1024:7.1f} KB {m['repeat_ms']:5.0f} ms")
+                for encoding in encodings:
+                    print(f"  server time with {encoding}: {compression_cost(client, page, encoding):.2f} ms")
+                if m['external']:
+                    print(f"  cross-origin, not counted: {', '.join(m['external'])}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,66 @@
+# runtimes_app/benchmarks/bench_headline_queries.py
+# Dashboard / scraper headline queries on a synthetic multi-million-row table,
+# before (no indexes, DATE() filter) and after the services/migrations.py schema.
+# Run from the repo root: python -m benchmarks.bench_headline_queries [--rows 2000000]
+
+import argparse
+import datetime
+import os
+import sqlite3
+import tempfile
+import timeit
+
+from services import db
+from services.headlines import day_bounds
+from services.migrations import migrate
+
+QUERIES = {
+    'latest 5 headlines': ("SELECT * FROM reuters_headlines ORDER BY timestamp DESC LIMIT 5", ()),
+    'latest summary': ("SELECT * FROM reuters_headlines_summary ORDER BY timestamp DESC LIMIT 1", ()),
+}
+LEGACY_TODAY = "SELECT * FROM reuters_headlines WHERE DATE(timestamp) = DATE('now', 'localtime')"
+RANGE_TODAY = "SELECT * FROM reuters_headlines WHERE timestamp >= ? AND timestamp < ?"
+
+
+def build(path, rows):
+    """rows headlines spread over the last year, plus one summary per scraper run."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE reuters_headlines (timestamp TEXT, news TEXT)")
+    conn.execute("CREATE TABLE reuters_headlines_summary (timestamp TEXT, news TEXT)")
+    start = datetime.datetime.now() - datetime.timedelta(days=365)
+    step = 365 * 86400 / rows
+    conn.executemany("INSERT INTO reuters_headlines VALUES (?, ?)",
+                     ((f"{start + datetime.timedelta(seconds=i * step):%Y-%m-%d %H:%M:%S}.000000", f"Synthetic headline number {i}")
+                      for i in range(rows)))
+    conn.executemany("INSERT INTO reuters_headlines_summary VALUES (?, ?)",
+                     ((f"{start + datetime.timedelta(hours=h):%Y-%m-%d %H:%M:%S}", f"Summary {h}") for h in range(0, 365 * 24, 4)))
+    conn.commit()
+    conn.close()
+
+
+def time_queries(conn, label, today_sql, today_params):
+    queries = dict(QUERIES, **{"today's headlines": (today_sql, today_params)})
+    for name, (sql, params) in queries.items():
+        n = 20
+        seconds = timeit.timeit(lambda: conn.execute(sql, params).fetchall(), number=n) / n
+        print(f"{label:<9} {name:<20} {seconds * 1000:10.3f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        build(path, args.rows)
+        print(f"{args.rows:,} synthetic headlines")
+
+        conn = sqlite3.connect(path)
+        time_queries(conn, 'legacy', LEGACY_TODAY, ())
+        conn.close()
+
+        migrate(path)
+        conn = db.connect(path)
+        time_queries(conn, 'migrated', RANGE_TODAY, day_bounds())
+        conn.close()
@@ -0,0 +1,48 @@
+# runtimes_app/benchmarks/bench_irr.py
+# Compares the per-prefix npf.irr loop with the vectorized engine in services/irr.py.
+# Run from the repo root: python -m benchmarks.bench_irr
+
+import timeit
+
+import numpy as np
+import numpy_financial as npf
+
+from services.irr import prefix_irr
+
+
+def legacy_prefix_irr(cash_flows):
+    """The original loop from calculate_bess_financials (one polynomial solve per prefix)."""
+    out = []
+    for i in range(len(cash_flows)):
+        try:
+            current_irr = npf.irr(cash_flows[:i + 1])
+            out.append(0 if np.isinf(current_irr) or np.isnan(current_irr) or current_irr < 0 else current_irr)
+        except ValueError:
+            out.append(0)
+    return np.array(out)
+
+
+def engine_prefix_irr(cash_flows):
+    raw = prefix_irr(cash_flows)
+    return np.where(np.isfinite(raw) & (raw >= 0), raw, 0)
+
+
+def base_case_cash_flows(asset_life):
+    """Base-case BESS cash flow: CAPEX in year 0, degrading arbitrage net of escalating OPEX."""
+    years = np.arange(asset_life + 1)
+    arbitrage = 10 * 4 * 1.15 * 0.9 * 0.9 * 365 * 0.98 * (139 - 30 / 0.9) / 1000 * 0.98 ** years
+    opex = 15 * 10 * 1.025 ** years
+    cash_flows = arbitrage - opex
+    cash_flows[0] = -(105 + 70) * 10 * 4 * 1.15
+    return cash_flows
+
+
+if __name__ == '__main__':
+    for asset_life in (15, 25, 50):
+        cf = base_case_cash_flows(asset_life)
+        max_err = np.abs(legacy_prefix_irr(cf) - engine_prefix_irr(cf)).max()
+        n = 50
+        legacy = timeit.timeit(lambda: legacy_prefix_irr(cf), number=n) / n
+        engine = timeit.timeit(lambda: engine_prefix_irr(cf), number=n) / n
+        print(f"asset_life={asset_life:>3}  legacy {legacy * 1e3:8.3f} ms  engine {engine * 1e3:8.3f} ms  "
+              f"speedup {legacy / engine:6.1f}x  max |diff| {max_err:.2e}")
@@ -0,0 +1,62 @@
+# runtimes_app/benchmarks/bench_metrics_overhead.py
+# Cost of the instrumentation in services/metrics.py: per SQLite statement
+# (InstrumentedCursor vs a plain connection), per histogram observation, and
+# per request (a trivial Flask route with and without metrics.init_app).
+# Run from the repo root: python -m benchmarks.bench_metrics_overhead [--n 100000]
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import timeit
+
+from flask import Flask
+
+from services import db, metrics
+
+
+def per_call(label, fn, n):
+    seconds = min(timeit.repeat(fn, number=n, repeat=3)) / n
+    print(f"{label:<42} {seconds * 1e6:8.2f} us")
+    return seconds
+
+
+def bench_queries(path, n):
+    plain = sqlite3.connect(path)
+    instrumented = db.connect(path)
+    for conn in (plain, instrumented):
+        conn.execute("CREATE TABLE IF NOT EXISTS t (k INTEGER PRIMARY KEY, v TEXT)")
+        conn.execute("INSERT OR IGNORE INTO t VALUES (1, 'x')")
+        conn.commit()
+    sql = "SELECT v FROM t WHERE k = ?"
+    a = per_call('plain sqlite3 point query', lambda: plain.execute(sql, (1,)).fetchone(), n)
+    b = per_call('instrumented point query', lambda: instrumented.execute(sql, (1,)).fetchone(), n)
+    print(f"{'  overhead per statement':<42} {(b - a) * 1e6:8.2f} us")
+
+
+def bench_requests(n):
+    def make(instrumented):
+        app = Flask(__name__)
+        if instrumented:
+            metrics.init_app(app)
+
+        @app.route('/ping')
+        def ping():
+            return 'ok'
+        return app.test_client()
+
+    plain, instrumented = make(False), make(True)
+    a = per_call('request, no instrumentation', lambda: plain.get('/ping'), n)
+    b = per_call('request, metrics.init_app', lambda: instrumented.get('/ping'), n)
+    print(f"{'  overhead per request':<42} {(b - a) * 1e6:8.2f} us")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, default=100_000)
+    args = parser.parse_args()
+
+    per_call('Histogram.observe', lambda: metrics.sqlite_seconds.observe(0.0001), args.n)
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_queries(os.path.join(tmp, 'bench.db'), args.n)
+    bench_requests(max(1, args.n // 20))
@@ -0,0 +1,123 @@
+# runtimes_app/benchmarks/bench_search.py
+# Full-text search on a synthetic corpus: headlines drawn from a Zipf-like
+# vocabulary, spread over several years, inserted through the sync triggers.
+# Reports indexing throughput, index size, a full rebuild, and per-query
+# latency (p50/p95) for common, rare, multi-word, phrase, prefix, date-range,
+# newest-first and deep-page searches.
+# Run from the repo root: python -m benchmarks.bench_search [--rows 1000000] [--keep /tmp/search.db]
+
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from services import db
+from services.headlines import headline_hash
+from services.migrations import HEADLINE_TABLES, migrate
+from services.search import fts_query, rebuild, search
+
+VOCABULARY = 20_000
+WORDS_PER_HEADLINE = 10
+SYLLABLES = ('ka', 'lo', 'mi', 'ra', 'te', 'su', 'no', 've', 'di', 'po', 'an', 'el', 'or', 'ub', 'is', 'zen')
+
+
+def vocabulary(n=VOCABULARY):
+    """n distinct pronounceable words, most frequent first, with a few real ones mixed in."""
+    real = ['fed', 'rates', 'oil', 'stocks', 'tariffs', 'nvidia', 'china', 'inflation', 'earnings', 'dollar']
+    words = []
+    for i in range(n - len(real)):
+        word, k = '', i + 16
+        while k:
+            k, r = divmod(k, len(SYLLABLES))
+            word += SYLLABLES[r]
+        words.append(word)
+    # fed/rates/oil/... land at ranks 5, 50, 500, ... so they span common to rare
+    for rank, word in zip((5, 20, 50, 120, 300, 700, 1500, 3000, 6000, 12000), real):
+        words.insert(rank, word)
+    return words[:n]
+
+
+def build_corpus(path, rows, days=3 * 365):
+    words = np.array(vocabulary())
+    weights = 1 / np.arange(1, len(words) + 1)
+    weights /= weights.sum()
+    rng = np.random.default_rng(7)
+    now = datetime.datetime(2025, 6, 30)
+    migrate(path)
+    conn = db.connect(path)
+    start = time.perf_counter()
+    per_table = rows // len(HEADLINE_TABLES)
+    for table in HEADLINE_TABLES:
+        for offset in range(0, per_table, 100_000):
+            n = min(100_000, per_table - offset)
+            picks = words[rng.choice(len(words), size=(n, WORDS_PER_HEADLINE), p=weights)]
+            ages = np.sort(rng.uniform(0, days * 86400, n))[::-1] # oldest first, as scraped
+            batch = []
+            for i in range(n):
+                news = f"{' '.join(picks[i])} #{offset + i}"
+                timestamp = (now - datetime.timedelta(seconds=float(ages[i]))).strftime('%Y-%m-%d %H:%M:%S')
+                batch.append((timestamp, news, headline_hash(news)))
+            with conn:
+                conn.executemany(f"INSERT INTO {table}(timestamp, news, news_hash) VALUES (?, ?, ?)", batch)
+    seconds = time.perf_counter() - start
+    conn.close()
+    return seconds
+
+
+def index_size_mb(conn):
+    pages = conn.execute("SELECT sum(pgsize) FROM dbstat WHERE name LIKE 'search_index%'").fetchone()[0]
+    return (pages or 0) / 1e6
+
+
+QUERIES = [
+    ('common word', dict(text='fed')),
+    ('mid word', dict(text='tariffs')),
+    ('rare word', dict(text='earnings')),
+    ('two words', dict(text='fed rates')),
+    ('phrase', dict(text='"fed rates"')),
+    ('prefix', dict(text='infla*')),
+    ('common, last 30 days', dict(text='fed', start=datetime.date(2025, 6, 1), end=datetime.date(2025, 6, 30))),
+    ('common, newest first', dict(text='fed', sort='newest')),
+    ('two words, page 10', dict(text='fed rates', page=10)),
+]
+
+
+def bench_queries(conn, runs=30):
+    for name, kwargs in QUERIES:
+        search(conn, **kwargs) # warm the page cache
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            results, _, _ = search(conn, **kwargs)
+            samples.append(time.perf_counter() - start)
+        matches = conn.execute("SELECT count(*) FROM search_index WHERE search_index MATCH ?", (fts_query(kwargs['text']),)).fetchone()[0]
+        p50, p95 = np.percentile(samples, (50, 95)) * 1000
+        print(f"  {name:<24} {matches:>9} matches   p50 {p50:7.2f} ms   p95 {p95:7.2f} ms   {len(results)} shown")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2_000_000, help='headlines in total, split across the sources')
+    parser.add_argument('--keep', metavar='PATH', help='build the corpus at PATH and keep it (reused if it exists)')
+    parser.add_argument('--skip-rebuild', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.keep or os.path.join(tmp, 'search.db')
+        if not os.path.exists(path):
+            seconds = build_corpus(path, args.rows)
+            print(f"Inserted {args.rows} headlines through the triggers in {seconds:.1f}s ({args.rows / seconds:,.0f} rows/s)")
+        conn = db.connect(path)
+        total = conn.execute("SELECT count(*) FROM search_index").fetchone()[0]
+        print(f"Index: {total} rows, {index_size_mb(conn):.0f} MB")
+        if not args.skip_rebuild:
+            start = time.perf_counter()
+            with conn:
+                rebuild(conn)
+            print(f"Rebuild: {time.perf_counter() - start:.1f}s")
+        print("Queries (first page of 20, snippets included):")
+        bench_queries(conn)
+        conn.close()
@@ -0,0 +1,145 @@
+# runtimes_app/benchmarks/bench_serving.py
+# Throughput and tail latency of the gunicorn serving profiles (sync, gthread,
+# gevent; see gunicorn.conf.py) on the I/O-bound routes: the dashboard, a
+# cold /get_stock (every call misses the cache and waits on the upstream) and
+# the macro page. The stub upstream runs in its own process with a realistic
+# per-call latency, and the load comes from one asyncio client holding
+# keep-alive connections, so the client isn't the bottleneck at 500.
+# Run from the repo root:
+#   python -m benchmarks.bench_serving [--profiles sync,gthread,gevent] [--concurrency 10,100,500] [--seconds 10]
+
+import argparse
+import asyncio
+import itertools
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.stub_upstream import stub_env
+from benchmarks.suite import ROOT_DIR, _free_port, _worker_memory_mb, percentiles
+
+MIX = ('/?ticker=NVDA', '/get_stock?ticker=COLD{i}', '/macro/')
+REQUEST_TIMEOUT_S = 60
+
+
+async def _get(reader, writer, path):
+    """One GET on an open connection; returns (status code, whether the server keeps it open)."""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nAccept-Encoding: gzip\r\n\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode('latin-1').split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {k.lower(): v.strip() for k, _, v in (line.partition(':') for line in lines[1:] if line)}
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') != 'close' # the sync worker closes after every response
+
+
+async def _client(port, stop, counter, samples, errors):
+    connection = None
+    while time.perf_counter() < stop:
+        n = next(counter)
+        path = MIX[n % len(MIX)].format(i=n)
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection('127.0.0.1', port)
+            status, keep_alive = await asyncio.wait_for(_get(*connection, path), REQUEST_TIMEOUT_S)
+            if not keep_alive:
+                connection[1].close()
+                connection = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            if connection is not None:
+                connection[1].close()
+            connection, status = None, None
+        if status == 200:
+            samples.append(time.perf_counter() - start)
+        else:
+            errors.append(status)
+    if connection is not None:
+        connection[1].close()
+
+
+async def _load(port, concurrency, seconds):
+    start = time.perf_counter()
+    counter, samples, errors = itertools.count(), [], []
+    await asyncio.gather(*(_client(port, start + seconds, counter, samples, errors) for _ in range(concurrency)))
+    return samples, errors, time.perf_counter() - start # includes draining the requests still in flight
+
+
+def run_profile(profile, concurrencies, seconds, env):
+    port = _free_port()
+    server = subprocess.Popen(['gunicorn', 'app:create_app()', '--bind', f'127.0.0.1:{port}', '--log-level', 'error',
+                               '--backlog', '2048', '--timeout', str(REQUEST_TIMEOUT_S)],
+                              cwd=ROOT_DIR, env=dict(env, GUNICORN_PROFILE=profile))
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                requests.get(f"http://127.0.0.1:{port}/macro/", timeout=10)
+                break
+            except requests.RequestException: # still booting
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError(f"gunicorn ({profile}) did not start")
+                time.sleep(0.2)
+        for path in MIX: # first renders and cache fills out of the way
+            for i in range(4):
+                requests.get(f"http://127.0.0.1:{port}{path.format(i=f'WARM{i}')}", timeout=REQUEST_TIMEOUT_S)
+
+        results = {}
+        for concurrency in concurrencies:
+            samples, errors, elapsed = asyncio.run(_load(port, concurrency, seconds))
+            stats = percentiles(samples) if samples else {'p50_ms': float('nan'), 'p99_ms': float('nan')}
+            results[concurrency] = dict(stats, rps=round(len(samples) / elapsed, 1), errors=len(errors))
+            print(f"  {profile:<8} {concurrency:>4} clients: {results[concurrency]['rps']:8.1f} req/s   "
+                  f"p50 {stats['p50_ms']:8.1f} ms   p99 {stats['p99_ms']:8.1f} ms   errors {len(errors)}", flush=True)
+        results['memory'] = _worker_memory_mb(server.pid)
+        return results
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', default='sync,gthread,gevent')
+    parser.add_argument('--concurrency', default='10,100,500')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--upstream-latency-ms', type=float, default=100)
+    args = parser.parse_args()
+    if shutil.which('gunicorn') is None:
+        sys.exit("gunicorn is not installed")
+
+    tmp = tempfile.mkdtemp(prefix='runtimes-bench-')
+    stub_port = _free_port()
+    stub = subprocess.Popen([sys.executable, '-m', 'benchmarks.stub_upstream', '--port', str(stub_port),
+                             '--latency-ms', str(args.upstream_latency_ms)], cwd=ROOT_DIR, stdout=subprocess.DEVNULL)
+    try:
+        env = dict(os.environ, DB_FILE=os.path.join(tmp, 'headlines.db'), WEB_CONCURRENCY=str(args.workers),
+                   **stub_env(f"http://127.0.0.1:{stub_port}"))
+        os.environ.update(env)
+        from benchmarks.generate_db import generate
+        generate(env['DB_FILE'], 10_000, 100)
+
+        concurrencies = [int(c) for c in args.concurrency.split(',')]
+        print(f"{args.workers} workers, upstream latency {args.upstream_latency_ms:g} ms, {args.seconds:g}s per run, "
+              f"mix {', '.join(MIX)}")
+        for profile in args.profiles.split(','):
+            run_profile(profile, concurrencies, args.seconds, env)
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+        shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,101 @@
+# runtimes_app/benchmarks/bench_startup.py
+# Worker boot cost: wall time and RSS to import app and run create_app() in a
+# fresh interpreter, which heavy modules got imported, and per-worker memory
+# of a running gunicorn (gunicorn.conf.py) with and without preload_app (PSS
+# counts pages shared copy-on-write with the master only fractionally).
+# Run from the repo root: python -m benchmarks.bench_startup [--runs 5] [--workers 4]
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('pandas', 'plotly', 'numpy_financial', 'openai', 'markdown', 'scipy')
+CHILD = f"""
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+app.create_app()
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  'heavy': sorted(m for m in {HEAVY!r} if m in sys.modules)}}))
+"""
+
+
+def import_startup(env, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    seconds = [s['seconds'] for s in samples]
+    rss = [s['max_rss_mb'] for s in samples]
+    print(f"import app + create_app(): median {np.median(seconds) * 1000:7.0f} ms  (min {min(seconds) * 1000:.0f})  "
+          f"RSS {np.median(rss):6.1f} MB  heavy modules loaded: {', '.join(samples[-1]['heavy']) or 'none'}")
+
+
+def _smaps(pid):
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        fields = dict(line.split(':', 1) for line in f if ':' in line)
+    kb = lambda name: int(fields[name].split()[0]) / 1024
+    return kb('Rss'), kb('Pss'), kb('Private_Clean') + kb('Private_Dirty')
+
+
+def gunicorn_memory(env, workers, preload):
+    if shutil.which('gunicorn') is None:
+        print("gunicorn not installed; skipping")
+        return
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    cmd = ['gunicorn', 'app:create_app()', '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning']
+    start = time.perf_counter()
+    server = subprocess.Popen(cmd, cwd=ROOT_DIR, env=dict(env, GUNICORN_PRELOAD='1' if preload else '0'))
+    try:
+        while True:
+            try:
+                requests.get(f"http://127.0.0.1:{port}/blog/", timeout=5)
+                break
+            except requests.RequestException:
+                if server.poll() is not None:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.05)
+        ready = time.perf_counter() - start
+        for path in ('/', '/macro/', '/blog/'): # touch every blueprint in every worker
+            for _ in range(workers * 3):
+                requests.get(f"http://127.0.0.1:{port}{path}", timeout=30)
+        with open(f"/proc/{server.pid}/task/{server.pid}/children") as f:
+            pids = [int(pid) for pid in f.read().split()]
+        usage = np.array([_smaps(pid) for pid in pids])
+        master = _smaps(server.pid)
+        label = 'preload' if preload else 'no preload'
+        print(f"gunicorn {workers} workers, {label:<14}: first response {ready * 1000:6.0f} ms  master RSS {master[0]:6.1f} MB  "
+              f"per worker RSS {usage[:, 0].mean():6.1f} MB  PSS {usage[:, 1].mean():6.1f} MB  private {usage[:, 2].mean():6.1f} MB  "
+              f"total PSS {usage[:, 1].sum() + master[1]:7.1f} MB")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'headlines.db')
+        shutil.copy(os.path.join(ROOT_DIR, 'headlines.db'), db_file)
+        env = dict(os.environ, DB_FILE=db_file, API_KEY_TWELVEDATA='stub', TWELVEDATA_API_URL='http://127.0.0.1:9/twelvedata')
+        import_startup(env, args.runs)
+        for preload in (False, True):
+            gunicorn_memory(env, args.workers, preload)
@@ -0,0 +1,73 @@
+# runtimes_app/benchmarks/bench_stock_payload.py
+# Response size and build time for one ticker's chart: the old /get_stock body
+# (go.Figure -> PlotlyJSONEncoder -> json.loads -> jsonify, plus an HTML table)
+# against the columnar /get_stocks payload in JSON and base64 typed-array form.
+# Run from the repo root: python -m benchmarks.bench_stock_payload [--bars 365] [--symbols 10]
+
+import argparse
+import datetime
+import gzip
+import json
+import timeit
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+from plotly.utils import PlotlyJSONEncoder
+
+from services.columnar import encode_series
+
+
+def synthetic_bars(n, seed=0):
+    """Twelve Data-shaped bars, newest first, with string fields."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    today = datetime.date.today()
+    return [{'datetime': str(today - datetime.timedelta(days=i)), 'open': f"{c:.5f}", 'high': f"{c * 1.01:.5f}",
+             'low': f"{c * 0.99:.5f}", 'close': f"{c:.5f}", 'volume': str(int(rng.integers(1e6, 1e8)))}
+            for i, c in enumerate(close)]
+
+
+def legacy_body(ticker, values):
+    df = pd.DataFrame(values)
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    df.set_index('datetime', inplace=True)
+    df = df.astype(float)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=df.index, y=df['close'], mode='lines+markers'))
+    fig.update_layout(title=f'{ticker} Stock Price', xaxis_rangeslider_visible=False, yaxis_title="Close Price")
+    chart_data = json.loads(json.dumps(fig.to_dict(), cls=PlotlyJSONEncoder))
+    body = {'ticker': ticker, 'price_table': df[['close']].head(5).to_html(classes='table table-striped'),
+            'chart_data': {'data': chart_data['data'], 'layout': chart_data['layout']}}
+    return json.dumps(body)
+
+
+def columnar_body(series_values, encoding):
+    series = {symbol: encode_series(values, ('close',), '1day', encoding) for symbol, values in series_values.items()}
+    return json.dumps({'interval': '1day', 'encoding': encoding, 'fields': ['close'], 'series': series, 'missing': []})
+
+
+def report(label, build, n=50):
+    body = build().encode()
+    seconds = timeit.timeit(build, number=n) / n
+    print(f"{label:<34} {len(body):>10,} B  gzip {len(gzip.compress(body)):>9,} B  build {seconds * 1000:8.3f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=365)
+    parser.add_argument('--symbols', type=int, default=10)
+    args = parser.parse_args()
+
+    tickers = [f"T{i}" for i in range(args.symbols)]
+    data = {ticker: synthetic_bars(args.bars, seed=i) for i, ticker in enumerate(tickers)}
+
+    print(f"1 symbol, {args.bars} bars")
+    report('legacy /get_stock', lambda: legacy_body(tickers[0], data[tickers[0]]))
+    for encoding in ('json', 'base64'):
+        report(f'/get_stocks {encoding}', lambda: columnar_body({tickers[0]: data[tickers[0]]}, encoding))
+
+    print(f"\n{args.symbols} symbols, {args.bars} bars (legacy = one request per symbol)")
+    report(f'legacy /get_stock x{args.symbols}', lambda: "".join(legacy_body(t, data[t]) for t in tickers), n=10)
+    for encoding in ('json', 'base64'):
+        report(f'/get_stocks {encoding}', lambda: columnar_body(data, encoding), n=10)
@@ -0,0 +1,95 @@
+# runtimes_app/benchmarks/bench_upstream.py
+# The upstream client against the local stub with injected faults:
+#   healthy      latency of pooled keep-alive calls vs a new connection per call
+#   flaky        success rate with a share of 503s, with and without retries
+#   stalls       worst-case call time when some calls hang (read timeout)
+#   outage       every call fails: the circuit opens, callers get stale prices
+#                in microseconds, and one probe closes it after recovery
+#   quota        calls beyond the per-minute quota fail fast instead of queueing
+# Run from the repo root: python -m benchmarks.bench_upstream [--calls 200]
+
+import argparse
+import time
+
+import numpy as np
+import requests
+
+from benchmarks.stub_upstream import StubUpstream
+from services.price_cache import PriceCache
+from services.upstream import CircuitBreaker, RateLimiter, UpstreamClient, UpstreamError
+
+PARAMS = {'symbol': 'NVDA', 'interval': '1day', 'outputsize': 30, 'apikey': 'stub'}
+
+
+def timed_calls(call, n):
+    """(seconds per call, failures) for n calls."""
+    samples, failures = [], 0
+    for _ in range(n):
+        start = time.perf_counter()
+        try:
+            call()
+        except (UpstreamError, requests.RequestException):
+            failures += 1
+        samples.append(time.perf_counter() - start)
+    return np.array(samples), failures
+
+
+def report(name, samples, failures):
+    p50, p95, worst = np.percentile(samples, 50) * 1000, np.percentile(samples, 95) * 1000, samples.max() * 1000
+    print(f"  {name:<34} ok {len(samples) - failures:>4}/{len(samples):<4} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  max {worst:7.1f} ms")
+
+
+def client(stub, **kwargs):
+    kwargs.setdefault('breaker', CircuitBreaker(failures=10**9)) # no breaker unless a scenario wants one
+    return UpstreamClient('bench', f"{stub.url}/twelvedata", **kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=2)
+    args = parser.parse_args()
+    n = args.calls
+
+    with StubUpstream(latency_ms=args.latency_ms) as stub:
+        url = f"{stub.url}/twelvedata/time_series"
+        print(f"Stub latency {args.latency_ms:g} ms, {n} calls per case")
+
+        print("healthy")
+        report('requests.get (new connection)', *timed_calls(lambda: requests.get(url, params=PARAMS, timeout=10).json(), n))
+        pooled = client(stub)
+        report('UpstreamClient (keep-alive pool)', *timed_calls(lambda: pooled.get_json('/time_series', PARAMS), n))
+
+        print("flaky: 30% of calls answer 503")
+        stub.set_faults(error_rate=0.3)
+        report('no retries', *timed_calls(lambda: client(stub, retries=0).get_json('/time_series', PARAMS), n))
+        retrying = client(stub)
+        report(f'{retrying.retries} retries, jittered backoff', *timed_calls(lambda: retrying.get_json('/time_series', PARAMS), n))
+
+        print("stalls: 5% of calls hang for 3 s")
+        stub.set_faults(stall_rate=0.05, stall_ms=3000)
+        bounded = client(stub, read_timeout=0.25, retries=1)
+        report('read timeout 0.25 s, 1 retry', *timed_calls(lambda: bounded.get_json('/time_series', PARAMS), n // 4))
+
+        print("outage: every call fails, then the upstream recovers")
+        stub.set_faults(error_rate=1.0)
+        breaking = client(stub, breaker=CircuitBreaker(failures=5, cooldown=1.0), retries=1)
+        cache = PriceCache(lambda symbol, interval, outputsize: breaking.get_json('/time_series', PARAMS)['values'],
+                           stale_errors=(UpstreamError,))
+        stub.set_faults()
+        cache.get('NVDA') # warm, then expire the entry so every lookup refetches
+        cache._entries[('NVDA', '1day', 365)] = (0, *cache._entries[('NVDA', '1day', 365)][1:])
+        stub.set_faults(error_rate=1.0)
+        samples, _ = timed_calls(lambda: cache.get('NVDA') or None, n)
+        stats = breaking.stats()
+        print(f"  {n} price lookups: {stats['failures']} failed upstream calls, {stats['rejected']} skipped by the open circuit, "
+              f"{cache.stats()['stale']} served stale; p50 {np.percentile(samples, 50) * 1e6:.0f} us, max {samples.max() * 1000:.0f} ms")
+        stub.set_faults()
+        time.sleep(1.0)
+        breaking.get_json('/time_series', PARAMS)
+        print(f"  after recovery and the 1 s cooldown, one probe closes the circuit: {breaking.stats()['circuit']}")
+
+        print("quota: 8 credits a minute")
+        limited = client(stub, limiter=RateLimiter(8))
+        samples, failures = timed_calls(lambda: limited.get_json('/time_series', PARAMS, max_wait=0), 20)
+        print(f"  20 calls: {20 - failures} sent, {failures} refused locally (max {samples.max() * 1000:.1f} ms)")
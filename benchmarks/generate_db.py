@@ -0,0 +1,69 @@
+# runtimes_app/benchmarks/generate_db.py
+# Builds a fully migrated headlines.db of configurable size: headlines and
+# summaries for every source, blog posts, and the FRED CPI tables filled from
+# the stub's deterministic series.
+# Run from the repo root: python -m benchmarks.generate_db out.db [--headlines 100000] [--posts 500]
+
+import argparse
+import datetime
+
+import pandas as pd
+
+from benchmarks.stub_upstream import FRED_LAST_UPDATED, fred_observations
+from services import db
+from services.data_versions import FRED, HEADLINES, POSTS, bump
+from services.headlines import headline_hash
+from services.migrations import HEADLINE_TABLES, migrate
+from services.posts import render_post
+
+import scrape_fred
+
+WORDS = ('stocks rally as fed signals patience on rates while oil slips and the dollar firms ahead of '
+         'payrolls; chipmakers lead gains, treasury yields ease, china data beats forecasts').split()
+
+
+def _sentence(i, n=12):
+    return ' '.join(WORDS[(i * 7 + k * 3) % len(WORDS)] for k in range(n)).capitalize() + f" ({i})"
+
+
+def generate(path, headlines=100_000, posts=500, days=365):
+    """headlines rows per source spread over days (the newest ones today), plus summaries and posts."""
+    migrate(path)
+    conn = db.connect(path)
+    now = datetime.datetime.now().replace(microsecond=0)
+    step = days * 86400 / max(1, headlines)
+    with conn:
+        for table in HEADLINE_TABLES:
+            rows = ((f"{now - datetime.timedelta(seconds=i * step)}", f"{table[:6]}: {_sentence(i)}") for i in range(headlines))
+            conn.executemany(f"INSERT OR IGNORE INTO {table}(timestamp, news, news_hash) VALUES (?, ?, ?)",
+                             ((timestamp, news, headline_hash(news)) for timestamp, news in rows))
+            conn.executemany(f"INSERT INTO {table}_summary VALUES (?, ?)",
+                             ((f"{now - datetime.timedelta(hours=h)}", _sentence(h, 60)) for h in range(0, days * 24, 4)))
+
+        bodies = ('\n\n'.join(_sentence(i + k, 40) for k in range(8)) for i in range(posts))
+        conn.executemany("INSERT INTO posts (title, content, excerpt, content_md, timestamp) VALUES (?, ?, ?, ?, ?)",
+                         ((f"Post {i}: {_sentence(i, 6)}", *render_post(body), body, f"{now - datetime.timedelta(days=i)}")
+                          for i, body in enumerate(bodies)))
+
+        names = list(scrape_fred.tickers.values())
+        scrape_fred.ensure_columns(conn, names)
+        for series_id, name in scrape_fred.tickers.items():
+            series = scrape_fred.parse_observations(fred_observations(series_id)['observations'], name)
+            scrape_fred.upsert_series(conn, name, series)
+            conn.execute('INSERT OR REPLACE INTO fred_cpi_update_time VALUES (?, ?)', (name, str(pd.Timestamp(FRED_LAST_UPDATED))))
+        bump(conn, HEADLINES)
+        bump(conn, FRED)
+        bump(conn, POSTS)
+    conn.execute('PRAGMA optimize')
+    conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--headlines', type=int, default=100_000, help='rows per headline source')
+    parser.add_argument('--posts', type=int, default=500)
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+    generate(args.path, args.headlines, args.posts, args.days)
+    print(f"Wrote {args.path}")
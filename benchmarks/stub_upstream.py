@@ -0,0 +1,163 @@
+# runtimes_app/benchmarks/stub_upstream.py
+# Local stand-in for Twelve Data, FRED and the OpenAI chat API, with a fixed
+# per-call latency, so benchmarks are reproducible and need no keys or network.
+# Faults can be injected: a share of calls answering 503, or stalling for
+# stall_ms before answering (set_faults() changes them while running).
+#   TWELVEDATA_API_URL=<url>/twelvedata  FRED_API_URL=<url>/fred  OPENAI_BASE_URL=<url>/v1
+# Run standalone: python -m benchmarks.stub_upstream [--port 8001] [--latency-ms 20] [--error-rate 0.2]
+#   [--stall-rate 0.1 --stall-ms 5000]
+
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+FRED_LAST_UPDATED = '2025-06-11 07:47:02-05'
+FRED_START = datetime.date(1947, 1, 1)
+
+
+def _rng(key):
+    return np.random.default_rng(zlib.crc32(key.encode()))
+
+
+def time_series(symbol, outputsize):
+    """Deterministic daily bars for symbol, newest first, Twelve Data-shaped."""
+    if symbol.startswith('INVALID'):
+        return {'code': 400, 'message': f'**symbol** {symbol} is invalid', 'status': 'error'}
+    close = 100 * np.exp(np.cumsum(_rng(symbol).normal(0, 0.02, outputsize)))
+    today = datetime.date.today()
+    values = [{'datetime': str(today - datetime.timedelta(days=i)), 'open': f"{c:.5f}", 'high': f"{c * 1.01:.5f}",
+               'low': f"{c * 0.99:.5f}", 'close': f"{c:.5f}", 'volume': '1000000'} for i, c in enumerate(close)]
+    return {'meta': {'symbol': symbol, 'interval': '1day'}, 'values': values, 'status': 'ok'}
+
+
+def fred_observations(series_id, start=None):
+    months = (datetime.date.today().year - FRED_START.year) * 12
+    values = 20 * np.exp(np.cumsum(_rng(series_id).normal(0.003, 0.002, months)))
+    observations = []
+    for i, value in enumerate(values):
+        date = datetime.date(FRED_START.year + i // 12, i % 12 + 1, 1)
+        if start is None or str(date) >= start:
+            observations.append({'date': str(date), 'value': f"{value:.3f}"})
+    return {'observations': observations}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    stall_rate = 0.0
+    stall = 0.0
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True # headers and body go out as separate writes; don't stall keep-alive clients on delayed ACKs
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError): # the client timed out during a stall
+            self.close_connection = True
+
+    def _fault(self):
+        """Applies the configured latency and faults; True if the call was answered with an error."""
+        time.sleep(self.latency)
+        if random.random() < self.stall_rate:
+            time.sleep(self.stall)
+        if random.random() < self.error_rate:
+            self._send({'error': 'injected fault'}, 503)
+            return True
+        return False
+
+    def do_GET(self):
+        if self._fault():
+            return
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == '/twelvedata/time_series':
+            symbols = query['symbol'].split(',')
+            outputsize = int(query.get('outputsize', 30))
+            if len(symbols) == 1:
+                return self._send(time_series(symbols[0], outputsize))
+            return self._send({symbol: time_series(symbol, outputsize) for symbol in symbols})
+        if url.path == '/twelvedata/price':
+            symbols = query['symbol'].split(',')
+            prices = {symbol: {'price': f"{100 + zlib.crc32(symbol.encode()) % 900 + time.time() % 1:.4f}"} for symbol in symbols}
+            return self._send(prices[symbols[0]] if len(symbols) == 1 else prices)
+        if url.path == '/fred/series':
+            return self._send({'seriess': [{'id': query['series_id'], 'last_updated': FRED_LAST_UPDATED}]})
+        if url.path == '/fred/series/observations':
+            return self._send(fred_observations(query['series_id'], query.get('observation_start')))
+        self._send({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self._fault():
+            return
+        if urlparse(self.path).path == '/v1/chat/completions':
+            return self._send({'id': 'stub', 'object': 'chat.completion', 'created': int(time.time()), 'model': 'stub',
+                               'choices': [{'index': 0, 'finish_reason': 'stop',
+                                            'message': {'role': 'assistant', 'content': 'Stub summary of the headlines.'}}],
+                               'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}})
+        self._send({'error': 'not found'}, 404)
+
+
+def stub_env(url):
+    """Environment pointing the app and scrapers at a stub running at url."""
+    # The stub has no quota; lift the client-side rate limits so benchmarks measure the app
+    return {'TWELVEDATA_API_URL': f"{url}/twelvedata", 'FRED_API_URL': f"{url}/fred",
+            'OPENAI_BASE_URL': f"{url}/v1", 'API_KEY_TWELVEDATA': 'stub', 'API_KEY_FRED': 'stub',
+            'API_KEY_CHATGPT': 'stub', 'TWELVEDATA_CREDITS_PER_MINUTE': '1000000', 'FRED_REQUESTS_PER_MINUTE': '1000000'}
+
+
+class StubUpstream:
+    """The stub server on a background thread; port 0 picks a free port."""
+
+    def __init__(self, port=0, latency_ms=20, error_rate=0.0, stall_rate=0.0, stall_ms=0):
+        self.handler = type('Handler', (StubHandler,), {'latency': latency_ms / 1000})
+        self.set_faults(error_rate, stall_rate, stall_ms)
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self.handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def set_faults(self, error_rate=0.0, stall_rate=0.0, stall_ms=0):
+        self.handler.error_rate, self.handler.stall_rate, self.handler.stall = error_rate, stall_rate, stall_ms / 1000
+
+    def env(self):
+        return stub_env(self.url)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls answered with 503')
+    parser.add_argument('--stall-rate', type=float, default=0.0, help='share of calls delayed by --stall-ms')
+    parser.add_argument('--stall-ms', type=float, default=5000)
+    args = parser.parse_args()
+    with StubUpstream(args.port, args.latency_ms, args.error_rate, args.stall_rate, args.stall_ms) as stub:
+        print(f"Stub upstream on {stub.url}")
+        for key, value in stub.env().items():
+            print(f"  {key}={value}")
+        threading.Event().wait()
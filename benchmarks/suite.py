@@ -0,0 +1,344 @@
+# runtimes_app/benchmarks/suite.py
+# End-to-end benchmark suite: every route through the Flask test client and
+# under concurrent load against gunicorn, peak memory, and model/parser
+# microbenchmarks. Upstream APIs are served by benchmarks/stub_upstream.py and
+# the database is generated by benchmarks/generate_db.py, so runs are
+# reproducible. Results go to benchmarks/results/<time>.json and are compared
+# with benchmarks/baseline.json, which is only meaningful for a run with the
+# same settings (COMPARABLE) on the same machine: record it with
+# --save-baseline from a clean checkout of the commit it describes.
+# Run from the repo root:
+#   python -m benchmarks.suite [--quick] [--headlines 100000] [--save-baseline] [--fail-on-regression]
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from benchmarks.stub_upstream import StubUpstream
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+BASELINE = os.path.join(ROOT_DIR, 'benchmarks', 'baseline.json')
+REGRESSION_THRESHOLD = 0.10 # flag metrics more than 10% worse than the baseline
+# meta keys that must match the baseline's for the comparison to mean anything
+COMPARABLE = ('headlines', 'posts', 'iterations', 'upstream_latency_ms', 'cpus', 'python', 'platform',
+              'load.profile', 'load.workers', 'load.threads', 'load.concurrency', 'load.seconds')
+
+BATCH = ','.join(f"SYM{i}" for i in range(10))
+ROUTES = {
+    'dashboard': ('GET', '/?ticker=NVDA', None),
+    'get_stock': ('GET', '/get_stock?ticker=NVDA', None),
+    'get_stock_cold': ('GET', '/get_stock?ticker=COLD{i}', None), # new ticker every call: upstream + cache fill
+    'get_stocks_10': ('GET', f'/get_stocks?symbols={BATCH}', None),
+    'macro': ('GET', '/macro/', None),
+    'blog': ('GET', '/blog/', None),
+    'blog_post': ('GET', '/blog/1', None),
+    'bess_calculate': ('POST', '/bess/api/calculate', {'case': 'base'}),
+}
+LOAD_MIX = ('dashboard', 'get_stock', 'macro', 'blog', 'blog_post', 'bess_calculate')
+
+
+def percentiles(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {'n': int(ms.size), 'mean_ms': round(float(ms.mean()), 3), 'p50_ms': round(float(np.percentile(ms, 50)), 3),
+            'p95_ms': round(float(np.percentile(ms, 95)), 3), 'p99_ms': round(float(np.percentile(ms, 99)), 3)}
+
+
+# --- In-process (Flask test client) ---
+def bench_routes(client, iterations):
+    results = {}
+    for name, (method, path, body) in ROUTES.items():
+        for i in range(3):
+            client.open(path.format(i=f"W{i}"), method=method, json=body) # warm-up
+        samples = []
+        for i in range(iterations):
+            start = time.perf_counter()
+            response = client.open(path.format(i=i), method=method, json=body)
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, (name, response.status_code)
+        results[name] = dict(percentiles(samples), bytes=len(response.data))
+        print(f"  {name:<16} p50 {results[name]['p50_ms']:9.2f} ms  p95 {results[name]['p95_ms']:9.2f} ms  {results[name]['bytes']:>10,} B")
+    return results
+
+
+def bench_memory(client):
+    """Peak Python allocation while serving each route once (tracemalloc), plus process max RSS."""
+    results = {}
+    for name, (method, path, body) in ROUTES.items():
+        tracemalloc.start()
+        client.open(path.format(i='MEM'), method=method, json=body)
+        results[f"{name}_peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+    results['process_max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return results
+
+
+def bench_micro(iterations):
+    from routes.bess_routes import calculate_bess_financials
+    from services.bess_model import BESS_PARAMS, PRESET_CASES
+    from benchmarks.stub_upstream import fred_observations
+    import scrape_fred
+
+    def timed(fn, n):
+        samples = timeit.repeat(fn, number=1, repeat=n)
+        return percentiles(samples)
+
+    base = PRESET_CASES['base']
+    observations = {name: fred_observations(series_id)['observations'] for series_id, name in scrape_fred.tickers.items()}
+    results = {
+        'calculate_bess_financials': timed(lambda: calculate_bess_financials(*(base[p] for p in BESS_PARAMS)), iterations),
+        'fred_parse_observations': timed(lambda: [scrape_fred.parse_observations(obs, name) for name, obs in observations.items()], iterations),
+        'fetchFred_stub': timed(lambda: scrape_fred.fetchFred('stub', scrape_fred.tickers), max(3, iterations // 10)),
+    }
+    for name, r in results.items():
+        print(f"  {name:<26} p50 {r['p50_ms']:9.3f} ms  p95 {r['p95_ms']:9.3f} ms")
+    return results
+
+
+# --- Concurrent load (gunicorn) ---
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _worker_memory_mb(master_pid):
+    """Current and peak RSS of gunicorn's worker processes, from /proc."""
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+            workers = [int(pid) for pid in f.read().split()]
+    except OSError:
+        return {}
+    rss, hwm = [], []
+    for pid in workers:
+        with open(f"/proc/{pid}/status") as f:
+            status = dict(line.split(':', 1) for line in f if ':' in line)
+        rss.append(int(status['VmRSS'].split()[0]) / 1024)
+        hwm.append(int(status['VmHWM'].split()[0]) / 1024)
+    return {'workers': len(workers), 'worker_rss_mb': round(float(np.mean(rss)), 1), 'worker_peak_rss_mb': round(max(hwm), 1)}
+
+
+def bench_load(env, concurrency, seconds, workers, threads, profile):
+    if shutil.which('gunicorn') is None:
+        print("  gunicorn not installed; skipping the load test")
+        return None
+    port = _free_port()
+    # Served the way gunicorn.conf.py deploys it, with the profile chosen there
+    cmd = ['gunicorn', 'app:create_app()', '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    server = subprocess.Popen(cmd, cwd=ROOT_DIR, env=dict(env, GUNICORN_PROFILE=profile, WEB_CONCURRENCY=str(workers),
+                                                          GUNICORN_THREADS=str(threads)))
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                requests.get(f"{base_url}/blog/", timeout=5)
+                break
+            except requests.RequestException: # still booting
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+        for name in LOAD_MIX: # warm every worker's caches a little
+            method, path, body = ROUTES[name]
+            for _ in range(workers * 2):
+                requests.request(method, base_url + path, json=body, timeout=30)
+
+        stop = time.perf_counter() + seconds
+        samples = {name: [] for name in LOAD_MIX}
+        errors = [0]
+        lock = threading.Lock()
+
+        def client(k):
+            session = requests.Session()
+            local = {name: [] for name in LOAD_MIX}
+            i = k
+            while time.perf_counter() < stop:
+                name = LOAD_MIX[i % len(LOAD_MIX)]
+                method, path, body = ROUTES[name]
+                start = time.perf_counter()
+                try:
+                    ok = session.request(method, base_url + path, json=body, timeout=30).status_code == 200
+                except requests.RequestException:
+                    ok = False
+                if ok:
+                    local[name].append(time.perf_counter() - start)
+                else:
+                    with lock:
+                        errors[0] += 1
+                i += 1
+            with lock:
+                for name, values in local.items():
+                    samples[name].extend(values)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(client, range(concurrency)))
+
+        total = sum(len(v) for v in samples.values())
+        results = {
+            'profile': profile, 'concurrency': concurrency, 'seconds': seconds, 'workers': workers, 'threads': threads,
+            'rps': round(total / seconds, 1), 'errors': errors[0],
+            'all': percentiles([s for values in samples.values() for s in values]),
+            'routes': {name: percentiles(values) for name, values in samples.items() if values},
+            'memory': _worker_memory_mb(server.pid),
+        }
+        print(f"  {results['rps']:.1f} req/s at concurrency {concurrency}, p50 {results['all']['p50_ms']:.1f} ms, "
+              f"p95 {results['all']['p95_ms']:.1f} ms, p99 {results['all']['p99_ms']:.1f} ms, errors {errors[0]}, "
+              f"worker RSS {results['memory'].get('worker_rss_mb')} MB")
+        return results
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+# --- Results ---
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """Prints metrics that moved more than threshold; returns the regressed ones."""
+    current, baseline = flatten(current), flatten(baseline)
+    regressions = []
+    for key, value in sorted(current.items()):
+        old = baseline.get(key)
+        leaf = key.rsplit('.', 1)[-1]
+        lower_is_better = leaf in ('p50_ms', 'p95_ms') or leaf.endswith(('_kb', '_mb')) # mean/p99 are too noisy to gate on
+        higher_is_better = leaf == 'rps'
+        if old in (None, 0) or not (lower_is_better or higher_is_better):
+            continue
+        change = (value - old) / old
+        worse = change > threshold if lower_is_better else change < -threshold
+        better = change < -threshold if lower_is_better else change > threshold
+        if worse or better:
+            print(f"  {'REGRESSION' if worse else 'improved':<10} {key:<50} {old:>12,.2f} -> {value:>12,.2f} ({change:+.0%})")
+        if worse:
+            regressions.append(key)
+    return regressions
+
+
+def _git_revision():
+    """Short sha of HEAD, with -dirty when the tree has uncommitted changes."""
+    return subprocess.run(['git', 'describe', '--always', '--dirty', '--abbrev=7'], cwd=ROOT_DIR,
+                          capture_output=True, text=True).stdout.strip()
+
+
+def mismatched_settings(current, baseline):
+    """The COMPARABLE meta keys on which two runs differ."""
+    both_loaded = 'load' in current['meta'] and 'load' in baseline['meta'] # else no load metrics are compared
+    current, baseline = flatten(current['meta']), flatten(baseline['meta'])
+    return [key for key in COMPARABLE if (both_loaded or not key.startswith('load.')) and current.get(key) != baseline.get(key)]
+
+
+def run(args):
+    # services.db and the scrapers read DB_FILE / *_API_URL at import time,
+    # so nothing from the app may be imported before the environment is set.
+    if 'services.db' in sys.modules:
+        raise RuntimeError("services.db was imported before the benchmark environment was set")
+    tmp = tempfile.mkdtemp(prefix='runtimes-bench-')
+    try:
+        db_file = os.path.join(tmp, 'headlines.db')
+        with StubUpstream(latency_ms=args.upstream_latency_ms) as stub:
+            env = dict(os.environ, DB_FILE=db_file, **stub.env())
+            os.environ.update(env)
+            from benchmarks.generate_db import generate
+            from app import create_app
+
+            print(f"Generating {db_file}: {args.headlines:,} headlines per source, {args.posts} posts")
+            generate(db_file, args.headlines, args.posts)
+            client = create_app().test_client()
+
+            results = {'meta': {
+                'time': datetime.datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                'platform': platform.platform(), 'cpus': os.cpu_count(), 'headlines': args.headlines, 'posts': args.posts,
+                'iterations': args.iterations, 'upstream_latency_ms': args.upstream_latency_ms,
+                'git': _git_revision(),
+            }}
+            print("Routes (Flask test client)")
+            results['routes'] = bench_routes(client, args.iterations)
+            print("Memory")
+            results['memory'] = bench_memory(client)
+            print(f"  process max RSS {results['memory']['process_max_rss_mb']} MB")
+            print("Microbenchmarks")
+            results['micro'] = bench_micro(args.iterations)
+            if not args.skip_load:
+                print("Load (gunicorn)")
+                load = bench_load(env, args.concurrency, args.seconds, args.workers, args.threads, args.profile)
+                if load is not None:
+                    results['load'] = load
+                    results['meta']['load'] = {key: load[key] for key in ('profile', 'workers', 'threads', 'concurrency', 'seconds')}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--headlines', type=int, default=100_000, help='rows per headline source in the generated DB')
+    parser.add_argument('--posts', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--upstream-latency-ms', type=float, default=20)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='threads per worker with --profile gthread')
+    parser.add_argument('--profile', default='gevent', choices=('sync', 'gthread', 'gevent'),
+                        help="gunicorn.conf.py's GUNICORN_PROFILE for the load test (default: the deployment's)")
+    parser.add_argument('--skip-load', action='store_true')
+    parser.add_argument('--quick', action='store_true', help='small DB, few iterations, short load test')
+    parser.add_argument('--save-baseline', action='store_true', help=f'also write the results to {os.path.relpath(BASELINE, ROOT_DIR)}')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+    if args.quick:
+        args.headlines, args.posts, args.iterations, args.seconds = 10_000, 100, 30, 5
+
+    results = run(args)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{results['meta']['time'].replace(':', '')}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results: {os.path.relpath(path, ROOT_DIR)}")
+
+    regressions = []
+    if os.path.exists(BASELINE) and not args.save_baseline:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        print(f"Compared with baseline from {baseline['meta']['time']} ({baseline['meta'].get('git')})")
+        changed = mismatched_settings(results, baseline)
+        if changed:
+            # Gating on numbers from a different setup would flag (or hide) the setup, not the code
+            print(f"  the baseline used different {', '.join(changed)}; not compared. Re-record it with --save-baseline")
+            if args.fail_on_regression:
+                sys.exit(2)
+        else:
+            regressions = compare(results, baseline)
+            if not regressions:
+                print("  no regressions")
+    if args.save_baseline:
+        shutil.copy(path, BASELINE)
+        print(f"Baseline: {os.path.relpath(BASELINE, ROOT_DIR)}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
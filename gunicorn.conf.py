@@ -0,0 +1,96 @@
+# runtimes_app/gunicorn.conf.py
+# Picked up automatically by `gunicorn 'app:create_app()'` from the repo root.
+# With preload_app the master builds the app, imports the heavy modules and
+# freezes the GC before forking, so workers share those pages copy-on-write
+# instead of each importing pandas/plotly again. Set GUNICORN_PRELOAD=0 to
+# load the app in every worker (needed for code reloads on HUP).
+#
+# GUNICORN_PROFILE picks how a worker overlaps requests that wait on Twelve
+# Data, FRED or SQLite:
+#   sync     one request at a time per worker (gunicorn's own default)
+#   gthread  a thread per in-flight request, GUNICORN_THREADS per worker
+#   gevent   a greenlet per request, up to GUNICORN_WORKER_CONNECTIONS per
+#            worker (default); sockets, sleeps, locks and thread pools are
+#            monkey-patched to yield, so hundreds of slow upstream calls
+#            overlap. SQLite calls still run on the hub (reads are
+#            sub-millisecond in WAL mode and writers wait for the lock
+#            cooperatively, see services/db.py).
+# Compare them with: python -m benchmarks.bench_serving
+#
+# gevent is the default because this app mostly waits: on Twelve Data, FRED
+# and OpenAI, and on /stream clients that stay connected for minutes. In
+# bench_serving it cut the median ninefold at 10 clients and dropped no
+# request at 500, where gthread failed 128. Its cost is that CPU work holds
+# the hub, so the CPU-heavy paths leave it: Monte Carlo runs in a spawn
+# process pool (started lazily in each worker, after the fork, so it works
+# under the patched, preloaded master) and large BESS batches on a native
+# thread. Use gthread if a new CPU-bound endpoint can't do the same.
+#
+# Each worker keeps its own request, cache and upstream metrics and writes
+# them to METRICS_DIR (a fresh directory per server start); /metrics on any
+# worker merges them all (services/metrics.py).
+#
+# A /stream client holds its thread or greenlet until it disconnects, so each
+# profile caps streams per worker (MAX_STREAMS_PER_WORKER) at half its slots
+# and answers 503 past that. sync workers have one slot and refuse streams.
+
+import gc
+import os
+import shutil
+import tempfile
+
+PROFILE = os.environ.get('GUNICORN_PROFILE', 'gevent')
+# Exported so the app sees the same count: each worker takes 1/WEB_CONCURRENCY
+# of the Twelve Data quota (services/upstream.py) and of the cores for its
+# Monte Carlo pool. Set the worker count with WEB_CONCURRENCY rather than -w,
+# which the app can't see.
+workers = int(os.environ.setdefault('WEB_CONCURRENCY', '2'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f"runtimes_app-metrics-{os.getpid()}"))
+
+if PROFILE == 'gevent':
+    # Patch before the preloading master imports the app, so the locks, queues
+    # and executors it creates at import time are the cooperative kind
+    from gevent import monkey
+    monkey.patch_all()
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+    os.environ.setdefault('MAX_STREAMS_PER_WORKER', str(worker_connections // 2))
+elif PROFILE == 'sync':
+    worker_class = 'sync'
+    os.environ.setdefault('MAX_STREAMS_PER_WORKER', '0')
+elif PROFILE == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 32))
+    os.environ.setdefault('MAX_STREAMS_PER_WORKER', str(threads // 2))
+else:
+    raise ValueError(f"GUNICORN_PROFILE must be sync, gthread or gevent, not {PROFILE!r}")
+
+
+def on_starting(server):
+    """Runs in the master before the first fork (after the app is preloaded): no worker files from an earlier run."""
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['METRICS_DIR'])
+    if server.cfg.workers != int(os.environ['WEB_CONCURRENCY']):
+        server.log.warning("Running %d workers but WEB_CONCURRENCY is %s: quota and pool shares will be off; "
+                           "set the count with WEB_CONCURRENCY", server.cfg.workers, os.environ['WEB_CONCURRENCY'])
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before the first fork."""
+    if not server.cfg.preload_app:
+        return
+    from app import preload_heavy_modules
+    from services.delivery import assets, build
+    preload_heavy_modules()
+    assets.warm() # static files hashed and compressed once, shared by every worker
+    build() # the deploy's template/asset id, part of the macro page's validators
+    from routes.bess_routes import warm_presets
+    warm_presets() # good/base/bad results in memory before the fork
+    # Objects allocated so far move to a permanent generation the collector
+    # never scans, so a worker's gc doesn't dirty (and copy) the shared pages
+    gc.freeze()
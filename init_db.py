@@ -1,39 +1,9 @@
-import sqlite3
+from services import db
+from services.migrations import migrate, LATEST_VERSION
 
-# Decide DB name
-db_name = 'headlines.db'
+# Creates or upgrades the schema of services.db.DB_FILE (overridable with the
+# DB_FILE env var). The tables, indexes and their history live in
+# services/migrations.py; the app and the scrapers also run this on startup.
+version = migrate(verbose=True)
 
-
-conn = sqlite3.connect(db_name)
-c = conn.cursor()
-
-# Create the table for Reuters headlines
-c.execute("""
-    CREATE TABLE IF NOT EXISTS reuters_headlines (
-        timestamp TEXT, 
-        news TEXT
-    )
-""")
-
-# Create the table for CNBC headlines
-c.execute("""
-    CREATE TABLE IF NOT EXISTS CNBC_headlines (
-        timestamp TEXT, 
-        news TEXT
-    )
-""")
-
-# Create the table for Blog Posts
-c.execute("""
-    CREATE TABLE IF NOT EXISTS posts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        content TEXT NOT NULL,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-""")
-
-conn.commit()
-conn.close()
-
-print("Database tables initialized successfully.")
\ No newline at end of file
+print(f"Database {db.DB_FILE} is at schema version {version} (latest {LATEST_VERSION}).")
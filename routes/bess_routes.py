@@ -1,13 +1,29 @@
 # runtimes_app/routes/bess_routes.py
 
-from flask import Blueprint, request, jsonify
-import pandas as pd
+import json
+import time
+
+from flask import Blueprint, request, jsonify, Response, url_for
 import numpy as np
-import numpy_financial as npf # Import numpy_financial
+
+from services import db, metrics
+from services.irr import prefix_irr
+from services.bess_cache import BessResultCache
+from services.bess_model import (BESS_PARAMS, PRESET_CASES, DEFAULT_DISCOUNT_RATE, DISCOUNT_RATE_RANGE,
+                                 MAX_SCENARIOS, evaluate_scenarios, expand_grid, scenarios_to_params, validate_inputs)
+from services.bess_montecarlo import (MAX_PATHS, JobLimitReached, validate_distributions, start_job, get_job,
+                                      wait_for_update)
+
+MONTECARLO_RETRY_AFTER_S = 5
+STREAM_KEEPALIVE_S = 15 # an unchanged progress event is repeated this often
 
 # --- Blueprint Definition ---
 bess_bp = Blueprint('bess', __name__)
 
+def _pandas():
+    import pandas # see HEAVY_MODULES in app.py
+    return pandas
+
 # --- BESS Financial Model Calculation Function ---
 # (Copied directly from your previous app.py/main_routes.py)
 def calculate_bess_financials(
@@ -49,6 +65,7 @@ def calculate_bess_financials(
 
     # ------------------------ Time series ------------------------
     # df pre-configuration
+    pd = _pandas()
     year_count = [i for i in range(asset_life + 1)]
     df = pd.DataFrame(index=year_count)
     df.index.name = 'Year'
@@ -77,24 +94,13 @@ def calculate_bess_financials(
     # Total Cash Flow
     df['Cash Flow $000s'] = df['energy arbitrage $000s'] + df['OPEX $000s'] + df['CAPEX $000s']
 
-    # IRR calculation
-    irr_series = []
-    for i in df.index:
-        cash_flows_for_irr = df.loc[0:i, 'Cash Flow $000s'].values
-        try:
-            current_irr = npf.irr(cash_flows_for_irr)
-            if np.isinf(current_irr) or np.isnan(current_irr) or current_irr < -0:
-                irr_series.append(0)
-            else:
-                irr_series.append(current_irr)
-        except ValueError:
-            irr_series.append(0)
-
-    irr_series = pd.Series(irr_series, index=year_count).fillna(0) * 100
-    df['IRR %'] = irr_series
-
-    # Calculate final IRR (for the entire asset life)
-    final_irr = npf.irr(df['Cash Flow $000s'].values) * 100
+    # IRR calculation: every prefix of the cash flow solved at once
+    irr_raw = prefix_irr(df['Cash Flow $000s'].values)
+    irr_clamped = np.where(np.isfinite(irr_raw) & (irr_raw >= 0), irr_raw, 0)
+    df['IRR %'] = pd.Series(irr_clamped, index=year_count) * 100
+
+    # Final IRR (for the entire asset life) is the last prefix
+    final_irr = irr_raw[-1] * 100
     if np.isinf(final_irr) or np.isnan(final_irr) or final_irr < -100:
         final_irr_display = "N/A"
     else:
@@ -102,50 +108,232 @@ def calculate_bess_financials(
 
     return df, final_irr_display
 
+def bess_result_json(inputs):
+    """calculate_bess_financials as the /api/calculate response body."""
+    with metrics.compute('single'):
+        df, final_irr_display = calculate_bess_financials(*(inputs[name] for name in BESS_PARAMS))
+    # Convert DataFrame to a list of dicts for JSON, ensuring 'Year' is included
+    df_records = df.reset_index().to_dict('records')
+    # Same encoding as jsonify, so cached and freshly computed bodies are identical
+    return json.dumps({"final_irr": final_irr_display, "cash_flows_data": df_records}, sort_keys=True, separators=(',', ':'))
+
+# Results by canonical input hash: in-process LRU, then the bess_results table
+result_cache = BessResultCache(bess_result_json, persist=True)
+metrics.register_cache('bess', result_cache.stats)
+
+def warm_presets():
+    """Computes (or loads) the preset cases; gunicorn's master calls this before forking."""
+    result_cache.warm(PRESET_CASES.values())
+
+def _json_object():
+    """The request body as a dict ({} when absent or not JSON), or None for any other JSON value."""
+    data = request.get_json(silent=True)
+    if data is None:
+        return {}
+    return data if isinstance(data, dict) else None
+
+NOT_AN_OBJECT = {"error": "The request body must be a JSON object"}
+
+def _parse_base(base):
+    """A preset name, or overrides of the base case -> (inputs, error message or None)."""
+    if isinstance(base, str) and base in PRESET_CASES:
+        return PRESET_CASES[base], None
+    if isinstance(base, dict):
+        errors = validate_inputs(base)
+        if errors:
+            return None, "; ".join(errors)
+        return {**PRESET_CASES['base'], **base}, None
+    return None, f"Unknown base case '{base}'"
+
+def _parse_discount_rate(data):
+    """The body's discount_rate (DEFAULT_DISCOUNT_RATE if absent) -> (rate, error message or None)."""
+    rate = data.get('discount_rate', DEFAULT_DISCOUNT_RATE)
+    low, high = DISCOUNT_RATE_RANGE
+    if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not low <= rate <= high:
+        return None, f"discount_rate must be a number between {low} and {high}"
+    return float(rate), None
+
 # --- BESS IRR Calculation Endpoint ---
 @bess_bp.route('/api/calculate', methods=['POST'])
 def calculate_bess_api():
-    data = request.get_json()
+    """
+    Cash flows and final IRR for one input set.
+
+    Body: {"case": "good" | "base" | "bad", "inputs": {name: value, ...}}
+    inputs override the case (base if missing or not recognized) and must lie
+    within BESS_RANGES.
+    """
+    data = _json_object()
+    if data is None:
+        return jsonify(NOT_AN_OBJECT), 400
     case = data.get('case')
+    if case is not None and not isinstance(case, str):
+        return jsonify({"error": "case must be one of " + ", ".join(PRESET_CASES)}), 400
 
-    # Define inputs for the good, base, and bad cases
-    if case == 'good':
-        inputs = {
-            'asset_life': 25, 'BESS_size_MW': 12, 'duration': 4.5,
-            'overbuild': 0.10, 'degradation': 0.015, 'availability': 0.99,
-            'rte': 0.92, 'DoD': 0.95, 't4_usd_MWh': 150, 'b4_usd_MWh': 25,
-            'BESS_module_plus_PCS_unit_usd_kWh': 100, 'epc_unit_usd_kWh': 60,
-            'om_unit_kW_yr': 12, 'opex_esc': 0.02
-        }
-    elif case == 'bad':
-        inputs = {
-            'asset_life': 15, 'BESS_size_MW': 8, 'duration': 3.5,
-            'overbuild': 0.20, 'degradation': 0.03, 'availability': 0.95,
-            'rte': 0.88, 'DoD': 0.85, 't4_usd_MWh': 120, 'b4_usd_MWh': 40,
-            'BESS_module_plus_PCS_unit_usd_kWh': 115, 'epc_unit_usd_kWh': 80,
-            'om_unit_kW_yr': 18, 'opex_esc': 0.03
-        }
-    else: # Default to base case if 'case' is not provided or not recognized
-        inputs = {
-            'asset_life': 20, 'BESS_size_MW': 10, 'duration': 4,
-            'overbuild': 0.15, 'degradation': 0.02, 'availability': 0.98,
-            'rte': 0.90, 'DoD': 0.90, 't4_usd_MWh': 139, 'b4_usd_MWh': 30,
-            'BESS_module_plus_PCS_unit_usd_kWh': 105, 'epc_unit_usd_kWh': 70,
-            'om_unit_kW_yr': 15, 'opex_esc': 0.025
-        }
-
-    df, final_irr_display = calculate_bess_financials(
-        inputs['asset_life'], inputs['BESS_size_MW'], inputs['duration'],
-        inputs['overbuild'], inputs['degradation'], inputs['availability'],
-        inputs['rte'], inputs['DoD'], inputs['t4_usd_MWh'], inputs['b4_usd_MWh'],
-        inputs['BESS_module_plus_PCS_unit_usd_kWh'], inputs['epc_unit_usd_kWh'],
-        inputs['om_unit_kW_yr'], inputs['opex_esc']
-    )
+    # Good / base / bad input sets; default to base case if 'case' is not provided or not recognized
+    inputs = dict(PRESET_CASES.get(case, PRESET_CASES['base']))
+    overrides = data.get('inputs') or {}
+    if not isinstance(overrides, dict):
+        return jsonify({"error": "inputs must be an object of parameter values"}), 400
+    errors = validate_inputs(overrides)
+    if errors:
+        return jsonify({"error": "; ".join(errors)}), 400
+    inputs.update(overrides)
 
-    # Convert DataFrame to a list of dicts for JSON, ensuring 'Year' is included
-    df_records = df.reset_index().to_dict('records')
+    return Response(result_cache.get(inputs), mimetype='application/json')
+
+
+def _json_floats(values):
+    """NaN/inf are not valid JSON; send them as null."""
+    return [float(v) if np.isfinite(v) else None for v in values]
+
+# --- BESS Batch Scenario / Sensitivity Grid Endpoint ---
+def _evaluate_batch(params, discount_rate):
+    # Under gevent a full batch (~2 s at MAX_SCENARIOS) would hold the hub and
+    # with it every other request in the worker; on a native thread they
+    # keep getting turns
+    if db.cooperative():
+        from gevent import get_hub
+        return get_hub().threadpool.apply(evaluate_scenarios, (params, discount_rate))
+    return evaluate_scenarios(params, discount_rate)
 
+@bess_bp.route('/api/batch', methods=['POST'])
+def calculate_bess_batch_api():
+    """
+    Evaluates many scenarios in one broadcasted computation.
+
+    Body: {"base": "good" | "base" | "bad" | {inputs}, "discount_rate": 0.08,
+           and either "scenarios": [{overrides}, ...]
+           or "grid": {"t4_usd_MWh": [..] | {"start", "stop", "num"}, ...}}
+    """
+    data = _json_object()
+    if data is None:
+        return jsonify(NOT_AN_OBJECT), 400
+
+    base, error = _parse_base(data.get('base', 'base'))
+    if error:
+        return jsonify({"error": error}), 400
+    discount_rate, error = _parse_discount_rate(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    scenarios, grid = data.get('scenarios'), data.get('grid')
+    if grid:
+        if not isinstance(grid, dict) or not all(isinstance(spec, (list, dict)) for spec in grid.values()):
+            return jsonify({"error": "grid must map parameter names to lists of values or {start, stop, num}"}), 400
+        overridden = set(grid)
+    elif scenarios:
+        if not isinstance(scenarios, list) or not all(isinstance(s, dict) for s in scenarios):
+            return jsonify({"error": "scenarios must be a list of objects of parameter values"}), 400
+        overridden = {k for s in scenarios for k in s}
+    else:
+        return jsonify({"error": "Provide either 'scenarios' or 'grid'"}), 400
+    unknown = sorted(overridden - set(BESS_PARAMS))
+    if unknown:
+        return jsonify({"error": f"Unknown parameters: {', '.join(unknown)}"}), 400
+
+    try:
+        if grid:
+            params, axes = expand_grid(base, grid)
+        else:
+            params, axes = scenarios_to_params(base, scenarios), None
+        count = int(np.broadcast(*(np.asarray(params[name]) for name in BESS_PARAMS)).size)
+        if count > MAX_SCENARIOS:
+            return jsonify({"error": f"{count} scenarios requested, the limit is {MAX_SCENARIOS}"}), 400
+        # Every scenario and grid value against the ranges /api/calculate uses
+        errors = validate_inputs({name: params[name] for name in BESS_PARAMS})
+        if errors:
+            return jsonify({"error": "; ".join(errors)}), 400
+        with metrics.compute('batch'):
+            results = _evaluate_batch(params, discount_rate)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid batch request: {e}"}), 400
+
+    response = {
+        "count": count,
+        "irr_pct": _json_floats(results['irr']),
+        "npv_usdk": _json_floats(results['npv']),
+    }
+    if axes is not None:
+        # Results are flattened in C order over the grid axes
+        response["grid"] = {name: values.tolist() for name, values in axes.items()}
+        response["shape"] = [len(values) for values in axes.values()]
+    return jsonify(response)
+
+
+# --- BESS Monte Carlo Endpoints ---
+@bess_bp.route('/api/montecarlo', methods=['POST'])
+def start_montecarlo_api():
+    """
+    Starts a Monte Carlo run in the background and returns its job id.
+
+    Body: {"base": "good" | "base" | "bad" | {inputs}, "paths": 100000, "seed": 42,
+           "discount_rate": 0.08,
+           "distributions": {"degradation": {"dist": "normal", "mean": 0.02, "std": 0.005, "min": 0}, ...}}
+    """
+    data = _json_object()
+    if data is None:
+        return jsonify(NOT_AN_OBJECT), 400
+
+    base, error = _parse_base(data.get('base', 'base'))
+    if error:
+        return jsonify({"error": error}), 400
+
+    distributions = data.get('distributions') or {}
+    errors = validate_distributions(distributions)
+    if not distributions:
+        errors.append("Provide at least one entry in 'distributions'")
+    paths, seed = data.get('paths', 100_000), data.get('seed')
+    if isinstance(paths, bool) or not isinstance(paths, int) or not 1 <= paths <= MAX_PATHS:
+        errors.append(f"paths must be an integer between 1 and {MAX_PATHS}")
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        errors.append("seed must be a non-negative integer")
+    discount_rate, error = _parse_discount_rate(data)
+    if error:
+        errors.append(error)
+    if errors:
+        return jsonify({"error": "; ".join(errors)}), 400
+
+    try:
+        job = start_job(base, distributions, paths, seed, discount_rate)
+    except JobLimitReached as e:
+        return jsonify({"error": f"{e}; try again shortly"}), 429, {'Retry-After': str(MONTECARLO_RETRY_AFTER_S)}
     return jsonify({
-        "final_irr": final_irr_display,
-        "cash_flows_data": df_records
-    })
\ No newline at end of file
+        "job_id": job.id,
+        "status_url": url_for('bess.montecarlo_status_api', job_id=job.id),
+        "stream_url": url_for('bess.montecarlo_stream_api', job_id=job.id),
+    }), 202
+
+
+@bess_bp.route('/api/montecarlo/<job_id>')
+def montecarlo_status_api(job_id):
+    """Current progress, plus the summary once the run is done."""
+    state = get_job(job_id)
+    if state is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(state)
+
+
+@bess_bp.route('/api/montecarlo/<job_id>/stream')
+def montecarlo_stream_api(job_id):
+    """Server-Sent Events: 'progress' events while running, then one 'done' or 'error' event."""
+    if get_job(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    def events():
+        seen, sent_at = None, 0.0
+        while True:
+            state = get_job(job_id)
+            if state is None: # pruned while streaming
+                yield f"event: error\ndata: {json.dumps({'job_id': job_id, 'status': 'error', 'error': 'Unknown job'})}\n\n"
+                return
+            if state['status'] in ('done', 'error'):
+                yield f"event: {state['status']}\ndata: {json.dumps(state)}\n\n"
+                return
+            current = (state['status'], state['completed'])
+            if current != seen or time.monotonic() - sent_at >= STREAM_KEEPALIVE_S:
+                yield f"event: progress\ndata: {json.dumps(state)}\n\n"
+                seen, sent_at = current, time.monotonic()
+            wait_for_update(job_id, current, timeout=STREAM_KEEPALIVE_S)
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
@@ -1,37 +1,94 @@
-import sqlite3
-from flask import Blueprint, render_template, request, redirect, url_for
-import markdown # Import the markdown library
+import hashlib
+from datetime import datetime, timezone
+
+from flask import Blueprint, render_template, request, redirect, url_for, make_response, abort
+
+from services import db, delivery, metrics, posts
+from services.data_versions import POSTS, bump, get_version
 
 # 1. Create a Blueprint object
 # The first argument, 'blog', is the name of the blueprint.
 # The second argument, __name__, is the import name of the blueprint's package.
 blog_bp = Blueprint('blog', __name__)
 
-DB_FILE = 'headlines.db'
+# Rendered pages: key -> (posts data version, html, etag, last modified).
+# create_post bumps the version, so every worker drops its pages on the next hit.
+MAX_CACHED_PAGES = 256
+page_cache = {}
+page_cache_stats = {'hits': 0, 'misses': 0}
+metrics.register_cache('blog_pages', lambda: dict(page_cache_stats, entries=len(page_cache), hit_ratio=round(
+    page_cache_stats['hits'] / max(1, page_cache_stats['hits'] + page_cache_stats['misses']), 4)))
+
+def cached_page(conn, key, render):
+    """render() -> (html, last modified) or None, cached until the next new post."""
+    version = get_version(conn, POSTS)
+    cached = page_cache.get(key)
+    if cached is not None and cached[0] == version:
+        page_cache_stats['hits'] += 1
+        return cached
+    page_cache_stats['misses'] += 1
+    rendered = render()
+    if rendered is None:
+        return None
+    html, last_modified = rendered
+    if len(page_cache) >= MAX_CACHED_PAGES:
+        page_cache.clear()
+    page_cache[key] = entry = (version, html, hashlib.sha1(html.encode()).hexdigest()[:16], last_modified)
+    return entry
+
+def _timestamp(value):
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc) # CURRENT_TIMESTAMP is UTC
+
+def page_response(entry):
+    """
+    The cached page with its validators, or a 304 when the client's copy is
+    current. Posts are never edited, so a page only changes with new posts or
+    a deploy: the etag hashes the html, and Last-Modified is the later of the
+    newest post shown and delivery.build(), so If-Modified-Since alone can't
+    keep serving a page that links to assets a deploy replaced.
+    """
+    _, html, etag, last_modified = entry
+    build_time = delivery.build()[1]
+    last_modified = max(last_modified, build_time) if last_modified else build_time
+    if request.if_none_match.contains_weak(etag) if request.if_none_match else (
+            request.if_modified_since is not None and request.if_modified_since >= last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(html)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
 
 # 2. Define routes using the Blueprint decorator
 @blog_bp.route('/')
 def list_posts():
-    """Shows a list of all blog posts."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM posts ORDER BY timestamp DESC")
-    posts = c.fetchall()
-    conn.close()
-    return render_template('blog.html', posts=posts)
+    """Shows one page of blog posts, newest first; ?before=<id> pages back."""
+    before = request.args.get('before', type=int)
+    def render():
+        rows, next_before = posts.list_page(conn, before)
+        newest = _timestamp(rows[0]['timestamp']) if rows else None
+        return render_template('blog.html', posts=rows, next_before=next_before, before=before), newest
+
+    with db.read_connection() as conn:
+        entry = cached_page(conn, ('list', before), render)
+    return page_response(entry)
 
 
 @blog_bp.route('/<int:post_id>')
 def show_post(post_id):
-    """Shows a single blog post."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM posts WHERE id = ?", (post_id,))
-    post = c.fetchone()
-    conn.close()
-    return render_template('post.html', post=post)
+    """Shows a single blog post, answering revalidations with 304."""
+    def render():
+        post = conn.execute("SELECT id, title, timestamp, content FROM posts WHERE id = ?", (post_id,)).fetchone()
+        if post is None:
+            return None
+        return render_template('post.html', post=post), _timestamp(post['timestamp'])
+
+    with db.read_connection() as conn:
+        entry = cached_page(conn, ('post', post_id), render)
+    if entry is None:
+        abort(404)
+    return page_response(entry)
 
 
 @blog_bp.route('/create', methods=['GET', 'POST'])
@@ -40,13 +97,10 @@ def create_post():
     if request.method == 'POST':
         title = request.form['title']
         content_markdown = request.form['content']
-        content_html = markdown.markdown(content_markdown) # Convert markdown to HTML
 
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("INSERT INTO posts (title, content) VALUES (?, ?)", (title, content_html))
-        conn.commit()
-        conn.close()
+        with db.transaction() as conn:
+            posts.create_post(conn, title, content_markdown) # stores the Markdown and its rendered HTML
+            bump(conn, POSTS)
         return redirect(url_for('blog.list_posts')) # Redirect to the blog list after creating
 
-    return render_template('create_post.html') # Render the form on GET request
\ No newline at end of file
+    return render_template('create_post.html') # Render the form on GET request
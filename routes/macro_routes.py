@@ -1,47 +1,62 @@
-import sqlite3
-from flask import Blueprint, render_template, request, redirect, url_for
-import pandas as pd
+import hashlib
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for, make_response, jsonify
 
-import plotly.graph_objects as go
-import plotly.io as pio
+import numpy as np
+
+from services import db, delivery, macro, metrics
+from services.figure_cache import FigureCache
+from services.timeseries import store
 
 # 1. Create a Blueprint object
 # The first argument, 'blog', is the name of the blueprint.
 # The second argument, __name__, is the import name of the blueprint's package.
 macro_bp = Blueprint('macro', __name__)
 
-DB_FILE = 'headlines.db'
+figure_cache = FigureCache(persist=True)
+CHART_FORMAT = 2 # bump when render_cpi_figure's output changes shape, so persisted artifacts re-render
+metrics.register_cache('figure', figure_cache.stats)
 
-# 2. Define routes using the Blueprint decorator
-@macro_bp.route('/')
-def cpi_fetch():
-    conn = sqlite3.connect(DB_FILE)
-
-    df = pd.read_sql_query('''
-                        SELECT * 
-                        FROM fred_cpi_data
-                                                    
-                        ''',
-                            conn,
-                            index_col='date_column',
-                            parse_dates=['date_column']
-                            )
-
-    update_df = pd.read_sql_query('''SELECT * 
-                            FROM fred_cpi_update_time
-                            ''',
-                            conn,
-                            index_col='index'
-                            )
-    
-    active = df[['CPI', 'Core CPI']].pct_change(12,fill_method=None).iloc[-12:]
-    update = pd.to_datetime(update_df.loc['CPI'].iloc[0])
+METRIC_LABELS = {
+    'yoy': 'YoY',
+    'mom_ann': 'MoM annualized',
+    'ann3': '3-month annualized',
+    'ann6': '6-month annualized',
+    'contribution': 'Contribution to CPI YoY',
+    'level': 'Index level',
+}
+
+# --- Helper Functions ---
+def _plotly():
+    import plotly.graph_objects # see HEAVY_MODULES in app.py
+    import plotly.io
+    return plotly.graph_objects, plotly.io
+
+def cpi_data_version(conn):
+    """
+    Version of the FRED data, derived from fred_cpi_update_time (rewritten by
+    scrape_fred.py on every run). Returns (version hash, last update datetime).
+    """
+    rows = conn.execute('SELECT * FROM fred_cpi_update_time ORDER BY 1').fetchall()
+    version = hashlib.sha1(repr([tuple(row) for row in rows]).encode()).hexdigest()[:16] # pooled rows are sqlite3.Row
+    last_modified = max(datetime.fromisoformat(str(row[1])) for row in rows)
+    return version, last_modified
+
+def render_cpi_figure(conn, version):
+    """Builds the CPI vs Core CPI YoY chart and returns it as an HTML fragment and figure JSON."""
+    go, pio = _plotly()
+    frame = macro.get_frame(conn, version)
+    months, columns = frame.select(['CPI', 'Core CPI'], ('yoy',), window=12, end=store.last_date('fred/CPI'))
+    cpi_dates = core_dates = months.astype('datetime64[D]')
+    cpi, core = columns['CPI']['yoy'], columns['Core CPI']['yoy']
+    update = datetime.fromisoformat(str(conn.execute('''SELECT "Latest update" FROM fred_cpi_update_time WHERE "index" = 'CPI' ''').fetchone()[0]))
+    latest = cpi_dates[-1].astype(object) # datetime.date
     title = 'CPI YoY vs Core CPI YoY'
 
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=active.index, y=active['CPI'], name='CPI YoY', mode='lines+markers'))
-    fig.add_trace(go.Scatter(x=active.index, y=active['Core CPI'], name='Core CPI YoY', mode='lines+markers'))
-    fig.add_trace(go.Scatter(x=[active.index[-1]], y=[fig.data[0]['y'][-1]-0.002], mode='markers', marker_symbol='triangle-up', marker_color='red', name='Latest Release: ' + f"{update:%m/%d/%y}" + f" ({active.index[-1]:%b})"))
+    fig.add_trace(go.Scatter(x=cpi_dates, y=cpi, name='CPI YoY', mode='lines+markers'))
+    fig.add_trace(go.Scatter(x=core_dates, y=core, name='Core CPI YoY', mode='lines+markers'))
+    fig.add_trace(go.Scatter(x=[latest], y=[cpi[-1]-0.002], mode='markers', marker_symbol='triangle-up', marker_color='red', name='Latest Release: ' + f"{update:%m/%d/%y}" + f" ({latest:%b})"))
     # fig.add_vline(x=data.index[-1], line_width=3, line_dash="dash", line_color="green")
     fig.update_layout(template='seaborn', 
                     showlegend=True,
@@ -52,6 +67,94 @@ def cpi_fetch():
                     xaxis=dict(fixedrange=True), 
                     yaxis=dict(tickformat='.1%', fixedrange=True))
     
-    fig_html = pio.to_html(fig, full_html=False)
+    # plotly.js comes from layout.html (static/plotly.min.js), not inlined into every page
+    return {'html': pio.to_html(fig, full_html=False, include_plotlyjs=False), 'json': fig.to_json()}
+
+def validators(version, last_modified):
+    """
+    ETag and Last-Modified for the FRED data version as rendered by this
+    deploy: the chart format and the templates/assets build are part of it.
+    """
+    build_id, build_time = delivery.build()
+    return f'{version}-{CHART_FORMAT}-{build_id}', max(last_modified, build_time)
+
+def not_modified(version, last_modified):
+    """Whether the client's cached copy for this FRED data version and deploy is still current."""
+    etag, last_modified = validators(version, last_modified)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    return request.if_modified_since is not None and request.if_modified_since >= last_modified
+
+def revalidate(response, version, last_modified):
+    etag, last_modified = validators(version, last_modified)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+def _parse_data_args(args, frame):
+    """The /macro/data parameters, or raises ValueError with a message for the client."""
+    names = [n for n in args.get('series', '').split(',') if n] or frame.names
+    metric_names = [m for m in args.get('metrics', 'yoy').split(',') if m]
+    window = args.get('window', type=int)
+    unknown = [n for n in names if n not in frame.columns]
+    if unknown:
+        raise ValueError(f'Unknown series: {", ".join(unknown)}. Available: {", ".join(frame.names)}.')
+    if not metric_names or set(metric_names) - set(macro.METRICS):
+        raise ValueError(f'metrics must be drawn from {", ".join(macro.METRICS)}.')
+    if 'window' in args and (window is None or window < 1):
+        raise ValueError('window must be a positive number of months.')
+    bounds = {}
+    for name in ('start', 'end'):
+        try:
+            bounds[name] = np.datetime64(args[name][:7], 'M') if args.get(name) else None
+        except ValueError:
+            raise ValueError(f'{name} must be a month (YYYY-MM).')
+    return dict(names=names, metrics=metric_names, window=window, **bounds)
+
+# 2. Define routes using the Blueprint decorator
+@macro_bp.route('/')
+def cpi_fetch():
+    with db.read_connection() as conn:
+        version, last_modified = cpi_data_version(conn)
+
+        # The page only changes when the FRED data does, so browsers can revalidate cheaply
+        cached = not_modified(version, last_modified)
+        if not cached:
+            artifact = figure_cache.get('cpi_yoy', f'{version}/{CHART_FORMAT}', lambda: render_cpi_figure(conn, version))
+            series_names = macro.get_frame(conn, version).names
+
+    if cached:
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template('macro.html', fig_html=artifact['html'], series_names=series_names,
+                                                 metric_labels=METRIC_LABELS))
+    return revalidate(response, version, last_modified)
+
+@macro_bp.route('/data')
+def macro_data():
+    """
+    Levels and derived metrics for any stored FRED series as JSON:
+    ?series=CPI,Core CPI[&metrics=yoy,mom_ann,ann3,ann6,contribution,level]
+    [&start=2020-01][&end=2025-06][&window=24]
+    Rates are fractions (0.031 = 3.1%); months without data are null.
+    """
+    with db.read_connection() as conn:
+        version, last_modified = cpi_data_version(conn)
+        if not_modified(version, last_modified):
+            return revalidate(make_response('', 304), version, last_modified)
+        frame = macro.get_frame(conn, version)
+    try:
+        params = _parse_data_args(request.args, frame)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    return render_template ('macro.html', fig_html=fig_html)
+    months, columns = frame.select(**params)
+    response = jsonify({
+        'version': version,
+        'months': [str(m) for m in months],
+        'series': {name: {metric: [None if v != v else round(v, 6) for v in column.tolist()]
+                          for metric, column in by_metric.items()}
+                   for name, by_metric in columns.items()},
+    })
+    return revalidate(response, version, last_modified)
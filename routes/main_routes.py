@@ -1,41 +1,147 @@
+import logging
 import os
 from dotenv import load_dotenv 
 load_dotenv()
 
-from flask import Blueprint, render_template, request, jsonify
-import plotly.graph_objs as go
-import plotly.io as pio
-import requests
-import pandas as pd
-from io import StringIO
-import sqlite3
-import json
-from plotly.utils import PlotlyJSONEncoder
-from openai import OpenAI
+from flask import Blueprint, render_template, request, jsonify, Response
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from services import db
+from services.columnar import ENCODINGS, PRICE_FIELDS, encode_series, price_columns
+from services.data_versions import HEADLINES, get_version
+from services.live_feed import RETRY_MS, LiveFeed, StreamLimitReached
+from services import metrics
+from services.metrics import latency
+from services.price_cache import PriceCache
+from services.timeseries import store
+from services.upstream import UpstreamError, twelvedata
+
+log = logging.getLogger(__name__)
 
 # --- Configuration ---
 API_KEY_TWELVEDATA = os.environ.get('API_KEY_TWELVEDATA')
-API_KEY_CHATGPT = os.environ.get('API_KEY_CHATGPT')
-DB_FILE = 'headlines.db'
-client = OpenAI(api_key=API_KEY_CHATGPT)
+
+# Dashboard sources run concurrently; each gets its own budget (seconds)
+# measured from the start of the request, after which a placeholder is shown.
+DASHBOARD_TIMEOUTS = {'price': 3.0, 'key_stats': 1.0, 'reuters': 1.0, 'cnbc': 1.0}
+dashboard_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='dashboard')
+
+# /get_stocks: Twelve Data takes comma-separated symbols; large requests are
+# split into chunks that are fetched in parallel.
+MAX_BATCH_SYMBOLS = 40
+BATCH_CHUNK_SIZE = 8
+MAX_OUTPUTSIZE = 5000
+price_fetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='price-fetch')
+
+PRICE_XAXIS = {
+    'type': 'date',
+    'rangeslider': {'visible': False},
+    'tickformatstops': [
+        {'dtickrange': [None, 1000], 'value': "%H:%M:%S.%L ms"},
+        {'dtickrange': [1000, 60000], 'value': "%H:%M:%S"},
+        {'dtickrange': [60000, 3600000], 'value': "%H:%M"},
+        {'dtickrange': [3600000, 86400000], 'value': "%H:%M<br>%Y-%m-%d"},
+        {'dtickrange': [86400000, 604800000], 'value': "%b %d<br>%Y"},
+        {'dtickrange': [604800000, "M1"], 'value': "%b %d"},
+        {'dtickrange': ["M1", "M12"], 'value': "%b %Y"},
+        {'dtickrange': ["M12", None], 'value': "%Y"},
+    ],
+}
 
 # --- Blueprint Definition ---
 main_bp = Blueprint('main', __name__)
 
 # --- Helper Functions (Moved from app.py) ---
-def get_price_data(ticker):
-    # ... (code for get_price_data helper function)
-    url = 'https://api.twelvedata.com/time_series'
-    params = {'symbol': ticker, 'interval': '1day', 'outputsize': 365, 'apikey': API_KEY_TWELVEDATA}
-    response = requests.get(url, params=params)
-    data = response.json()
-    if data.get('status') != 'ok': return None, None
-    df = pd.DataFrame(data['values'])
+def store_bars(symbol, interval, values):
+    """Keeps every fetched daily bar in the series store ('prices/<symbol>/<field>'), so history accumulates."""
+    if interval != '1day' or not values:
+        return
+    try:
+        _, t, columns = price_columns(values, PRICE_FIELDS, interval)
+        for field, column in columns.items():
+            store.write(f"prices/{symbol.replace('/', '-')}/{field}", t.astype('datetime64[D]'), column) # EUR/USD -> EUR-USD
+    except (OSError, ValueError) as e: # the store is a by-product; never fail the request over it
+        log.warning("Storing %s bars failed: %r", symbol, e)
+
+def fetch_time_series(symbol, interval, outputsize):
+    """Fetches raw bars from Twelve Data; returns None when the API reports an error."""
+    params = {'symbol': symbol, 'interval': interval, 'outputsize': outputsize, 'apikey': API_KEY_TWELVEDATA, 'format': 'JSON'}
+    data = twelvedata.get_json('/time_series', params)
+    if data.get('status') != 'ok': return None
+    store_bars(symbol, interval, data['values'])
+    return data['values']
+
+def _fetch_time_series_chunk(symbols, interval, outputsize):
+    params = {'symbol': ','.join(symbols), 'interval': interval, 'outputsize': outputsize, 'apikey': API_KEY_TWELVEDATA, 'format': 'JSON'}
+    data = twelvedata.get_json('/time_series', params, cost=len(symbols)) # one credit per symbol
+    if len(symbols) == 1: # single-symbol responses are not keyed by symbol
+        data = {symbols[0]: data}
+    results = {symbol: data[symbol]['values'] if data.get(symbol, {}).get('status') == 'ok' else None for symbol in symbols}
+    for symbol, values in results.items():
+        store_bars(symbol, interval, values)
+    return results
+
+def fetch_time_series_batch(symbols, interval, outputsize):
+    """
+    {symbol: values or None} using multi-symbol requests of BATCH_CHUNK_SIZE,
+    in parallel. Symbols of a failed chunk are left out, so the cache can fall
+    back to stale bars for them.
+    """
+    chunks = [symbols[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(symbols), BATCH_CHUNK_SIZE)]
+    results = {}
+    for chunk, future in [(chunk, metrics.submit(price_fetch_pool, _fetch_time_series_chunk, chunk, interval, outputsize)) for chunk in chunks]:
+        try:
+            results.update(future.result())
+        except Exception as e: # one failed chunk shouldn't sink the others
+            log.warning("Price batch %s failed: %r", chunk, e)
+    return results
+
+# While Twelve Data is failing (or the quota is spent) the last cached bars are served
+price_cache = PriceCache(fetch_time_series, persist=True, batch_fetcher=fetch_time_series_batch, stale_errors=(UpstreamError,))
+metrics.register_cache('price', price_cache.stats)
+
+def fetch_latest_prices(symbols):
+    """{symbol: latest trade price or None} in one multi-symbol /price request."""
+    params = {'symbol': ','.join(symbols), 'apikey': API_KEY_TWELVEDATA}
+    data = twelvedata.get_json('/price', params, cost=len(symbols), max_wait=0, budget='feed') # the next poll will try again
+    if len(symbols) == 1:
+        data = {symbols[0]: data}
+    return {symbol: float(data[symbol]['price']) if 'price' in data.get(symbol, {}) else None for symbol in symbols}
+
+# One producer per worker process feeds every /stream client
+live_feed = LiveFeed(fetch_latest_prices, {
+    'reuters_headlines': 'headline', 'CNBC_headlines': 'headline',
+    'reuters_headlines_summary': 'summary', 'CNBC_headlines_summary': 'summary',
+}, data_version=HEADLINES)
+MAX_STREAM_SYMBOLS = 10
+
+def _pandas():
+    import pandas # see HEAVY_MODULES in app.py
+    return pandas
+
+def _plotly():
+    import plotly.graph_objects # see HEAVY_MODULES in app.py
+    import plotly.io
+    return plotly.graph_objects, plotly.io
+
+def get_price_frame(ticker):
+    """Returns the cached daily price history for ticker as a float DataFrame, or None."""
+    pd = _pandas()
+    values = price_cache.get(ticker, '1day', 365)
+    if not values: return None
+    df = pd.DataFrame(values)
     df['datetime'] = pd.to_datetime(df['datetime'])
     df.set_index('datetime', inplace=True)
-    df = df.astype(float)
+    return df.astype(float)
+
+def get_price_data(ticker):
+    # ... (code for get_price_data helper function)
+    go, pio = _plotly()
+    df = get_price_frame(ticker)
+    if df is None: return None, None
     fig = go.Figure(go.Scatter(x=df.index, y=df['close'], mode='lines'))
-    fig_html = pio.to_html(fig, full_html=False)
+    fig_html = pio.to_html(fig, full_html=False, include_plotlyjs=False) # layout.html loads plotly.js
     price_data_frame = df[['close']].head(5).to_html(classes='table table-striped')
     return fig_html, price_data_frame
 
@@ -55,113 +161,187 @@ def get_key_stats(ticker):
 
 def get_news_summary(conn, table_name, summary_table_name):
     # ... (code for get_news_summary helper function)
+
+    # Get the latest summary directly from SQLite (pooled connections return sqlite3.Row)
+    summary_row = conn.execute(f"SELECT * FROM {summary_table_name} ORDER BY timestamp DESC LIMIT 1").fetchone()
     
-    conn.row_factory = sqlite3.Row # To access by column name
-    c = conn.cursor()
-    # Get the latest summary directly from SQLite
-    c.execute(f"SELECT * FROM {summary_table_name} ORDER BY timestamp DESC LIMIT 1")
-    summary_row = c.fetchone()
-    
-    latest_headlines_df = pd.read_sql_query(f"SELECT * FROM {table_name} ORDER BY timestamp DESC LIMIT 5", conn)
+    latest_headlines_df = _pandas().read_sql_query(f"SELECT timestamp, news FROM {table_name} ORDER BY timestamp DESC LIMIT 5", conn)
 
     return summary_row['news'], latest_headlines_df.to_html(index=False, classes='table table-sm')
 
 
+# table -> (headlines data version, (summary, html)); the scrapers bump the version
+news_cache = {}
+news_cache_stats = {'hits': 0, 'misses': 0}
+metrics.register_cache('news', lambda: dict(news_cache_stats, hit_ratio=round(
+    news_cache_stats['hits'] / max(1, news_cache_stats['hits'] + news_cache_stats['misses']), 4)))
+
+def get_news(table_name, summary_table_name):
+    """get_news_summary on its own pooled connection, so sources can run in parallel."""
+    with db.read_connection() as conn:
+        version = get_version(conn, HEADLINES)
+        cached = news_cache.get(table_name)
+        if version and cached is not None and cached[0] == version:
+            news_cache_stats['hits'] += 1
+            return cached[1]
+        news_cache_stats['misses'] += 1
+        result = get_news_summary(conn, table_name, summary_table_name)
+    news_cache[table_name] = (version, result)
+    return result
+
+def _timed(name, fn, *args):
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        latency.observe(f"dashboard.{name}", time.perf_counter() - start)
+
+def gather_dashboard(ticker):
+    """
+    Runs the independent dashboard sources concurrently. A source that errors
+    or overruns its DASHBOARD_TIMEOUTS budget is replaced by a placeholder; a
+    slow price fetch keeps running in the background and fills the cache.
+    """
+    unavailable = "<p class='text-muted'>Temporarily unavailable.</p>"
+    sources = {
+        'price': (get_price_data, (ticker,), ("<p class='text-muted'>Price chart is taking too long to load; please refresh shortly.</p>", unavailable)),
+        'key_stats': (get_key_stats, (ticker,), unavailable),
+        'reuters': (get_news, ('reuters_headlines', 'reuters_headlines_summary'), ("Summary unavailable.", unavailable)),
+        'cnbc': (get_news, ('CNBC_headlines', 'CNBC_headlines_summary'), ("Summary unavailable.", unavailable)),
+    }
+    start = time.monotonic()
+    futures = {name: metrics.submit(dashboard_pool, _timed, name, fn, *args) for name, (fn, args, _) in sources.items()}
+
+    results = {}
+    for name, future in futures.items():
+        try:
+            result = future.result(timeout=max(0.0, start + DASHBOARD_TIMEOUTS[name] - time.monotonic()))
+        except FutureTimeout:
+            latency.count_failure(f"dashboard.{name}")
+            result = sources[name][2]
+        except Exception as e:
+            log.warning("Dashboard source %s failed: %r", name, e)
+            latency.count_failure(f"dashboard.{name}")
+            result = sources[name][2]
+        results[name] = result
+    latency.observe("dashboard.total", time.monotonic() - start)
+    return results
+
 # --- Main Routes using the Blueprint ---
 @main_bp.route('/')
 def index():
     ticker = request.args.get("ticker", "NVDA").upper()
-    conn = sqlite3.connect(DB_FILE)
-    fig_html, price_data_frame = get_price_data(ticker)
-    key_stats_html = get_key_stats(ticker)
-    reuters_summary, reuters_html = get_news_summary(conn, 'reuters_headlines', 'reuters_headlines_summary')
-    cnbc_summary, cnbc_html = get_news_summary(conn, 'CNBC_headlines', 'CNBC_headlines_summary')
-    conn.close()
+    sources = gather_dashboard(ticker)
+    fig_html, price_data_frame = sources['price']
+    if fig_html is None: # unknown ticker / API error
+        fig_html, price_data_frame = f"<p class='text-muted'>No price data available for {ticker}.</p>", ""
+    key_stats_html = sources['key_stats']
+    reuters_summary, reuters_html = sources['reuters']
+    cnbc_summary, cnbc_html = sources['cnbc']
     return render_template('index.html', ticker=ticker, fig_html=fig_html, price_data_frame=price_data_frame, PE=key_stats_html, reuters=reuters_html, all_reuters_news_summary=reuters_summary, cnbc=cnbc_html, all_cnbc_news_summary=cnbc_summary)
 
 
 @main_bp.route('/get_stock')
 def get_stock():
-    
-    print(f"DEBUG: Full request.args: {request.args}")
-
-    # Try to get the ticker without a default first, then fall back
-    raw_ticker = request.args.get("ticker")
-    if raw_ticker is None:
-        ticker = "NVDA" # Explicitly default if not found
-        print(f"DEBUG: Ticker parameter NOT found in request.args. Defaulting to: {ticker}")
-    else:
-        ticker = raw_ticker.upper()
-        print(f"DEBUG: Ticker parameter found and set to: {ticker}")
-
-
-    # === Fetch price data ===
-    url = 'https://api.twelvedata.com/time_series'
-    params = {
-        'symbol': ticker,
-        'interval': '1day',
-        'outputsize': 365,
-        'apikey': API_KEY_TWELVEDATA,
-        'format': 'JSON'
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-
+    """Single-ticker chart + table; the figure is built as plain dicts from the cached series."""
+    ticker = request.args.get("ticker", "NVDA").upper()
     try:
-        df = pd.DataFrame(data['values'])
-        df['datetime'] = pd.to_datetime(df['datetime'])
-        df.set_index('datetime', inplace=True)
-        df = df.astype(float)
-
-        # Chart
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df.index, y=df['close'], mode='lines+markers'))
-        
-        fig.update_layout(
-            title=f'{ticker} Stock Price',
-            xaxis_rangeslider_visible=False,
-            xaxis=dict(
-                type="date",
-                tickformatstops=[
-                    dict(dtickrange=[None, 1000], value="%H:%M:%S.%L ms"),
-                    dict(dtickrange=[1000, 60000], value="%H:%M:%S"),
-                    dict(dtickrange=[60000, 3600000], value="%H:%M"),
-                    dict(dtickrange=[3600000, 86400000], value="%H:%M<br>%Y-%m-%d"),
-                    dict(dtickrange=[86400000, 604800000], value="%b %d<br>%Y"),
-                    dict(dtickrange=[604800000, "M1"], value="%b %d"),
-                    dict(dtickrange=["M1", "M12"], value="%b %Y"),
-                    dict(dtickrange=["M12", None], value="%Y")
-                ]
-            ),
-            yaxis_title="Close Price"
-        ) 
-
-        chart_data_json_str = json.dumps(fig.to_dict(), cls=PlotlyJSONEncoder)
-        chart_data = json.loads(chart_data_json_str)
-
-        # chart_data = fig.to_dict()
-        # fig_html = pio.to_html(fig, full_html=False)
-
-        # Table
-        price_table = df[['close']].head(5).to_html(classes='table table-striped')
-
+        values = price_cache.get(ticker, '1day', 365)
+    except UpstreamError as e: # down and nothing cached yet
+        log.warning("Price fetch for %s failed: %r", ticker, e)
+        values = None
+    if not values:
         return jsonify({
             'ticker': ticker,
-            'price_table': price_table,
-            'chart_data': {
-                    'data': chart_data['data'],
-                    'layout': chart_data['layout']
-            }
+            'price_table': f"<p class='text-danger'>Error fetching data for {ticker}. Please check the ticker and try again.</p>",
+            'chart_data': {'data': [], 'layout': {'title': f'No data available for {ticker}'}}
         })
 
-    except Exception as e:
-        # If an error occurs (e.g., invalid ticker), return an error message
-        # and an empty chart.
-        return jsonify({
-            'ticker': ticker,
-            'price_table': f"<p class='text-danger'>Error fetching data for {ticker}. Please check the ticker and try again.</p>",
-            'chart_data': {
-                    'data': [],
-                    'layout': {'title': f'No data available for {ticker}'}
-            }
-        })
\ No newline at end of file
+    ascending = values[::-1]
+    price_table = _pandas().DataFrame(values[:5]).set_index('datetime')[['close']].astype(float)
+    return jsonify({
+        'ticker': ticker,
+        'price_table': price_table.to_html(classes='table table-striped'),
+        'chart_data': {
+            'data': [{'type': 'scatter', 'mode': 'lines+markers',
+                      'x': [bar['datetime'] for bar in ascending], 'y': [float(bar['close']) for bar in ascending]}],
+            'layout': {'title': {'text': f'{ticker} Stock Price'}, 'xaxis': PRICE_XAXIS, 'yaxis': {'title': {'text': 'Close Price'}}}
+        }
+    })
+
+
+@main_bp.route('/get_stocks')
+def get_stocks():
+    """
+    Columnar price history for several tickers:
+    ?symbols=AAPL,MSFT[&fields=close,volume][&outputsize=365][&encoding=json|base64]
+    Cache misses are fetched together with Twelve Data's multi-symbol requests.
+    'missing' lists symbols Twelve Data has no data for; 'pending' those it
+    couldn't be asked for yet (quota spent or upstream down, nothing cached),
+    with Retry-After saying when to ask again.
+    """
+    symbols = list(dict.fromkeys(s.strip().upper() for s in request.args.get('symbols', 'NVDA').split(',') if s.strip()))
+    fields = [f.strip() for f in request.args.get('fields', 'close').split(',') if f.strip()]
+    encoding = request.args.get('encoding', 'json')
+    outputsize = request.args.get('outputsize', 365, type=int)
+    if not symbols or len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({'error': f'Between 1 and {MAX_BATCH_SYMBOLS} symbols are allowed.'}), 400
+    if not fields or set(fields) - set(PRICE_FIELDS):
+        return jsonify({'error': f'fields must be drawn from {", ".join(PRICE_FIELDS)}.'}), 400
+    if encoding not in ENCODINGS:
+        return jsonify({'error': f'encoding must be one of {", ".join(ENCODINGS)}.'}), 400
+    if not 1 <= outputsize <= MAX_OUTPUTSIZE:
+        return jsonify({'error': f'outputsize must be between 1 and {MAX_OUTPUTSIZE}.'}), 400
+
+    found = price_cache.get_many(symbols, '1day', outputsize)
+    series = {symbol: encode_series(found[symbol], fields, '1day', encoding) if found.get(symbol) else None for symbol in symbols}
+    pending = [symbol for symbol in symbols if symbol not in found]
+    response = jsonify({
+        'interval': '1day',
+        'encoding': encoding,
+        'fields': fields,
+        'series': series,
+        'missing': [symbol for symbol in symbols if symbol in found and series[symbol] is None],
+        'pending': pending,
+    })
+    if pending:
+        response.headers['Retry-After'] = str(max(1, round(twelvedata.wait_time(min(len(pending), BATCH_CHUNK_SIZE)))))
+    return response
+
+
+@main_bp.route('/stream')
+def stream():
+    """
+    Server-Sent Events: 'price' updates for ?symbols=NVDA,AAPL plus every new
+    'headline' and 'summary' row. Reconnects resume from Last-Event-ID on any
+    worker. A worker already holding MAX_STREAMS_PER_WORKER streams answers 503.
+    """
+    symbols = {s.strip().upper() for s in request.args.get('symbols', 'NVDA').split(',') if s.strip()}
+    if len(symbols) > MAX_STREAM_SYMBOLS:
+        return jsonify({'error': f'At most {MAX_STREAM_SYMBOLS} symbols per stream.'}), 400
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        subscriber = live_feed.subscribe(symbols, last_event_id)
+    except StreamLimitReached: # every stream slot on this worker is taken; try again, likely on another worker
+        return Response(f"retry: {RETRY_MS}\n\n", status=503, mimetype='text/event-stream',
+                        headers={'Retry-After': str(RETRY_MS // 1000), 'Cache-Control': 'no-cache'})
+    return Response(live_feed.events(subscriber), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@main_bp.route('/stream_stats')
+def stream_stats():
+    """Subscribers, polled symbols and publish/overflow counters for the live feed."""
+    return jsonify(live_feed.stats())
+
+
+@main_bp.route('/cache_stats')
+def cache_stats():
+    """Hit/miss counters for the shared price cache, and the Twelve Data client's call counters."""
+    return jsonify({'price_cache': price_cache.stats(), 'upstream': {'twelvedata': twelvedata.stats()}})
+
+
+@main_bp.route('/latency_stats')
+def latency_stats():
+    """Per-source dashboard latency (p50/p95/p99 over recent requests)."""
+    return jsonify(latency.summary())
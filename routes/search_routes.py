@@ -0,0 +1,81 @@
+# runtimes_app/routes/search_routes.py
+
+from datetime import date
+
+from flask import Blueprint, render_template, request, jsonify, url_for
+
+from services import db, search
+
+# --- Blueprint Definition ---
+search_bp = Blueprint('search', __name__)
+
+
+def _parse_args(args):
+    """The search parameters from a query string, or raises ValueError with a message for the client."""
+    params = {
+        'text': args.get('q', '').strip(),
+        'sort': args.get('sort', 'rank'),
+        'kinds': [k for k in args.get('kind', '').split(',') if k],
+        'page': args.get('page', 1, type=int),
+        'per_page': args.get('per_page', search.PER_PAGE, type=int),
+    }
+    for name in ('from', 'to'):
+        try:
+            params['start' if name == 'from' else 'end'] = date.fromisoformat(args[name]) if args.get(name) else None
+        except ValueError:
+            raise ValueError(f'{name} must be a date (YYYY-MM-DD).')
+    if params['sort'] not in search.SORTS:
+        raise ValueError(f'sort must be one of {", ".join(search.SORTS)}.')
+    if set(params['kinds']) - set(search.KINDS):
+        raise ValueError(f'kind must be drawn from {", ".join(search.KINDS)}.')
+    if not 1 <= params['page'] <= search.MAX_PAGE:
+        raise ValueError(f'page must be between 1 and {search.MAX_PAGE}.')
+    if not 1 <= params['per_page'] <= search.MAX_PER_PAGE:
+        raise ValueError(f'per_page must be between 1 and {search.MAX_PER_PAGE}.')
+    return params
+
+
+def run_search(params):
+    with db.read_connection() as conn:
+        results, has_more, truncated = search.search(conn, params['text'], params['start'], params['end'], params['kinds'],
+                                                     params['sort'], params['page'], params['per_page'])
+    for result in results:
+        if result['kind'] == 'post':
+            result['url'] = url_for('blog.show_post', post_id=result['id'])
+    return results, has_more and params['page'] < search.MAX_PAGE, truncated
+
+
+@search_bp.route('/')
+def search_page():
+    """Search form and one page of results: ?q=&from=&to=&kind=&sort=&page="""
+    try:
+        params = _parse_args(request.args)
+    except ValueError as e:
+        return render_template('search.html', args=request.args, error=str(e), results=[]), 400
+    results, has_more, truncated = run_search(params) if params['text'] else ([], False, False)
+    return render_template('search.html', args=request.args, params=params, results=results, has_more=has_more,
+                           truncated=truncated, rank_window=search.RANK_WINDOW)
+
+
+@search_bp.route('/api')
+def search_api():
+    """
+    JSON search over headlines, summaries and blog posts:
+    ?q=fed rates[&from=2025-01-01][&to=2025-06-30][&kind=headline,summary,post]
+    [&sort=rank|newest][&page=1][&per_page=20]
+    Snippets are HTML-escaped with matches wrapped in <mark>. With sort=rank
+    only the newest rank_window matches are scored; rank_truncated says
+    whether there were more (narrow from/to to rank older ones).
+    """
+    try:
+        params = _parse_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not params['text']:
+        return jsonify({'error': 'q is required.'}), 400
+    results, has_more, truncated = run_search(params)
+    body = {'query': params['text'], 'page': params['page'], 'results': results,
+            'next_page': params['page'] + 1 if has_more else None}
+    if params['sort'] == 'rank':
+        body.update(rank_window=search.RANK_WINDOW, rank_truncated=truncated)
+    return jsonify(body)
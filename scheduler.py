@@ -0,0 +1,76 @@
+import argparse
+import signal
+import time
+
+from services import db
+from services.migrations import migrate
+from services.scheduler import Job, Scheduler, recent_runs
+
+import scrape_fred
+import scrape_headlines
+
+# Long-running worker for the data jobs (Procfile: worker). All headline
+# sources are scraped in one job, sharing one Chromium; a source that fails
+# is retried on its own without holding up the rest.
+FRED_INTERVAL = 6 * 3600
+HEADLINE_INTERVAL = 30 * 60
+HEADLINE_RETRIES = 2
+
+
+def fred_job():
+    report = scrape_fred.ingest()
+    updated = [line['name'] for line in report if line['status'] == 'updated']
+    return {'updated': updated, 'rows': sum(line['rows'] for line in report)}
+
+def headline_job(sources, retries):
+    """
+    Every due source in one scrape_headlines.run() call. A retry re-scrapes
+    only the sources the previous attempt failed on; the next scheduled run
+    starts over with all of them.
+    """
+    state = {'due': [], 'attempts': 0}
+    def run():
+        state['attempts'] += 1
+        if not state['due'] or state['attempts'] > retries + 1:
+            state['due'], state['attempts'] = list(sources), 1
+        due = state['due']
+        results = scrape_headlines.run(due)
+        state['due'] = [source for source in due if isinstance(results[source['name']], BaseException)]
+        if state['due']:
+            raise RuntimeError('; '.join(f"{source['name']}: {results[source['name']]!r}" for source in state['due']))
+        return {'headlines': {name: len(result) for name, result in results.items()}}
+    return run
+
+def build_scheduler():
+    scheduler = Scheduler()
+    scheduler.add(Job('fred', fred_job, FRED_INTERVAL, retries=3, backoff=60, lease=3600))
+    scheduler.add(Job('headlines', headline_job(scrape_headlines.SOURCES, HEADLINE_RETRIES), HEADLINE_INTERVAL,
+                      retries=HEADLINE_RETRIES, backoff=30, lease=20 * 60))
+    return scheduler
+
+def print_history(job=None):
+    with db.read_connection() as conn:
+        for name, started, seconds, status, attempts, error, result in recent_runs(conn, job):
+            line = f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}  {name:<20} {status:<9} {attempts} attempt(s)"
+            if seconds is not None:
+                line += f"  {seconds:7.1f}s"
+            print(line + f"  {result or ((error or '').strip().splitlines() or [''])[-1]}")
+
+
+if __name__ == '__main__':
+    scheduler = build_scheduler()
+    parser = argparse.ArgumentParser(description='Runs the FRED and headline jobs on a schedule.')
+    parser.add_argument('--once', choices=sorted(scheduler.jobs), help='run one job now and exit')
+    parser.add_argument('--history', nargs='?', const='', metavar='JOB', help='show recent runs and exit')
+    args = parser.parse_args()
+
+    migrate()
+    if args.history is not None:
+        print_history(args.history or None)
+    elif args.once:
+        scheduler.run_job(scheduler.jobs[args.once])
+    else:
+        signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+        signal.signal(signal.SIGINT, lambda *_: scheduler.stop())
+        print(f"Scheduler {scheduler.owner}: {', '.join(scheduler.jobs)}")
+        scheduler.run_forever()
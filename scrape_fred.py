@@ -1,70 +1,137 @@
 import pandas as pd
-import numpy as np
-from datetime import datetime as dt
-from datetime import timedelta
-import plotly.express as px
-import plotly.graph_objects as go
-import plotly.io as pio
-from plotly.subplots import make_subplots
-import sqlite3
-
-import os 
-from dotenv import load_dotenv 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services import db
+from services.data_versions import FRED, bump
+from services.migrations import migrate
+
+import os
+from dotenv import load_dotenv
 load_dotenv()
 
-# API key for FRED 
+from services.upstream import fred # reads FRED_API_URL / FRED_REQUESTS_PER_MINUTE, so after load_dotenv
+
+# API key for FRED
 API_KEY_FRED = os.environ.get('API_KEY_FRED')
-tickers = {'CPIAUCSL': 'CPI', #all cpi related are SA 
-           'CPILFESL': 'Core CPI', 
-           'CPIUFDSL': 'CPI Food', 
-           'CPIENGSL': 'CPI Energy', 
-           'PCEPI': 'PCE', 
+MAX_WORKERS = 6
+tickers = {'CPIAUCSL': 'CPI', #all cpi related are SA
+           'CPILFESL': 'Core CPI',
+           'CPIUFDSL': 'CPI Food',
+           'CPIENGSL': 'CPI Energy',
+           'PCEPI': 'PCE',
            'PCEPILFE': 'Core PCE',
            'CUSR0000SACL1E': 'CPI Core Goods',
            'CUSR0000SASLE': 'CPI Core Service',
            'CUSR0000SAH1': 'Shelter',
-           'CUSR0000SAM2': 'Medical Care', 
+           'CUSR0000SAM2': 'Medical Care',
            'CUSR0000SAS4': 'Transportation',
-           'CPIEDUSL':'Education and Communication', 
+           'CPIEDUSL':'Education and Communication',
            'CPIRECSL':'Recreation'
-           } 
+           }
 
 ########### funtion #############
-def fetchFred(api_key, tickers):
-  combine = pd.DataFrame()
-  updates = pd.Series(dtype='float')
+def fred_api_key(raw_key):
+  """The key used to be appended to URLs as '&api_key=...'; accept either form."""
+  return raw_key.split('api_key=')[-1] if raw_key else raw_key
+
+def parse_observations(observations, name):
+  """FRED observations (list of {'date', 'value'}) -> float Series; FRED marks gaps with '.'."""
+  obs = pd.DataFrame(observations, columns=['date', 'value'])
+  values = pd.to_numeric(obs['value'], errors='coerce')
+  series = pd.Series(values.to_numpy(), index=pd.to_datetime(obs['date']), name=name)
+  return series.dropna()
 
-  for i in tickers.keys(): 
-      url = f'https://api.stlouisfed.org/fred/series?series_id={i}{api_key}' # get latest release date
-      df = pd.read_xml(url, parse_dates=['last_updated'])
-      updates[tickers[i]] = (df['last_updated'][0])
+def fetch_series(api_key, series_id, name, known_update=None, last_date=None):
+  """
+  Fetches one series. Skips the observations when FRED's last_updated matches
+  known_update, and otherwise only asks for observations from last_date on
+  (the last stored point is re-read in case it was revised).
+  """
+  start = time.perf_counter()
+  params = {'series_id': series_id, 'api_key': api_key, 'file_type': 'json'}
 
-      url = f'https://api.stlouisfed.org/fred/series/observations?series_id={i}{api_key}' # get data
-      df = pd.read_xml(url, parse_dates=['date'])
-      df.set_index('date', inplace=True)
-      filt = (df['value'] != '.') # some data from fred is in weird . string
-      single = df[filt]['value'].apply(lambda x: float(x)).to_frame(tickers[i]) # excluding . and turn into float
-      combine = pd.concat([combine, single], axis=1)
+  # services.upstream.fred: pooled keep-alive session, timeouts, retries, FRED's rate limit
+  last_updated = str(pd.Timestamp(fred.get_json('/series', params)['seriess'][0]['last_updated']))
+  result = {'series_id': series_id, 'name': name, 'last_updated': last_updated, 'observations': None}
 
+  if last_updated != known_update:
+    if last_date is not None:
+      params['observation_start'] = f"{pd.Timestamp(last_date):%Y-%m-%d}"
+    result['observations'] = parse_observations(fred.get_json('/series/observations', params)['observations'], name)
+
+  result['seconds'] = round(time.perf_counter() - start, 3)
+  return result
+
+def fetch_all(api_key, tickers, known_updates=None, last_dates=None, max_workers=MAX_WORKERS):
+  """Fetches every series concurrently with a bounded pool; returns results in ticker order."""
+  known_updates, last_dates = known_updates or {}, last_dates or {}
+  with ThreadPoolExecutor(max_workers=max_workers) as pool:
+    futures = [pool.submit(fetch_series, api_key, series_id, name, known_updates.get(name), last_dates.get(name))
+               for series_id, name in tickers.items()]
+    return [future.result() for future in futures]
+
+def fetchFred(api_key, tickers):
+  """Full history of every series as (latest update times, wide DataFrame)."""
+  results = fetch_all(fred_api_key(api_key), tickers)
+  updates = pd.Series({r['name']: pd.Timestamp(r['last_updated']) for r in results})
+  combine = pd.concat([r['observations'] for r in results], axis=1)
   combine.index.name = 'date_column'
   combine = combine.sort_index()
   return updates, combine
 
-########### Scrape and save into DB #############
-cpi_update, cpi_df = fetchFred(API_KEY_FRED, tickers)
+########### Incremental upsert into DB #############
+def ensure_columns(conn, names):
+  """One REAL column per series; the tables themselves come from services/migrations.py."""
+  existing = {row[1] for row in conn.execute('PRAGMA table_info(fred_cpi_data)')}
+  for name in names:
+    if name not in existing:
+      conn.execute(f'ALTER TABLE fred_cpi_data ADD COLUMN "{name}" REAL')
+
+def stored_state(conn, names):
+  """Latest update time and last stored observation date for each series."""
+  known_updates = dict(conn.execute('SELECT "index", "Latest update" FROM fred_cpi_update_time'))
+  last_dates = {}
+  for name in names:
+    last_date = conn.execute(f'SELECT MAX(date_column) FROM fred_cpi_data WHERE "{name}" IS NOT NULL').fetchone()[0]
+    if last_date is not None:
+      last_dates[name] = last_date
+  return known_updates, last_dates
 
-cpi_update = pd.DataFrame(cpi_update)
-cpi_update.columns=['Latest update']
+def upsert_series(conn, name, series):
+  rows = [(f"{date:%Y-%m-%d %H:%M:%S}", value) for date, value in zip(series.index, series.to_numpy().tolist())]
+  conn.executemany(f'''INSERT INTO fred_cpi_data (date_column, "{name}") VALUES (?, ?)
+                       ON CONFLICT(date_column) DO UPDATE SET "{name}" = excluded."{name}"''', rows)
+  return len(rows)
 
-cpi_df.index.name = 'date_column' # Name your index column
+def ingest(db_file=None, api_key=API_KEY_FRED, tickers=tickers, max_workers=MAX_WORKERS):
+  """Fetches what changed since the last run and upserts it. Returns per-series timings."""
+  migrate(db_file)
+  conn = db.connect(db_file)
+  names = list(tickers.values())
+  with conn:
+    ensure_columns(conn, names)
+  known_updates, last_dates = stored_state(conn, names)
 
-# Connect to your SQLite database
-conn = sqlite3.connect('headlines.db') # Assuming you're adding to your existing DB
+  results = fetch_all(fred_api_key(api_key), tickers, known_updates, last_dates, max_workers)
 
-# Store the DataFrame
-# index=True will store the DataFrame's index (your datetime index) as a column
-# if_exists='replace' will overwrite the table if it exists, 'append' would add rows
-cpi_df.to_sql('fred_cpi_data', conn, if_exists='replace', index=True)
-cpi_update.to_sql('fred_cpi_update_time', conn, if_exists='replace', index=True)
+  report = []
+  with conn: # one transaction for all series
+    for r in results:
+      rows = 0
+      if r['observations'] is not None:
+        rows = upsert_series(conn, r['name'], r['observations'])
+        conn.execute('INSERT INTO fred_cpi_update_time VALUES (?, ?) ON CONFLICT("index") DO UPDATE SET "Latest update" = excluded."Latest update"',
+                     (r['name'], r['last_updated']))
+      report.append({'series_id': r['series_id'], 'name': r['name'], 'rows': rows,
+                     'status': 'updated' if r['observations'] is not None else 'unchanged', 'seconds': r['seconds']})
+    if any(line['status'] == 'updated' for line in report):
+      bump(conn, FRED)
+  conn.close()
+  return report
 
-conn.close()
\ No newline at end of file
+if __name__ == '__main__':
+  start = time.perf_counter()
+  for line in ingest():
+    print(f"{line['series_id']:<16} {line['name']:<28} {line['status']:<10} {line['rows']:>5} rows  {line['seconds']:.3f}s")
+  print(f"Total: {time.perf_counter() - start:.3f}s")
@@ -1,101 +1,126 @@
-import os 
-from dotenv import load_dotenv 
+import os
+from dotenv import load_dotenv
 load_dotenv()
 
-import pandas as pd
-from playwright.sync_api import sync_playwright
-import sqlite3
+import asyncio
+from playwright.async_api import async_playwright
 import datetime
 from openai import OpenAI
 
-API_KEY_CHATGPT = os.environ.get('API_KEY_CHATGPT')
-DB_FILE = 'headlines.db'
-client = OpenAI(api_key=API_KEY_CHATGPT)
-
-####################### Prepare db #######################    
-conn = sqlite3.connect('headlines.db')
-c = conn.cursor()
-
-####################### Function #######################    
-def get_news_summary(conn, table_name):
-    # ... (code for get_news_summary helper function)
-    query = f"SELECT * FROM {table_name} WHERE DATE(timestamp) = DATE('now', 'localtime')"
-    news_df = pd.read_sql_query(query, conn)
-    if news_df.empty: return    f"No {table_name.split('_')[0].upper()} news found for today.", pd.DataFrame().to_html()
-    prompt = f"Parse these headlines, tell me the time range, and summarize in four sentences using Traditional Chinese: {news_df.to_string()}"
-    response = client.chat.completions.create(model="gpt-4.1-nano", messages=[{"role": "user", "content": prompt}])
-    summary = response.choices[0].message.content
-    return summary
-
-####################### Scraping Reuters Headlines #######################    
-url = 'http://www.reuters.com'
-
-with sync_playwright() as playwright:
-    browser = playwright.chromium.launch(headless=False)
-    page = browser.new_page()
-    page.goto("https://www.reuters.com/", wait_until="domcontentloaded")
-    headlines = []
-    for i in page.get_by_test_id('TitleHeading').all():
-        headlines.append(i.inner_text())
-    browser.close()
-
-# with open(f"G:/My Drive/Coding/flask1/test.txt", "w", encoding="utf-8") as f:
-#     for i in headlines:
-#         f.write( str(datetime.datetime.now()) + i +'\n') 
-
-# c.execute(""" CREATE TABLE IF NOT EXISTS reuters_headlines(timestamp TEXT, news TEXT)
-#             """)
-
-now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-for i in headlines:
-    c.execute("""INSERT INTO reuters_headlines VALUES(?, ?)""" ,(now, i))
-
-### LLM to summarize into another file ###
-c.execute(""" CREATE TABLE IF NOT EXISTS reuters_headlines_summary(timestamp TEXT, news TEXT)
-            """)
-c.execute(""" INSERT INTO reuters_headlines_summary VALUES(?, ?) """, (now, get_news_summary(conn, 'reuters_headlines')
-))
-
-conn.commit()
-
-# c.execute("SELECT * FROM reuters_headlines ORDER BY timestamp DESC LIMIT 5")
-# print(c.fetchall())
+from services import db
+from services.data_versions import HEADLINES, bump
+from services.headlines import insert_new_headlines, summarize_headlines
+from services.migrations import migrate, ensure_source_tables
 
-
-####################### Scraping CNBC Headlines #######################    
-url = 'https://www.cnbc.com/'
-
-with sync_playwright() as playwright:
-    browser = playwright.chromium.launch(headless=False)
-    page = browser.new_page()
-    page.goto(url, wait_until="domcontentloaded")
-    headlines = []
-    for i in page.query_selector_all('[class*="headline"]'):
-        if i.inner_text != "":
-            headlines.append(i.inner_text())
-
-    browser.close()
-
-now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-# with open('test.txt', "w", encoding="utf-8") as f:
-#     for i in headlines:
-#         if i != "":
-#             f.write( i +'\n') 
-
-c.execute(""" CREATE TABLE IF NOT EXISTS CNBC_headlines(timestamp TEXT, news TEXT)
-            """)
-
-for i in headlines:
-    c.execute("""INSERT INTO CNBC_headlines VALUES(?, ?)""" ,(now, i))
-
-
-### LLM to summarize into another file ###
-c.execute(""" CREATE TABLE IF NOT EXISTS CNBC_headlines_summary(timestamp TEXT, news TEXT)
-            """)
-c.execute(""" INSERT INTO CNBC_headlines_summary VALUES(?, ?) """, (now, get_news_summary(conn, 'reuters_headlines')
-))
-
-
-conn.commit()
\ No newline at end of file
+API_KEY_CHATGPT = os.environ.get('API_KEY_CHATGPT')
+OPENAI_TIMEOUT_S = 60
+
+####################### Sources #######################
+# Adding a site is one entry here: every source is scraped as a page of the
+# same headless browser. URLs may be file:// paths to local HTML fixtures.
+SOURCES = [
+    {'name': 'reuters', 'url': 'https://www.reuters.com/', 'selector': '[data-testid="TitleHeading"]', 'table': 'reuters_headlines'},
+    {'name': 'cnbc', 'url': 'https://www.cnbc.com/', 'selector': '[class*="headline"]', 'table': 'CNBC_headlines'},
+]
+
+# Headlines are text: skip everything that only costs bandwidth
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font'}
+BLOCKED_HOSTS = ('doubleclick.net', 'googlesyndication.com', 'googletagmanager.com', 'google-analytics.com',
+                 'amazon-adsystem.com', 'scorecardresearch.com', 'taboola.com', 'outbrain.com', 'chartbeat.com')
+PAGE_TIMEOUT_MS = 45_000
+
+# All matched headline texts in one round trip to the page
+EXTRACT_HEADLINES_JS = "els => els.map(e => e.innerText.trim()).filter(text => text !== '')"
+
+_client = None
+
+def get_client():
+    """OpenAI client, built on first use so importing this module needs no key."""
+    global _client
+    if _client is None:
+        # The SDK pools connections and retries on its own; bound each call so a stall can't hold the job
+        _client = OpenAI(api_key=API_KEY_CHATGPT, timeout=OPENAI_TIMEOUT_S, max_retries=2)
+    return _client
+
+####################### Function #######################
+def get_news_summary(conn, table_name, client=None):
+    """Summary of today's headlines; returns (summary, cached) - cached summaries cost no LLM call."""
+    return summarize_headlines(conn, table_name, client or get_client())
+
+async def _block_heavy_requests(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(host in request.url for host in BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def scrape_source(context, source):
+    """Loads one source in its own page and returns its headline texts."""
+    page = await context.new_page()
+    try:
+        await page.goto(source['url'], wait_until="domcontentloaded", timeout=PAGE_TIMEOUT_MS)
+        return await page.eval_on_selector_all(source['selector'], EXTRACT_HEADLINES_JS)
+    finally:
+        await page.close()
+
+async def scrape_all(sources=SOURCES, headless=True):
+    """
+    Scrapes every source concurrently with one shared browser.
+    Returns {source name: list of headlines, or the exception that source raised}.
+    """
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=headless)
+        context = await browser.new_context()
+        await context.route("**/*", _block_heavy_requests)
+        results = await asyncio.gather(*(scrape_source(context, source) for source in sources), return_exceptions=True)
+        await browser.close()
+    return {source['name']: result for source, result in zip(sources, results)}
+
+def save_headlines(conn, sources, results, now):
+    """Writes every source's new headlines in a single transaction; returns {source name: rows inserted}."""
+    inserted = {}
+    with conn:
+        for source in sources:
+            headlines = results.get(source['name'])
+            if isinstance(headlines, BaseException) or not headlines:
+                continue
+            ensure_source_tables(conn, source['table']) # no-op for the migrated built-in sources
+            inserted[source['name']] = insert_new_headlines(conn, source['table'], headlines, now)
+        if any(inserted.values()):
+            bump(conn, HEADLINES) # web workers drop their cached headline fragments
+    return inserted
+
+def save_summaries(conn, sources, now, client=None):
+    """LLM summary of today's headlines into each source's summary table; returns {source name: status}."""
+    status = {}
+    for source in sources:
+        summary, cached = get_news_summary(conn, source['table'], client)
+        if summary is None or cached: # nothing today yet, or the latest summary row already covers this set
+            status[source['name']] = 'unchanged'
+            continue
+        with conn:
+            conn.execute(f"INSERT INTO {source['table']}_summary VALUES(?, ?)", (now, summary))
+            bump(conn, HEADLINES)
+        status[source['name']] = 'updated'
+    return status
+
+def run(sources=SOURCES, db_file=None, headless=True, client=None):
+    results = asyncio.run(scrape_all(sources, headless))
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    migrate(db_file)
+    conn = db.connect(db_file)
+    inserted = save_headlines(conn, sources, results, now)
+    scraped = [source for source in sources if not isinstance(results[source['name']], BaseException)]
+    summaries = save_summaries(conn, scraped, now, client)
+    conn.close()
+
+    for name, result in results.items():
+        if isinstance(result, BaseException):
+            print(f"{name}: error: {result}")
+        else:
+            print(f"{name}: {len(result)} headlines, {inserted.get(name, 0)} new, summary {summaries[name]}")
+    return results
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,47 @@
+import argparse
+import time
+
+from services import db
+from services.migrations import migrate
+from services.search import RANK_WINDOW, rebuild, search
+
+# Maintenance for the full-text index (services/search.py). Triggers keep it
+# in sync on every write; --rebuild re-indexes everything from the source
+# tables, e.g. after bulk edits made with the triggers dropped or a tokenizer change.
+
+
+def run_rebuild():
+    start = time.perf_counter()
+    conn = db.connect()
+    with conn:
+        counts = rebuild(conn)
+    conn.close()
+    for table, rows in counts.items():
+        print(f"{table}: {rows} rows")
+    print(f"Rebuilt the search index in {time.perf_counter() - start:.1f}s")
+
+def run_query(text, sort):
+    with db.read_connection() as conn:
+        start = time.perf_counter()
+        results, has_more, truncated = search(conn, text, sort=sort)
+        seconds = time.perf_counter() - start
+    for result in results:
+        print(f"{result['timestamp']}  {result['source']:<26} {result['title'] or ''} {result['snippet']}")
+    print(f"{len(results)}{'+' if has_more else ''} results in {seconds * 1000:.1f} ms"
+          + (f" (ranked the newest {RANK_WINDOW} matches)" if truncated else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuilds or queries the full-text search index.')
+    parser.add_argument('--rebuild', action='store_true', help='re-index every headline, summary and post')
+    parser.add_argument('--query', metavar='TEXT', help='run a search and print the first page')
+    parser.add_argument('--sort', choices=('rank', 'newest'), default='rank')
+    args = parser.parse_args()
+
+    migrate()
+    if args.rebuild:
+        run_rebuild()
+    if args.query:
+        run_query(args.query, args.sort)
+    if not (args.rebuild or args.query):
+        parser.print_help()
@@ -0,0 +1,136 @@
+# runtimes_app/services/bess_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from services import db
+from services.bess_model import BESS_PARAMS
+
+# Bump when calculate_bess_financials or its response changes, so results
+# persisted by the old model are never served
+MODEL_VERSION = 1
+# Inputs are rounded before hashing and before computing, so e.g. 0.1 + 0.2
+# and 0.3 share an entry and a cached result is exactly the one for its key
+ROUND_DECIMALS = 6
+DEFAULT_MAX_BYTES = int(os.environ.get('BESS_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+DB_MAX_ROWS = 10_000
+PRUNE_EVERY = 100 # writes between trims of the bess_results table
+
+
+def canonical_inputs(inputs):
+    """A complete input set in BESS_PARAMS order, rounded; asset_life as an int."""
+    # + 0.0 turns -0.0 into 0.0, which would otherwise hash differently
+    return {name: int(inputs[name]) if name == 'asset_life' else round(float(inputs[name]), ROUND_DECIMALS) + 0.0
+            for name in BESS_PARAMS}
+
+
+def input_key(canonical):
+    """sha256 of the model version and the canonical inputs."""
+    text = json.dumps([MODEL_VERSION, canonical], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class BessResultCache:
+    """
+    Memoized BESS model results keyed by a hash of the canonical inputs.
+
+    compute(canonical_inputs) returns the response body as JSON text. Results
+    are kept in an in-process LRU capped at max_bytes and, when persist is set,
+    in the bess_results table, so every worker and the next deploy share them.
+    """
+
+    def __init__(self, compute, persist=False, max_bytes=DEFAULT_MAX_BYTES):
+        self.compute = compute
+        self.persist = persist
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> JSON text
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._writes = 0
+        self._counters = {'hits': 0, 'db_hits': 0, 'computes': 0, 'evictions': 0}
+
+    def get(self, inputs):
+        """The JSON result for a complete input set, computed at most once per key."""
+        canonical = canonical_inputs(inputs)
+        key = input_key(canonical)
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                return payload
+
+        payload = self._read_db(key)
+        if payload is not None:
+            counter = 'db_hits'
+        else:
+            counter = 'computes'
+            payload = self.compute(canonical)
+            self._write_db(key, payload)
+        with self._lock:
+            self._counters[counter] += 1
+        self._store(key, payload)
+        return payload
+
+    def warm(self, input_sets):
+        """Loads or computes each input set, e.g. the presets before workers fork."""
+        for inputs in input_sets:
+            self.get(inputs)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['db_hits'] + stats['computes']
+        stats['hit_ratio'] = round((stats['hits'] + stats['db_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # --- Internals ---
+    def _store(self, key, payload):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = payload
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._counters['evictions'] += 1
+
+    def _read_db(self, key):
+        if not self.persist:
+            return None
+        try:
+            with db.read_connection() as conn:
+                row = conn.execute("SELECT payload FROM bess_results WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def _write_db(self, key, payload):
+        if not self.persist:
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        try:
+            with db.transaction() as conn:
+                conn.execute("INSERT OR REPLACE INTO bess_results VALUES (?, ?, ?)", (key, payload, time.time()))
+                if prune: # keep the newest DB_MAX_ROWS results
+                    conn.execute("""DELETE FROM bess_results WHERE created_at <
+                                    (SELECT created_at FROM bess_results ORDER BY created_at DESC LIMIT 1 OFFSET ?)""",
+                                 (DB_MAX_ROWS - 1,))
+        except sqlite3.Error:
+            pass # The in-process copy still serves this worker
@@ -0,0 +1,166 @@
+# runtimes_app/services/bess_model.py
+
+import math
+
+import numpy as np
+
+from services.irr import irr_rows
+
+# Parameter order matches calculate_bess_financials in routes/bess_routes.py
+BESS_PARAMS = (
+    'asset_life', 'BESS_size_MW', 'duration', 'overbuild', 'degradation',
+    'availability', 'rte', 'DoD', 't4_usd_MWh', 'b4_usd_MWh',
+    'BESS_module_plus_PCS_unit_usd_kWh', 'epc_unit_usd_kWh', 'om_unit_kW_yr', 'opex_esc',
+)
+
+PRESET_CASES = {
+    'good': {
+        'asset_life': 25, 'BESS_size_MW': 12, 'duration': 4.5,
+        'overbuild': 0.10, 'degradation': 0.015, 'availability': 0.99,
+        'rte': 0.92, 'DoD': 0.95, 't4_usd_MWh': 150, 'b4_usd_MWh': 25,
+        'BESS_module_plus_PCS_unit_usd_kWh': 100, 'epc_unit_usd_kWh': 60,
+        'om_unit_kW_yr': 12, 'opex_esc': 0.02
+    },
+    'base': {
+        'asset_life': 20, 'BESS_size_MW': 10, 'duration': 4,
+        'overbuild': 0.15, 'degradation': 0.02, 'availability': 0.98,
+        'rte': 0.90, 'DoD': 0.90, 't4_usd_MWh': 139, 'b4_usd_MWh': 30,
+        'BESS_module_plus_PCS_unit_usd_kWh': 105, 'epc_unit_usd_kWh': 70,
+        'om_unit_kW_yr': 15, 'opex_esc': 0.025
+    },
+    'bad': {
+        'asset_life': 15, 'BESS_size_MW': 8, 'duration': 3.5,
+        'overbuild': 0.20, 'degradation': 0.03, 'availability': 0.95,
+        'rte': 0.88, 'DoD': 0.85, 't4_usd_MWh': 120, 'b4_usd_MWh': 40,
+        'BESS_module_plus_PCS_unit_usd_kWh': 115, 'epc_unit_usd_kWh': 80,
+        'om_unit_kW_yr': 18, 'opex_esc': 0.03
+    },
+}
+
+# Accepted range (inclusive) of each user-supplied input
+BESS_RANGES = {
+    'asset_life': (1, 50), 'BESS_size_MW': (0.1, 2000), 'duration': (0.25, 24),
+    'overbuild': (0, 1), 'degradation': (0, 0.2), 'availability': (0.5, 1),
+    'rte': (0.5, 1), 'DoD': (0.1, 1), 't4_usd_MWh': (0, 5000), 'b4_usd_MWh': (-500, 5000),
+    'BESS_module_plus_PCS_unit_usd_kWh': (0, 2000), 'epc_unit_usd_kWh': (0, 2000),
+    'om_unit_kW_yr': (0, 500), 'opex_esc': (-0.1, 0.2),
+}
+
+DEFAULT_DISCOUNT_RATE = 0.08
+DISCOUNT_RATE_RANGE = (0, 1)
+MAX_SCENARIOS = 100_000
+
+
+def validate_inputs(inputs):
+    """
+    Returns a list of error strings for inputs outside BESS_RANGES. Values
+    may be scalars or arrays (batch scenarios, grid axes); every element is checked.
+    """
+    errors = []
+    for name, value in inputs.items():
+        if name not in BESS_RANGES:
+            errors.append(f"Unknown parameter '{name}'")
+            continue
+        low, high = BESS_RANGES[name]
+        try:
+            values = np.asarray(value)
+        except ValueError: # ragged nested lists
+            values = np.asarray(None)
+        if values.dtype.kind not in 'iuf' or not np.all(np.isfinite(values)): # bools, strings, None, NaN
+            errors.append(f"'{name}' must be a number")
+        elif np.any((values < low) | (values > high)):
+            errors.append(f"'{name}' must be between {low} and {high}")
+        elif name == 'asset_life' and np.any(values != np.round(values)):
+            errors.append("'asset_life' must be a whole number of years")
+    return errors
+
+
+def bess_cash_flows(params):
+    """
+    Cash flow matrix ($000s) for a batch of scenarios.
+
+    params maps every name in BESS_PARAMS to a scalar or a 1-D array; all
+    arrays broadcast to the scenario count. Row i holds years 0..max(asset_life)
+    for scenario i, zero-padded past its own asset_life.
+    """
+    p = {name: np.asarray(params[name], dtype=float) for name in BESS_PARAMS}
+    asset_life = np.broadcast_to(p['asset_life'], np.broadcast(*p.values()).shape).astype(int)
+    count = asset_life.size
+    p = {name: np.broadcast_to(value, (count,))[:, None] for name, value in p.items()}
+
+    # Single values, as column vectors so they broadcast across years
+    size_MWh = p['BESS_size_MW'] * p['duration'] * (1 + p['overbuild'])
+    discharge_MWh_base = size_MWh * p['DoD'] * p['rte'] * 365 * p['availability']
+    charge_MWh_base = discharge_MWh_base / p['rte']
+    total_hard_cost_usdk = (p['BESS_module_plus_PCS_unit_usd_kWh'] + p['epc_unit_usd_kWh']) * size_MWh
+    total_opex_usdk = p['om_unit_kW_yr'] * p['BESS_size_MW']
+
+    # Time series
+    years = np.arange(asset_life.max() + 1)
+    operating = (years > 0) & (years <= asset_life.reshape(-1, 1))
+    degradation_factor = (1 - p['degradation']) ** years
+    arbitrage_usdk = (discharge_MWh_base * p['t4_usd_MWh'] - charge_MWh_base * p['b4_usd_MWh']) / 1000 * degradation_factor
+    opex_usdk = total_opex_usdk * (1 + p['opex_esc']) ** years
+
+    cash_flows = np.where(operating, arbitrage_usdk - opex_usdk, 0.0)
+    cash_flows[:, 0] = -total_hard_cost_usdk[:, 0] # CAPEX only in Year 0
+    return cash_flows
+
+
+def evaluate_scenarios(params, discount_rate=DEFAULT_DISCOUNT_RATE):
+    """Final IRR (%) and NPV ($000s) for every scenario, without building DataFrames."""
+    cash_flows = bess_cash_flows(params)
+    irr = irr_rows(cash_flows) * 100
+    irr[irr < -100] = np.nan
+    discount = (1 + discount_rate) ** -np.arange(cash_flows.shape[1])
+    return {'irr': irr, 'npv': cash_flows @ discount}
+
+
+def expand_grid(base, grid, max_points=MAX_SCENARIOS):
+    """
+    Cartesian product of the grid axes on top of the base inputs.
+
+    grid maps parameter names to either a non-empty list of values or a
+    {'start', 'stop', 'num'} linspace spec. Returns (params, axes), where
+    params holds flattened arrays ready for evaluate_scenarios. Raises
+    ValueError for a malformed axis or if the grid would exceed max_points,
+    checked before any axis is built.
+    """
+    sizes = {}
+    for name, spec in grid.items():
+        if isinstance(spec, dict):
+            num = spec.get('num')
+            if isinstance(num, bool) or not isinstance(num, int) or num < 1:
+                raise ValueError(f"'{name}': num must be a positive integer")
+            if not all(isinstance(spec.get(key), (int, float)) and not isinstance(spec.get(key), bool)
+                       for key in ('start', 'stop')):
+                raise ValueError(f"'{name}': start and stop must be numbers")
+            sizes[name] = num
+        elif isinstance(spec, list) and spec:
+            sizes[name] = len(spec)
+        else:
+            raise ValueError(f"'{name}': must be a non-empty list of values or {{start, stop, num}}")
+    points = math.prod(sizes.values())
+    if points > max_points:
+        raise ValueError(f"{points} grid points requested, the limit is {max_points}")
+
+    axes = {}
+    for name, spec in grid.items():
+        if isinstance(spec, dict):
+            axes[name] = np.linspace(spec['start'], spec['stop'], spec['num'])
+        else:
+            try:
+                axes[name] = np.asarray(spec, dtype=float)
+            except (TypeError, ValueError): # strings, objects, ragged lists
+                axes[name] = None
+            if axes[name] is None or axes[name].ndim != 1:
+                raise ValueError(f"'{name}': must be a flat list of numbers")
+    mesh = np.meshgrid(*axes.values(), indexing='ij')
+    params = dict(base)
+    params.update({name: values.ravel() for name, values in zip(axes, mesh)})
+    return params, axes
+
+
+def scenarios_to_params(base, scenarios):
+    """Turns a list of per-scenario overrides into column arrays over the base inputs."""
+    return {name: np.array([s.get(name, base[name]) for s in scenarios], dtype=float) for name in BESS_PARAMS}
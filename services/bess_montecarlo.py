@@ -0,0 +1,305 @@
+# runtimes_app/services/bess_montecarlo.py
+
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from services import db, metrics
+from services.bess_model import BESS_PARAMS, DEFAULT_DISCOUNT_RATE, evaluate_scenarios
+
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+CHUNK_SIZE = 25_000 # paths per vectorized evaluation; bounds peak memory per worker
+MAX_PATHS = 1_000_000
+PROCESS_POOL_THRESHOLD = 200_000 # smaller runs are faster inline than paying IPC
+MAX_JOBS_KEPT = 500 # finished jobs kept in bess_jobs
+# Jobs run in the web worker that accepted them, at most MAX_RUNNING_JOBS at a
+# time per worker; state and results live in the bess_jobs table so a status
+# or stream request can land on any worker.
+MAX_RUNNING_JOBS = int(os.environ.get('MONTECARLO_MAX_JOBS', 2))
+# Each worker's process pool gets its share of the cores, not all of them;
+# gunicorn.conf.py exports the worker count (one process under flask run)
+WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+POOL_PROCESSES = int(os.environ.get('MONTECARLO_PROCESSES', max(1, (os.cpu_count() or 1) // WORKERS)))
+STREAM_POLL_S = 0.5 # how often a stream on another worker re-reads the job row
+STALE_JOB_S = 120 # a running job whose row hasn't been touched for this long lost its worker
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+HISTOGRAM_BINS = 50
+
+# Any model input except asset_life can be sampled, plus the t4/b4 spread
+# (sampled spreads replace t4_usd_MWh with b4_usd_MWh + spread).
+SAMPLED_PARAMS = tuple(name for name in BESS_PARAMS if name != 'asset_life') + ('spread',)
+DISTRIBUTIONS = {
+    'normal': ('mean', 'std'),
+    'lognormal': ('mean', 'sigma'), # parameters of the underlying normal
+    'uniform': ('low', 'high'),
+    'triangular': ('low', 'mode', 'high'),
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def validate_distributions(distributions):
+    """Returns a list of error strings for an invalid distributions spec."""
+    if not isinstance(distributions, dict):
+        return ["distributions must map parameter names to {dist, ...} objects"]
+    errors = []
+    for name, spec in distributions.items():
+        if name not in SAMPLED_PARAMS:
+            errors.append(f"'{name}' cannot be sampled")
+            continue
+        kind = spec.get('dist') if isinstance(spec, dict) else None
+        if kind not in DISTRIBUTIONS:
+            errors.append(f"'{name}': dist must be one of {', '.join(DISTRIBUTIONS)}")
+            continue
+        required = DISTRIBUTIONS[kind] + tuple(bound for bound in ('min', 'max') if bound in spec)
+        invalid = [arg for arg in required if not _is_number(spec.get(arg))]
+        if invalid:
+            errors.append(f"'{name}': needs numeric {', '.join(invalid)}")
+            continue
+        # The orderings numpy's samplers need, checked now rather than failing inside the job
+        if kind == 'normal' and spec['std'] < 0:
+            errors.append(f"'{name}': std must not be negative")
+        elif kind == 'lognormal' and spec['sigma'] < 0:
+            errors.append(f"'{name}': sigma must not be negative")
+        elif kind == 'uniform' and spec['low'] > spec['high']:
+            errors.append(f"'{name}': low must not exceed high")
+        elif kind == 'triangular' and not (spec['low'] <= spec['mode'] <= spec['high'] and spec['low'] < spec['high']):
+            errors.append(f"'{name}': needs low <= mode <= high and low < high")
+        if 'min' in spec and 'max' in spec and spec['min'] > spec['max']:
+            errors.append(f"'{name}': min must not exceed max")
+    return errors
+
+
+def _draw(rng, spec, n):
+    kind = spec['dist']
+    if kind == 'normal':
+        values = rng.normal(spec['mean'], spec['std'], n)
+    elif kind == 'lognormal':
+        values = rng.lognormal(spec['mean'], spec['sigma'], n)
+    elif kind == 'uniform':
+        values = rng.uniform(spec['low'], spec['high'], n)
+    else:
+        values = rng.triangular(spec['low'], spec['mode'], spec['high'], n)
+    if 'min' in spec or 'max' in spec:
+        values = np.clip(values, spec.get('min'), spec.get('max'))
+    return values
+
+
+def simulate_chunk(base, distributions, n, seed_seq, discount_rate):
+    """Draws n paths and returns their (irr %, npv $000s) as float32 arrays."""
+    rng = np.random.default_rng(seed_seq)
+    params = dict(base)
+    for name, spec in distributions.items():
+        params[name] = _draw(rng, spec, n)
+    spread = params.pop('spread', None)
+    if spread is not None:
+        params['t4_usd_MWh'] = np.asarray(params['b4_usd_MWh']) + spread
+    results = evaluate_scenarios(params, discount_rate)
+    return results['irr'].astype(np.float32), results['npv'].astype(np.float32)
+
+
+def summarize(irr, npv):
+    """Percentiles, histograms and probability of loss for the simulated paths."""
+    summary = {'paths': int(len(npv)), 'probability_of_loss': float(np.mean(npv < 0))}
+    for label, values in (('irr_pct', irr[np.isfinite(irr)]), ('npv_usdk', npv)):
+        if values.size == 0:
+            summary[label] = None
+            continue
+        counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+        summary[label] = {
+            'mean': float(values.mean()),
+            'percentiles': {f"p{q}": float(v) for q, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+            'histogram': {'counts': counts.tolist(), 'edges': edges.tolist()},
+        }
+    summary['irr_undefined_share'] = float(np.mean(~np.isfinite(irr)))
+    return summary
+
+
+# --- Process pool (created lazily, once per web worker) ---
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a multi-threaded web worker is not safe
+            _pool = ProcessPoolExecutor(max_workers=POOL_PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _off_hub(fn, *args):
+    """
+    Calls fn(*args) where it can't stall the worker. Under gevent the job's
+    thread is a greenlet, so an inline chunk (0.1-0.2 s each) would hold the
+    hub and every request and stream with it; gevent's native thread pool
+    runs it while they keep getting turns.
+    """
+    if db.cooperative():
+        from gevent import get_hub
+        return get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+
+class JobLimitReached(Exception):
+    """This worker already runs MAX_RUNNING_JOBS simulations."""
+
+
+class MonteCarloJob:
+    """A simulation run in a background thread; every state change is written to bess_jobs."""
+
+    def __init__(self, base, distributions, paths, seed=None, discount_rate=DEFAULT_DISCOUNT_RATE):
+        self.id = uuid.uuid4().hex
+        self.base = base
+        self.distributions = distributions
+        self.paths = paths
+        self.seed = seed
+        self.discount_rate = discount_rate
+        self.status = 'queued'
+        self.completed = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.updated = threading.Condition()
+
+    def run(self):
+        started = time.time()
+        self._set(status='running')
+        try:
+            # Chunk seeds are spawned from one SeedSequence, so a given seed
+            # reproduces the same paths whether or not the pool is used.
+            sizes = [CHUNK_SIZE] * (self.paths // CHUNK_SIZE)
+            if self.paths % CHUNK_SIZE:
+                sizes.append(self.paths % CHUNK_SIZE)
+            seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+            offsets = np.cumsum([0] + sizes)
+            irr = np.empty(self.paths, dtype=np.float32)
+            npv = np.empty(self.paths, dtype=np.float32)
+            args = (self.base, self.distributions)
+
+            if self.paths >= PROCESS_POOL_THRESHOLD:
+                pool = _get_pool()
+                futures = {pool.submit(simulate_chunk, *args, n, s, self.discount_rate): i
+                           for i, (n, s) in enumerate(zip(sizes, seeds))}
+                chunks = ((futures[f], f.result()) for f in as_completed(futures))
+            else:
+                chunks = ((i, _off_hub(simulate_chunk, *args, n, s, self.discount_rate))
+                          for i, (n, s) in enumerate(zip(sizes, seeds)))
+
+            for i, (chunk_irr, chunk_npv) in chunks:
+                irr[offsets[i]:offsets[i + 1]] = chunk_irr
+                npv[offsets[i]:offsets[i + 1]] = chunk_npv
+                self._set(completed=self.completed + sizes[i])
+
+            self._set(result=_off_hub(summarize, irr, npv), status='done', finished_at=time.time())
+            metrics.bess_seconds.observe(self.finished_at - started, 'montecarlo')
+        except Exception as e:
+            self._set(error=str(e), status='error', finished_at=time.time())
+
+    def _set(self, **changes):
+        with self.updated:
+            for key, value in changes.items():
+                setattr(self, key, value)
+            _save(self)
+            self.updated.notify_all()
+
+
+# --- Job registry: the bess_jobs table, shared by every worker ---
+_running = {} # job id -> MonteCarloJob, for the jobs this worker runs
+_running_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_RUNNING_JOBS)
+
+def _save(job):
+    try:
+        with db.transaction() as conn:
+            conn.execute("""INSERT OR REPLACE INTO bess_jobs
+                            (id, status, paths, completed, seed, result, error, created_at, finished_at, updated_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                         (job.id, job.status, job.paths, job.completed, job.seed,
+                          json.dumps(job.result) if job.result is not None else None,
+                          job.error, job.created_at, job.finished_at, time.time()))
+    except sqlite3.Error as e:
+        log.error("Saving Monte Carlo job %s failed: %r", job.id, e)
+
+def _prune():
+    with db.transaction() as conn:
+        conn.execute("""DELETE FROM bess_jobs WHERE finished_at IS NOT NULL AND id NOT IN
+                        (SELECT id FROM bess_jobs WHERE finished_at IS NOT NULL ORDER BY created_at DESC LIMIT ?)""",
+                     (MAX_JOBS_KEPT,))
+
+def _run(job):
+    try:
+        job.run()
+    finally:
+        with _running_lock:
+            _running.pop(job.id, None)
+        _slots.release()
+
+def start_job(*args, **kwargs):
+    """Starts a job in this worker; raises JobLimitReached when all its slots are busy."""
+    if not _slots.acquire(blocking=False):
+        raise JobLimitReached(f"{MAX_RUNNING_JOBS} Monte Carlo runs are already in progress")
+    try:
+        job = MonteCarloJob(*args, **kwargs)
+        _save(job)
+        _prune()
+        with _running_lock:
+            _running[job.id] = job
+        threading.Thread(target=_run, args=(job,), name=f"montecarlo-{job.id[:8]}", daemon=True).start()
+    except BaseException:
+        _slots.release()
+        raise
+    return job
+
+def get_job(job_id):
+    """The job's state as served by the status endpoint, or None for an unknown id."""
+    with db.read_connection() as conn:
+        row = conn.execute("""SELECT id, status, paths, completed, seed, result, error, created_at, finished_at, updated_at
+                              FROM bess_jobs WHERE id = ?""", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job_id, status, paths, completed, seed, result, error, created_at, finished_at, updated_at = row
+    if status in ('queued', 'running') and time.time() - updated_at > STALE_JOB_S:
+        status, error = 'error', 'The worker running this job exited' # restarted or killed mid-run
+    data = {
+        'job_id': job_id,
+        'status': status,
+        'paths': paths,
+        'completed': completed,
+        'progress': round(completed / paths, 4),
+        'seed': seed,
+    }
+    if status == 'done':
+        data['elapsed_s'] = round(finished_at - created_at, 3)
+        data['result'] = json.loads(result)
+    elif status == 'error':
+        data['error'] = error
+    return data
+
+def wait_for_update(job_id, seen, timeout):
+    """
+    Returns once the job's (status, completed) differs from seen: woken by the
+    job itself when this worker runs it, otherwise after a short poll interval.
+    """
+    with _running_lock:
+        job = _running.get(job_id)
+    if job is None:
+        time.sleep(min(timeout, STREAM_POLL_S))
+        return
+    with job.updated:
+        if (job.status, job.completed) == seen:
+            job.updated.wait(timeout)
@@ -0,0 +1,48 @@
+# runtimes_app/services/columnar.py
+
+import base64
+
+import numpy as np
+
+# Compact chart payloads: one time axis plus one float array per field,
+# instead of a serialized plotly figure with per-point date strings.
+#   encoding='json'   -> plain number lists (NaN -> null)
+#   encoding='base64' -> little-endian typed arrays, e.g.
+#                        new Float64Array(bytes.buffer) on the client
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+ENCODINGS = ('json', 'base64')
+DAILY_INTERVALS = ('1day', '1week', '1month')
+
+
+def price_columns(values, fields=('close',), interval='1day'):
+    """
+    Twelve Data bars (newest first, string fields) -> ascending time axis and
+    float64 columns. The axis is epoch days for daily and longer intervals,
+    epoch seconds for intraday ones.
+    """
+    values = values[::-1]
+    stamps = np.array([bar['datetime'] for bar in values], dtype='datetime64[s]')
+    if interval in DAILY_INTERVALS:
+        t, unit = stamps.astype('datetime64[D]').astype(np.int32), 'day'
+    else:
+        t, unit = stamps.astype(np.int64), 's'
+    columns = {field: np.array([bar.get(field) for bar in values], dtype=np.float64) for field in fields}
+    return unit, t, columns
+
+
+def _encode(array, encoding):
+    if encoding == 'base64':
+        array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+        return {'dtype': array.dtype.name, 'data': base64.b64encode(array.tobytes()).decode('ascii')}
+    if array.dtype.kind == 'f' and np.isnan(array).any():
+        return [None if np.isnan(v) else v for v in array.tolist()]
+    return array.tolist()
+
+
+def encode_series(values, fields=('close',), interval='1day', encoding='json'):
+    """{'t_unit', 't', <field>: ...} for one symbol's bars."""
+    unit, t, columns = price_columns(values, fields, interval)
+    series = {'t_unit': unit, 't': _encode(t, encoding)}
+    for field, column in columns.items():
+        series[field] = _encode(column, encoding)
+    return series
@@ -0,0 +1,27 @@
+# runtimes_app/services/data_versions.py
+
+import sqlite3
+import time
+
+# Writers (scrapers, scheduled jobs) bump a named counter in the same
+# transaction as their data; web workers compare it against the version their
+# caches were built from. One primary-key lookup per check, across processes.
+FRED = 'fred'
+HEADLINES = 'headlines'
+POSTS = 'posts'
+
+
+def bump(conn, name):
+    """Marks name's data as changed. Call inside the writer's transaction."""
+    conn.execute("INSERT INTO data_versions(name, version, updated_at) VALUES (?, 1, ?) "
+                 "ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+                 (name, time.time()))
+
+
+def get_version(conn, name):
+    """Current version of name; 0 if it was never bumped (or the table isn't there yet)."""
+    try:
+        row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
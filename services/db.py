@@ -0,0 +1,189 @@
+# runtimes_app/services/db.py
+
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from services.metrics import record_query
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Absolute, so the app and the scrapers hit the same file whatever the cwd
+DB_FILE = os.environ.get('DB_FILE', os.path.join(ROOT_DIR, 'headlines.db'))
+
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+BUSY_TIMEOUT_S = 5.0 # readers never wait in WAL mode; writers queue behind each other
+# Under gevent SQLite's busy handler would sleep in C and stall every greenlet
+# in the worker, so writers wait for the lock in short cooperative naps instead
+COOPERATIVE_BUSY_TIMEOUT_MS = 1
+COOPERATIVE_NAP_S = 0.005
+STATEMENT_CACHE_SIZE = 256
+PRAGMAS = (
+    'PRAGMA synchronous = NORMAL', # safe with WAL, skips an fsync per commit
+    'PRAGMA cache_size = -16000', # 16 MB page cache per connection
+    'PRAGMA mmap_size = 268435456', # 256 MB memory-mapped reads
+    'PRAGMA temp_store = MEMORY',
+)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Reports each statement's execution time to services.metrics (per request and overall)."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(time.perf_counter() - start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """conn.execute() and conn.cursor() (used by pandas) both go through InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def cooperative():
+    """Whether this process runs under gevent's monkey patching (GUNICORN_PROFILE=gevent)."""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def connect(db_file=None, readonly=False):
+    """
+    A tuned connection. Writers switch the database to WAL so readers never
+    block behind them (the setting is persistent, so read-only connections
+    inherit it).
+    """
+    db_file = db_file or DB_FILE
+    if readonly:
+        conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_S, factory=InstrumentedConnection,
+                               check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    else:
+        conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_S, factory=InstrumentedConnection,
+                               check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode = WAL')
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """
+    A small per-process pool. Connections are handed to one thread at a
+    time and reused, so requests skip connect + schema parsing and keep
+    their prepared statement cache. The pool resets itself after a fork.
+    """
+
+    def __init__(self, db_file=None, readonly=False, size=POOL_SIZE):
+        self.db_file = db_file
+        self.readonly = readonly
+        self.size = size
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+
+    def _check_fork(self):
+        if self._pid != os.getpid(): # connections must not cross a fork
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue(maxsize=self.size)
+                    self._pid = os.getpid()
+
+    @contextmanager
+    def connection(self):
+        self._check_fork()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = connect(self.db_file, self.readonly)
+            conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool(readonly):
+    key = (DB_FILE, readonly)
+    with _pools_lock:
+        if key not in _pools:
+            if readonly:
+                connect().close() # make sure the file is in WAL mode before read-only opens
+            _pools[key] = ConnectionPool(DB_FILE, readonly)
+        return _pools[key]
+
+def read_connection():
+    """Pooled read-only connection for request handlers: `with read_connection() as conn:`."""
+    return _pool(readonly=True).connection()
+
+def write_connection():
+    """Pooled read-write connection; the caller commits (`with conn:`)."""
+    return _pool(readonly=False).connection()
+
+def _begin_immediate(conn):
+    if not cooperative():
+        conn.execute('BEGIN IMMEDIATE')
+        return
+    deadline = time.monotonic() + BUSY_TIMEOUT_S
+    conn.execute(f'PRAGMA busy_timeout = {COOPERATIVE_BUSY_TIMEOUT_MS}')
+    try:
+        while True:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or time.monotonic() > deadline:
+                    raise
+            time.sleep(COOPERATIVE_NAP_S) # patched: yields to the other greenlets
+    finally:
+        conn.execute(f'PRAGMA busy_timeout = {int(BUSY_TIMEOUT_S * 1000)}') # for the commit
+
+@contextmanager
+def transaction():
+    """
+    Pooled writer inside BEGIN IMMEDIATE: the write lock is taken up front
+    (waiting up to BUSY_TIMEOUT_S) rather than failing on a lock upgrade
+    halfway through. Commits on success, rolls back on error.
+    """
+    with write_connection() as conn:
+        _begin_immediate(conn)
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
@@ -0,0 +1,236 @@
+# runtimes_app/services/delivery.py
+
+import gzip
+import hashlib
+import importlib.util
+import mimetypes
+import os
+import stat
+import threading
+from datetime import datetime, timezone
+
+try:
+    import brotli # optional: pip install Brotli
+except ImportError:
+    brotli = None
+
+# Dynamic HTML/JSON above MIN_COMPRESS_BYTES is compressed per response with
+# a fast setting (brotli when the client accepts it, else gzip). Static files
+# are compressed once at the highest setting and kept in memory next to the
+# raw bytes. url_for('static', filename='style.css') yields a content-hashed
+# name (style.3f9a1c2b7d.css) that is cached for a year as immutable; a
+# changed file gets a new name, so there is nothing to invalidate.
+MIN_COMPRESS_BYTES = 1024
+COMPRESSIBLE = {'text/html', 'text/plain', 'text/css', 'text/csv', 'application/json',
+                'application/javascript', 'text/javascript', 'image/svg+xml'}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+HASH_CHARS = 10
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+TEMPLATES_DIR = os.path.join(os.path.dirname(STATIC_DIR), 'templates')
+
+# Plotly.js pinned to the installed plotly package (the version the server-side
+# figures are rendered for), served as static/plotly.min.js. PLOTLY_JS may point
+# at a partial bundle (e.g. plotly-basic.min.js) when the pages only need
+# scatter/bar traces.
+PLOTLY_JS = os.environ.get('PLOTLY_JS') or os.path.join(
+    importlib.util.find_spec('plotly').submodule_search_locations[0], 'package_data', 'plotly.min.js')
+
+
+def choose_encoding(accept_encodings):
+    """'br', 'gzip' or None for a request's Accept-Encoding."""
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, static=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=STATIC_GZIP_LEVEL if static else GZIP_LEVEL, mtime=0)
+
+
+class StaticAssets:
+    """
+    The files under static/ (plus virtual entries such as plotly.min.js),
+    read into memory with their content hash and compressed variants.
+    Entries are re-read when the file's mtime or size changes.
+    """
+
+    def __init__(self, root=STATIC_DIR, extra=None):
+        self.root = root
+        self.extra = extra or {} # logical name -> path outside root
+        self._entries = {} # logical name -> entry dict
+        self._hashed = {}  # hashed name -> logical name
+        self._lock = threading.Lock()
+
+    def _source(self, name):
+        if name in self.extra:
+            return self.extra[name]
+        path = os.path.realpath(os.path.join(self.root, name))
+        if not path.startswith(os.path.realpath(self.root) + os.sep):
+            return None
+        return path
+
+    def get(self, name):
+        """The entry for a logical name, or None if there is no such file."""
+        path = self._source(name)
+        try:
+            st = os.stat(path) if path else None
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            return None
+        identity = (st.st_mtime_ns, st.st_size)
+        entry = self._entries.get(name)
+        if entry is not None and entry['identity'] == identity:
+            return entry
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:HASH_CHARS]
+        stem, ext = os.path.splitext(name)
+        entry = {'identity': identity, 'data': data, 'hash': digest, 'hashed_name': f"{stem}.{digest}{ext}",
+                 'encoded': {}, 'name': name}
+        with self._lock:
+            self._entries[name] = entry
+            self._hashed[entry['hashed_name']] = name
+        return entry
+
+    def resolve(self, filename):
+        """(entry, whether filename was the hashed name) for a requested file name."""
+        logical = self._hashed.get(filename)
+        if logical is not None:
+            entry = self.get(logical)
+            if entry is not None and entry['hashed_name'] == filename:
+                return entry, True
+        stem, ext = os.path.splitext(filename)
+        stem, _, digest = stem.rpartition('.')
+        if stem and len(digest) == HASH_CHARS:
+            entry = self.get(stem + ext) # a hashed name not looked up by this process yet
+            if entry is not None:
+                # A stale hash (a page rendered before a deploy) gets the current file, uncached
+                return entry, entry['hashed_name'] == filename
+        return self.get(filename), False
+
+    def encoded(self, entry, encoding):
+        """The entry's bytes in encoding, compressed once; None if compression does not pay."""
+        if encoding not in entry['encoded']:
+            with self._lock:
+                if encoding not in entry['encoded']:
+                    body = compress(entry['data'], encoding, static=True)
+                    entry['encoded'][encoding] = body if len(body) < len(entry['data']) else None
+        return entry['encoded'][encoding]
+
+    def names(self):
+        found = list(self.extra)
+        for directory, _, files in os.walk(self.root):
+            found += [os.path.relpath(os.path.join(directory, f), self.root).replace(os.sep, '/') for f in files]
+        return found
+
+    def warm(self):
+        """Hashes and compresses every asset up front (a preloading gunicorn master shares them with its workers)."""
+        for name in self.names():
+            entry = self.get(name)
+            if entry is not None and _mimetype(name) in COMPRESSIBLE:
+                for encoding in ('br', 'gzip') if brotli is not None else ('gzip',):
+                    self.encoded(entry, encoding)
+
+
+def _mimetype(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+assets = StaticAssets(extra={'plotly.min.js': PLOTLY_JS})
+
+
+_build = None
+_build_lock = threading.Lock()
+
+def build():
+    """
+    (id, time) of the deployed templates and static assets. Pages whose
+    validators only follow their data (the macro page) include the id, so a
+    deploy that changes a template or an asset hash is never answered with a
+    304 for HTML linking to assets that no longer exist. BUILD_ID (e.g. the
+    git sha) replaces the computed id when set.
+    """
+    global _build
+    with _build_lock:
+        if _build is None:
+            digest, newest = hashlib.sha256(), 0.0
+            for name in sorted(assets.names()):
+                entry = assets.get(name)
+                if entry is not None:
+                    digest.update(f"{name}={entry['hash']}\n".encode())
+                    newest = max(newest, entry['identity'][0] / 1e9)
+            for directory, _, files in sorted(os.walk(TEMPLATES_DIR)):
+                for file in sorted(files):
+                    path = os.path.join(directory, file)
+                    with open(path, 'rb') as f:
+                        digest.update(f.read())
+                    newest = max(newest, os.stat(path).st_mtime)
+            build_id = os.environ.get('BUILD_ID') or digest.hexdigest()[:HASH_CHARS]
+            _build = (build_id, datetime.fromtimestamp(int(newest), timezone.utc))
+        return _build
+
+
+# --- Flask integration ---
+def init_app(app):
+    """Hashed static URLs with immutable caching, and compression of text responses."""
+    from flask import abort, request
+
+    @app.url_defaults
+    def _hashed_static_url(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            entry = assets.get(values['filename'])
+            if entry is not None:
+                values['filename'] = entry['hashed_name']
+
+    def serve_static(filename):
+        entry, hashed = assets.resolve(filename)
+        if entry is None:
+            abort(404)
+        mimetype = _mimetype(entry['name'])
+        response = app.response_class(entry['data'], mimetype=mimetype)
+        if mimetype in COMPRESSIBLE:
+            response.vary.add('Accept-Encoding')
+            encoding = choose_encoding(request.accept_encodings)
+            body = assets.encoded(entry, encoding) if encoding else None
+            if body is not None:
+                response.set_data(body)
+                response.headers['Content-Encoding'] = encoding
+        if hashed:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            # Unhashed URLs (old pages, direct links) revalidate every time
+            response.cache_control.no_cache = True
+        response.set_etag(entry['hash'], weak='Content-Encoding' in response.headers)
+        return response.make_conditional(request)
+
+    app.view_functions['static'] = serve_static
+
+    @app.after_request
+    def _compress(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE):
+            return response
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None or len(data) < MIN_COMPRESS_BYTES:
+            return response
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed bytes differ from the identity ones, so a strong
+        # validator becomes weak (routes compare with contains_weak)
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
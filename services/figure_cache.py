@@ -0,0 +1,73 @@
+# runtimes_app/services/figure_cache.py
+
+import json
+import sqlite3
+import threading
+import time
+
+from services import db
+
+
+class FigureCache:
+    """
+    Rendered chart artifacts (HTML + figure JSON) keyed by name and data version.
+
+    Only the latest version of each artifact is kept, in process and in the
+    figure_cache table, so when the underlying data changes the next request
+    re-renders once and every worker picks the new artifact up from SQLite.
+    """
+
+    def __init__(self, persist=False):
+        self.persist = persist
+        self._memory = {} # name -> (version, artifact)
+        self._lock = threading.Lock()
+        self._render_locks = {}
+        self._counters = {'hits': 0, 'db_hits': 0, 'renders': 0}
+
+    def get(self, name, version, render):
+        """Returns the artifact dict for (name, version), calling render() on a miss."""
+        cached = self._memory.get(name)
+        if cached is not None and cached[0] == version:
+            self._counters['hits'] += 1
+            return cached[1]
+
+        with self._lock:
+            render_lock = self._render_locks.setdefault(name, threading.Lock())
+        with render_lock: # one render per artifact at a time
+            cached = self._memory.get(name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            artifact = self._read_db(name, version)
+            if artifact is None:
+                self._counters['renders'] += 1
+                artifact = render()
+                self._write_db(name, version, artifact)
+            else:
+                self._counters['db_hits'] += 1
+            self._memory[name] = (version, artifact)
+            return artifact
+
+    def stats(self):
+        stats = dict(self._counters)
+        lookups = stats['hits'] + stats['db_hits'] + stats['renders']
+        stats['hit_ratio'] = round((stats['hits'] + stats['db_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _read_db(self, name, version):
+        if not self.persist:
+            return None
+        try:
+            with db.read_connection() as conn:
+                row = conn.execute("SELECT artifact FROM figure_cache WHERE name = ? AND version = ?", (name, version)).fetchone()
+        except sqlite3.Error:
+            return None
+        return json.loads(row[0]) if row else None
+
+    def _write_db(self, name, version, artifact):
+        if not self.persist:
+            return
+        try:
+            with db.transaction() as conn:
+                conn.execute("INSERT OR REPLACE INTO figure_cache VALUES (?, ?, ?, ?)", (name, version, json.dumps(artifact), time.time()))
+        except sqlite3.Error:
+            pass # The in-process copy still serves this worker
@@ -0,0 +1,113 @@
+# runtimes_app/services/headlines.py
+
+import datetime
+import hashlib
+import json
+import re
+import unicodedata
+
+from services import metrics
+
+SUMMARY_MODEL = "gpt-4.1-nano"
+FULL_PROMPT = "Parse these headlines, tell me the time range, and summarize in four sentences using Traditional Chinese: {headlines}"
+DELTA_PROMPT = ("Here is a four-sentence Traditional Chinese summary of today's headlines so far:\n{summary}\n\n"
+                "Update it with these newly published headlines, keeping it to four sentences in Traditional Chinese "
+                "and extending the time range if needed: {headlines}")
+
+
+# --- Headline de-duplication ---
+def normalize_headline(text):
+    """Case, width and whitespace variants of a headline normalize to the same string."""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = re.sub(r"[‘’“”]", "'", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def headline_hash(text):
+    return hashlib.sha1(normalize_headline(text).encode('utf-8')).hexdigest()
+
+def ensure_dedup_index(conn, table):
+    """
+    Adds a news_hash column to a headline table, with an index on
+    (news_hash, timestamp) for the windowed duplicate check in
+    insert_new_headlines. Existing rows are backfilled.
+    """
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if 'news_hash' not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN news_hash TEXT")
+        conn.executemany(f"UPDATE {table} SET news_hash = ? WHERE rowid = ?",
+                         [(headline_hash(news or ''), rowid) for rowid, news in conn.execute(f"SELECT rowid, news FROM {table}")])
+    conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_news_hash_timestamp ON {table}(news_hash, timestamp)")
+
+def insert_new_headlines(conn, table, headlines, now):
+    """
+    Inserts the headlines not already stored within the summary window (the
+    day of now); returns how many were new. A story still running from an
+    earlier day is stored again, so it is part of today's summary.
+    """
+    window_start = f"{now[:10]} 00:00:00"
+    rows = [(now, headline, digest, digest, window_start) for headline, digest in ((h, headline_hash(h)) for h in headlines)]
+    # rowcount, not total_changes: the search index triggers' writes count towards the latter
+    return conn.executemany(f"""INSERT INTO {table}(timestamp, news, news_hash) SELECT ?, ?, ?
+                               WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE news_hash = ? AND timestamp >= ?)""", rows).rowcount
+
+
+# --- Summary cache ---
+def day_bounds(day=None):
+    """['YYYY-MM-DD 00:00:00', next day) for range scans on the timestamp indexes."""
+    day = day or datetime.date.today()
+    return f"{day:%Y-%m-%d} 00:00:00", f"{day + datetime.timedelta(days=1):%Y-%m-%d} 00:00:00"
+
+def todays_headlines(conn, table):
+    """(timestamp, news, hash) for headlines first seen today, local time."""
+    rows = conn.execute(f"SELECT timestamp, news, news_hash FROM {table} WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+                        day_bounds()).fetchall()
+    return [(timestamp, news, digest or headline_hash(news)) for timestamp, news, digest in rows]
+
+def _format(rows):
+    return "\n".join(f"{timestamp} {news}" for timestamp, news, _ in rows)
+
+def summarize_headlines(conn, table, client, now=None):
+    """
+    Returns (summary, cached) for today's headlines in table; summary is
+    None when there are none yet.
+
+    The summary is cached under the hash of the exact headline set, so an
+    unchanged set never reaches the LLM. When new headlines arrive, the most
+    recent cached summary of a subset is updated with only the new ones.
+    """
+    rows = todays_headlines(conn, table)
+    if not rows:
+        return None, False
+
+    hashes = sorted({digest for _, _, digest in rows})
+    set_hash = hashlib.sha1("\n".join(hashes).encode()).hexdigest()
+    cached = conn.execute("SELECT summary FROM headline_summary_cache WHERE set_hash = ?", (set_hash,)).fetchone()
+    if cached:
+        return cached[0], True
+
+    # Latest earlier summary of today's headlines whose set we still contain
+    previous = None
+    current = set(hashes)
+    today = datetime.date.today().isoformat()
+    for summary, previous_hashes in conn.execute(
+            "SELECT summary, headline_hashes FROM headline_summary_cache WHERE table_name = ? AND created_at >= ? ORDER BY created_at DESC",
+            (table, today)):
+        previous_hashes = set(json.loads(previous_hashes))
+        if previous_hashes < current:
+            previous = (summary, previous_hashes)
+            break
+
+    if previous is not None:
+        new_rows = [row for row in rows if row[2] not in previous[1]]
+        prompt = DELTA_PROMPT.format(summary=previous[0], headlines=_format(new_rows))
+    else:
+        prompt = FULL_PROMPT.format(headlines=_format(rows))
+    with metrics.upstream('openai'):
+        response = client.chat.completions.create(model=SUMMARY_MODEL, messages=[{"role": "user", "content": prompt}])
+    summary = response.choices[0].message.content
+
+    now = now or datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO headline_summary_cache VALUES (?, ?, ?, ?, ?)",
+                     (set_hash, table, json.dumps(hashes), summary, now))
+    return summary, False
@@ -0,0 +1,118 @@
+# runtimes_app/services/irr.py
+
+import numpy as np
+
+# Solving is done in discount-factor space, v = 1 / (1 + r), where the NPV is
+# the polynomial sum(c_t * v**t). A cash flow with exactly one sign change has
+# exactly one positive root (Descartes' rule of signs), which is the unique
+# IRR numpy_financial would pick, so those rows can be solved together with a
+# bracketed Newton iteration instead of one eigenvalue solve per row.
+
+TOL = 1e-12
+MAX_ITER = 100
+
+
+def _sign_changes(cash_flows):
+    """Counts sign changes per row, ignoring zeros."""
+    signs = np.sign(cash_flows)
+    # Forward-fill zeros with the previous non-zero sign
+    cols = np.where(signs != 0, np.arange(signs.shape[1]), 0)
+    np.maximum.accumulate(cols, axis=1, out=cols)
+    filled = np.take_along_axis(signs, cols, axis=1)
+    return ((filled[:, 1:] != filled[:, :-1]) & (filled[:, :-1] != 0)).sum(axis=1)
+
+
+def _npv_and_slope(cash_flows, v):
+    """NPV polynomial and its derivative at v, evaluated for every row at once."""
+    powers = np.arange(cash_flows.shape[1])
+    v_pow = v[:, None] ** powers
+    p = (cash_flows * v_pow).sum(axis=1)
+    dp = (cash_flows[:, 1:] * powers[1:] * v_pow[:, :-1]).sum(axis=1)
+    return p, dp
+
+
+def _initial_guess(cash_flows, sign_first, fallback):
+    """
+    Collapses the flows before and after the sign change onto their weighted
+    mean times, giving |E| v**tE = |L| v**tL, which is solvable in closed form.
+    """
+    t = np.arange(cash_flows.shape[1])
+    early = np.where(np.sign(cash_flows) == sign_first[:, None], np.abs(cash_flows), 0)
+    late = np.where(np.sign(cash_flows) == -sign_first[:, None], np.abs(cash_flows), 0)
+    e_sum, l_sum = early.sum(axis=1), late.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        span = (late @ t) / l_sum - (early @ t) / e_sum
+        v = (e_sum / l_sum) ** (1 / span)
+    return np.where(np.isfinite(v) & (v > 0), v, fallback)
+
+
+def _solve_single_change(cash_flows, guess):
+    """Finds the unique positive root v of each row (rows must have one sign change)."""
+    m, n = cash_flows.shape
+    rows = np.arange(m)
+    nonzero = cash_flows != 0
+    first = nonzero.argmax(axis=1)
+    last = n - 1 - nonzero[:, ::-1].argmax(axis=1)
+    abs_cf = np.abs(cash_flows)
+
+    # Cauchy bounds on the positive root
+    hi = 1 + abs_cf.max(axis=1) / abs_cf[rows, last]
+    lo = 1 / (1 + abs_cf.max(axis=1) / abs_cf[rows, first])
+    sign_lo = np.sign(cash_flows[rows, first]) # p(v) has this sign just above zero
+
+    v = np.clip(_initial_guess(cash_flows, sign_lo, guess), lo, hi)
+    active = np.ones(m, dtype=bool)
+    for _ in range(MAX_ITER):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        cv, vv = cash_flows[idx], v[idx]
+        p, dp = _npv_and_slope(cv, vv)
+
+        # Shrink the bracket around the root
+        below = np.sign(p) == sign_lo[idx]
+        lo[idx] = np.where(below, vv, lo[idx])
+        hi[idx] = np.where(below, hi[idx], vv)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = vv - p / dp
+        bad = ~np.isfinite(newton) | (newton < lo[idx]) | (newton > hi[idx])
+        new_v = np.where(bad, 0.5 * (lo[idx] + hi[idx]), newton)
+
+        done = (np.abs(new_v - vv) <= TOL * np.abs(vv)) | (p == 0)
+        v[idx] = np.where(p == 0, vv, new_v)
+        active[idx[done]] = False
+    return v
+
+
+def irr_rows(cash_flows, guess=0.1):
+    """
+    IRR of every row of a 2-D cash flow matrix, matching numpy_financial.irr.
+
+    Rows may be padded with trailing zeros. Returns NaN where there is no IRR,
+    including rows with NaN or infinite flows (where numpy_financial raises).
+    Rows with a single sign change are solved together; anything else falls
+    back to numpy_financial row by row.
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    result = np.full(len(cash_flows), np.nan)
+
+    finite = np.isfinite(cash_flows).all(axis=1)
+    changes = np.where(finite, _sign_changes(cash_flows), 0)
+    simple = changes == 1
+    if simple.any():
+        v = _solve_single_change(cash_flows[simple], 1 / (1 + guess))
+        result[simple] = 1 / v - 1
+    multi = np.flatnonzero(changes > 1)
+    if len(multi):
+        import numpy_financial as npf # only needed for the rare multi-sign-change rows
+    for i in multi:
+        result[i] = npf.irr(cash_flows[i])
+    return result
+
+
+def prefix_irr(cash_flows, guess=0.1):
+    """IRR of cash_flows[:1], cash_flows[:2], ..., cash_flows[:n] in one pass."""
+    cash_flows = np.asarray(cash_flows, dtype=float)
+    prefixes = np.tril(np.broadcast_to(cash_flows, (len(cash_flows), len(cash_flows))))
+    return irr_rows(prefixes, guess)
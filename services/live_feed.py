@@ -0,0 +1,265 @@
+# runtimes_app/services/live_feed.py
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from services import db
+from services.data_versions import get_version
+
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+PRICE_POLL_SECONDS = 60 # one upstream poll per interval for all subscribed symbols
+HEADLINE_POLL_SECONDS = 15
+HEARTBEAT_SECONDS = 15
+SUBSCRIBER_QUEUE = 256 # a client this far behind is disconnected and replays on reconnect
+RETRY_MS = 5000
+# Every open stream holds a worker thread (gthread) or greenlet (gevent) for as
+# long as the client stays connected; past this many a worker answers 503 so
+# ordinary requests keep the rest. gunicorn.conf.py sets it per profile.
+MAX_SUBSCRIBERS = int(os.environ.get('MAX_STREAMS_PER_WORKER', 16))
+
+
+class StreamLimitReached(Exception):
+    """This worker already serves max_subscribers streams."""
+
+
+class Subscriber:
+    """One connected client: its symbols and a bounded queue of pending events."""
+
+    def __init__(self, symbols, maxsize=SUBSCRIBER_QUEUE):
+        self.symbols = frozenset(symbols)
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def wants(self, event):
+        return event['symbol'] is None or event['symbol'] in self.symbols
+
+
+class LiveFeed:
+    """
+    Single shared producer for the /stream endpoint.
+
+    A background thread polls prices for the union of subscribed symbols
+    (one price_fetcher(symbols) call per PRICE_POLL_SECONDS, however many
+    clients are connected) and new rows in the headline/summary tables, and
+    fans events out to subscriber queues.
+
+    An event id is the feed's position in the tables, the last published
+    rowid of each one joined by '.', so it means the same thing in every
+    worker. A client reconnecting with a Last-Event-ID, to this worker or any
+    other, gets the rows after that position from the database followed by a
+    price snapshot. With data_version set, the tables are only scanned after
+    the writers bump that version.
+    """
+
+    def __init__(self, price_fetcher, tables, price_interval=PRICE_POLL_SECONDS, headline_interval=HEADLINE_POLL_SECONDS,
+                 data_version=None, max_subscribers=MAX_SUBSCRIBERS):
+        self.price_fetcher = price_fetcher
+        self.tables = tables # {table: event name}
+        self.data_version = data_version
+        self._seen_version = None
+        self.price_interval = price_interval
+        self.headline_interval = headline_interval
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._prices = {} # symbol -> last published price event data
+        self._last_rowids = {} # table -> last published rowid, the event id
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock() # one headline scan at a time
+        self._wake = threading.Event()
+        self._thread = None
+        self._counters = {'price_polls': 0, 'headline_polls': 0, 'published': 0, 'overflows': 0, 'replayed': 0,
+                          'rejected': 0, 'errors': 0}
+
+    # --- Subscribers ---
+    def subscribe(self, symbols, last_event_id=None):
+        """
+        Registers a subscriber and queues the rows it missed, if it sent a
+        Last-Event-ID, then a price snapshot. Raises StreamLimitReached when
+        this worker is already at max_subscribers.
+        """
+        subscriber = Subscriber(symbols)
+        position = self._parse_position(last_event_id)
+        # Catch up first if this worker hasn't scanned yet or the client saw rows it hasn't published
+        if len(self._last_rowids) < len(self.tables) or (
+                position is not None and any(rowid > self._last_rowids[table] for table, rowid in position.items())):
+            self._poll_headlines(force=True)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self._counters['rejected'] += 1
+                raise StreamLimitReached()
+            backlog = self._missed_since(position) if position is not None else []
+            self._counters['replayed'] += len(backlog)
+            backlog.append(self._snapshot_event(subscriber.symbols))
+            for event in backlog[-SUBSCRIBER_QUEUE:]:
+                subscriber.queue.put_nowait(event)
+            new_symbols = subscriber.symbols - self._subscribed_symbols()
+            self._subscribers.add(subscriber)
+        self._ensure_started()
+        if new_symbols:
+            self._wake.set() # price the new symbols now rather than at the next poll
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def events(self, subscriber, heartbeat=HEARTBEAT_SECONDS):
+        """SSE text for a subscriber: queued events, ': ping' comments while idle."""
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                try:
+                    event = subscriber.queue.get(timeout=0 if subscriber.overflowed else heartbeat)
+                except queue.Empty:
+                    if subscriber.overflowed:
+                        return # the client reconnects with Last-Event-ID and replays
+                    yield ": ping\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['subscribers'] = len(self._subscribers)
+            stats['max_subscribers'] = self.max_subscribers
+            stats['symbols'] = sorted(self._subscribed_symbols())
+            stats['position'] = self._position_id()
+        return stats
+
+    # --- Publishing ---
+    def publish(self, name, data, symbol=None, table=None, rowid=None):
+        """Queues an event for every interested subscriber; a table row also advances the position."""
+        with self._lock:
+            if table is not None:
+                self._last_rowids[table] = rowid
+            event = {'id': self._position_id(), 'event': name, 'data': data, 'symbol': symbol}
+            self._counters['published'] += 1
+            for subscriber in list(self._subscribers):
+                if not subscriber.wants(event):
+                    continue
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    subscriber.overflowed = True
+                    self._subscribers.discard(subscriber)
+                    self._counters['overflows'] += 1
+        return event
+
+    def _position_id(self):
+        return '.'.join(str(self._last_rowids.get(table, 0)) for table in self.tables)
+
+    def _parse_position(self, last_event_id):
+        """{table: rowid} from an event id, or None if it isn't one of ours."""
+        parts = (last_event_id or '').split('.')
+        if len(parts) != len(self.tables) or not all(part.isdigit() for part in parts):
+            return None
+        return dict(zip(self.tables, map(int, parts)))
+
+    def _missed_since(self, position):
+        """Events for the rows after position up to what this feed has published. Call with _lock held."""
+        missed = []
+        try:
+            with db.read_connection() as conn:
+                for table, name in self.tables.items():
+                    upto = self._last_rowids.get(table)
+                    if upto is None or upto <= position[table]:
+                        continue
+                    rows = conn.execute(f"""SELECT rowid, timestamp, news FROM {table} WHERE rowid > ? AND rowid <= ?
+                                            ORDER BY rowid DESC LIMIT ?""", (position[table], upto, SUBSCRIBER_QUEUE))
+                    missed += [(rowid, table, name, timestamp, news) for rowid, timestamp, news in rows]
+        except Exception as e:
+            log.warning("Live feed replay failed: %r", e)
+            self._counters['errors'] += 1
+            return []
+        # Each replayed event carries the position just after its own row
+        cursor = dict(position)
+        events = []
+        for rowid, table, name, timestamp, news in sorted(missed, key=lambda row: (list(self.tables).index(row[1]), row[0])):
+            cursor[table] = rowid
+            events.append({'id': '.'.join(str(cursor[t]) for t in self.tables), 'event': name, 'symbol': None,
+                           'data': {'table': table, 'timestamp': timestamp, 'news': news}})
+        return events
+
+    def _snapshot_event(self, symbols):
+        return {'id': self._position_id(), 'event': 'snapshot', 'symbol': None,
+                'data': {'prices': {s: self._prices[s] for s in symbols if s in self._prices}}}
+
+    def _subscribed_symbols(self):
+        return set().union(*(s.symbols for s in self._subscribers)) if self._subscribers else set()
+
+    # --- Producer ---
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        next_price = next_headlines = 0.0
+        while True:
+            now = time.monotonic()
+            if self._wake.is_set() or now >= next_price:
+                self._wake.clear()
+                self._poll_prices()
+                next_price = time.monotonic() + self.price_interval
+            if now >= next_headlines:
+                self._poll_headlines()
+                next_headlines = time.monotonic() + self.headline_interval
+            self._wake.wait(timeout=max(0.0, min(next_price, next_headlines) - time.monotonic()))
+
+    def _poll_prices(self):
+        with self._lock:
+            symbols = sorted(self._subscribed_symbols())
+            self._counters['price_polls'] += bool(symbols)
+        if not symbols:
+            return
+        try:
+            prices = self.price_fetcher(symbols)
+        except Exception as e:
+            log.warning("Live feed price poll failed: %r", e)
+            with self._lock:
+                self._counters['errors'] += 1
+            return
+        for symbol, price in prices.items():
+            if price is None:
+                continue
+            previous = self._prices.get(symbol)
+            if previous is not None and previous['price'] == price:
+                continue
+            data = {'symbol': symbol, 'price': price, 'time': time.time()}
+            with self._lock:
+                self._prices[symbol] = data
+            self.publish('price', data, symbol)
+
+    def _poll_headlines(self, force=False):
+        with self._lock:
+            self._counters['headline_polls'] += 1
+        try:
+            with self._poll_lock, db.read_connection() as conn:
+                if self.data_version is not None:
+                    version = get_version(conn, self.data_version)
+                    if not force and version == self._seen_version and len(self._last_rowids) == len(self.tables):
+                        return
+                    self._seen_version = version
+                for table, name in self.tables.items():
+                    last = self._last_rowids.get(table)
+                    if last is None: # start from what's already there; clients get history from the page
+                        with self._lock:
+                            self._last_rowids[table] = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+                        continue
+                    for rowid, timestamp, news in conn.execute(
+                            f"SELECT rowid, timestamp, news FROM {table} WHERE rowid > ? ORDER BY rowid", (last,)).fetchall():
+                        self.publish(name, {'table': table, 'timestamp': timestamp, 'news': news}, table=table, rowid=rowid)
+        except Exception as e:
+            log.warning("Live feed headline poll failed: %r", e)
+            with self._lock:
+                self._counters['errors'] += 1
@@ -0,0 +1,127 @@
+# runtimes_app/services/macro.py
+
+import threading
+
+import numpy as np
+
+from services.timeseries import store
+
+# Every stored FRED series is placed on one monthly grid (NaN where a series
+# has no point) and all derived metrics come out of a single broadcast over
+# that (months x series) matrix:
+#   yoy      V[t] / V[t-12] - 1
+#   mom_ann  (V[t] / V[t-1]) ** 12 - 1
+#   ann3     (V[t] / V[t-3]) ** 4 - 1
+#   ann6     (V[t] / V[t-6]) ** 2 - 1
+#   contribution  CPI weight * yoy, in fractions of headline CPI YoY
+# The frame is built once per FRED data version and then sliced per request.
+RATE_METRICS = {'yoy': (12, 1), 'mom_ann': (1, 12), 'ann3': (3, 4), 'ann6': (6, 2)} # lag months, annualizing power
+METRICS = ('level',) + tuple(RATE_METRICS) + ('contribution',)
+
+# Approximate relative importance in CPI-U (percent of the index, BLS,
+# December 2024). Contributions are weight * YoY, so components add up to
+# roughly headline YoY; series without a weight (PCE) have none.
+CPI_WEIGHTS = {
+    'CPI': 100.0,
+    'Core CPI': 80.0,
+    'CPI Food': 13.6,
+    'CPI Energy': 6.4,
+    'CPI Core Goods': 19.3,
+    'CPI Core Service': 60.7,
+    'Shelter': 35.4,
+    'Medical Care': 6.8,
+    'Transportation': 6.3,
+    'Education and Communication': 5.0,
+    'Recreation': 5.4,
+}
+
+
+def sync_fred_store(conn, version):
+    """
+    Copies FRED points from fred_cpi_data into the memory-mapped series store
+    ('fred/<name>'), starting at each series' last stored date so revisions of
+    that point land too. A no-op once the store is synced to version.
+    """
+    if store.get_marker('fred/version') == version:
+        return
+    names = [row[1] for row in conn.execute('PRAGMA table_info(fred_cpi_data)') if row[1] != 'date_column']
+    for name in names:
+        last = store.last_date(f'fred/{name}')
+        rows = conn.execute(f'''SELECT substr(date_column, 1, 10), "{name}" FROM fred_cpi_data
+                               WHERE "{name}" IS NOT NULL AND date_column >= ? ORDER BY date_column''',
+                            (str(last) if last is not None else '',)).fetchall()
+        if rows:
+            store.write(f'fred/{name}', [row[0] for row in rows], [row[1] for row in rows])
+    store.set_marker('fred/version', version)
+
+
+class MacroFrame:
+    """Levels and every derived metric for all series, as (months x series) float64 matrices."""
+
+    def __init__(self, months, names, levels):
+        self.months = months # datetime64[M], contiguous
+        self.names = list(names)
+        self.columns = {name: i for i, name in enumerate(self.names)}
+        lags = np.array([lag for lag, _ in RATE_METRICS.values()])
+        powers = np.array([power for _, power in RATE_METRICS.values()], dtype=float)
+
+        # One gather + divide + power for all rate metrics at once: (metrics, months, series)
+        rows = np.arange(len(months))[None, :] - lags[:, None]
+        previous = np.where((rows >= 0)[..., None], levels[np.maximum(rows, 0)], np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = (levels[None] / previous) ** powers[:, None, None] - 1
+        weights = np.array([CPI_WEIGHTS.get(name, np.nan) / 100 for name in self.names])
+
+        self.values = {'level': levels}
+        self.values.update(zip(RATE_METRICS, rates))
+        self.values['contribution'] = self.values['yoy'] * weights
+
+    def select(self, names=None, metrics=('yoy',), window=None, start=None, end=None):
+        """
+        (months, {name: {metric: column}}) for a subset of series and metrics,
+        limited to start..end (datetime64[M], inclusive) and then to the last
+        window months. Columns are views into the cached matrices.
+        """
+        names = self.names if names is None else names
+        lo = 0 if start is None else int(np.searchsorted(self.months, np.datetime64(start, 'M'), 'left'))
+        hi = len(self.months) if end is None else int(np.searchsorted(self.months, np.datetime64(end, 'M'), 'right'))
+        if window is not None:
+            lo = max(lo, hi - window)
+        columns = {name: {metric: self.values[metric][lo:hi, self.columns[name]] for metric in metrics} for name in names}
+        return self.months[lo:hi], columns
+
+
+def build_frame(names):
+    """Reads 'fred/<name>' for every name from the store onto one monthly grid."""
+    series = {name: store.read(f'fred/{name}') for name in names}
+    series = {name: (dates.astype('datetime64[D]').astype('datetime64[M]'), values)
+              for name, (dates, values) in series.items() if len(dates)}
+    if not series:
+        return MacroFrame(np.empty(0, 'datetime64[M]'), [], np.empty((0, 0)))
+    first = min(months[0] for months, _ in series.values())
+    last = max(months[-1] for months, _ in series.values())
+    grid = np.arange(first, last + 1)
+    levels = np.full((len(grid), len(series)), np.nan)
+    for i, (months, values) in enumerate(series.values()):
+        levels[(months - first).astype(int), i] = values
+    return MacroFrame(grid, series, levels)
+
+
+_frame = None # (version, MacroFrame)
+_frame_lock = threading.Lock()
+
+
+def get_frame(conn, version):
+    """The MacroFrame for FRED data version, built on the first request after the data changes."""
+    global _frame
+    cached = _frame
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _frame_lock:
+        if _frame is not None and _frame[0] == version:
+            return _frame[1]
+        sync_fred_store(conn, version)
+        names = [name.split('/', 1)[1] for name in store.names('fred')]
+        frame = build_frame(names)
+        _frame = (version, frame)
+        return frame
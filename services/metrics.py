@@ -0,0 +1,456 @@
+# runtimes_app/services/metrics.py
+
+import atexit
+import bisect
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+WINDOW = 2048 # recent samples kept per name for percentiles
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+# ?profile=1 returns a sampled profile instead of the page; off unless enabled.
+# sync and gthread workers only: sys._current_frames() sees OS threads, and a
+# gevent worker runs every request's greenlet on one of them, so it is refused
+PROFILER_ENABLED = os.environ.get('ENABLE_PROFILER') == '1'
+PROFILER_INTERVAL_S = 0.001
+# Under gunicorn every worker keeps its own metrics; with METRICS_DIR set (see
+# gunicorn.conf.py) each writes them to <pid>.json there and /metrics merges
+# every worker's file, so one scrape of any worker sees the whole server
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_S = 5
+
+
+class LatencyRecorder:
+    """Per-name latency samples (seconds) over a sliding window, plus lifetime totals."""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._samples = {}
+        self._totals = {} # name -> [count, sum, failures]
+        self._lock = threading.Lock()
+
+    def _entry(self, name):
+        if name not in self._samples:
+            self._samples[name] = deque(maxlen=self.window)
+            self._totals[name] = [0, 0.0, 0]
+        return self._samples[name], self._totals[name]
+
+    def observe(self, name, seconds):
+        with self._lock:
+            samples, totals = self._entry(name)
+            samples.append(seconds)
+            totals[0] += 1
+            totals[1] += seconds
+
+    def count_failure(self, name):
+        """Timeouts / errors; a timed-out call is still observed when it finishes."""
+        with self._lock:
+            self._entry(name)[1][2] += 1
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def summary(self):
+        """{name: count, mean and p50/p95/p99/max in milliseconds over the window}."""
+        with self._lock:
+            snapshot = {name: (np.array(samples), list(self._totals[name])) for name, samples in self._samples.items()}
+        summary = {}
+        for name, (samples, (count, total, failures)) in snapshot.items():
+            if count == 0:
+                summary[name] = {'count': 0, 'failures': failures}
+                continue
+            p50, p95, p99 = np.percentile(samples, (50, 95, 99)) * 1000
+            summary[name] = {
+                'count': count, 'failures': failures, 'mean_ms': round(total / count * 1000, 3),
+                'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3),
+                'max_ms': round(samples.max() * 1000, 3),
+            }
+        return summary
+
+
+latency = LatencyRecorder()
+
+
+# --- Prometheus metrics ---
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination, Prometheus style."""
+
+    def __init__(self, name, help_text, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        """Cumulative bucket, _sum and _count samples as (name, labels, value)."""
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        samples = []
+        for label_values, series in sorted(snapshot.items()):
+            labels = list(zip(self.labels, map(str, label_values)))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", labels + [('le', str(bound))], cumulative))
+            samples.append((f"{self.name}_bucket", labels + [('le', '+Inf')], series[-1]))
+            samples.append((f"{self.name}_sum", labels, series[-2]))
+            samples.append((f"{self.name}_count", labels, series[-1]))
+        return samples
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+REGISTRY = []
+request_seconds = Histogram('http_request_duration_seconds', 'Flask request latency (time to response headers).', ('endpoint', 'method', 'status'))
+upstream_seconds = Histogram('upstream_request_duration_seconds', 'Calls to Twelve Data, FRED and OpenAI.', ('service', 'outcome'))
+sqlite_seconds = Histogram('sqlite_query_duration_seconds', 'SQLite statement execution time.')
+sqlite_queries = Histogram('sqlite_queries_per_request', 'SQLite statements executed per request.', ('endpoint',), COUNT_BUCKETS)
+bess_seconds = Histogram('bess_compute_seconds', 'BESS model compute time.', ('kind',))
+
+_caches = {} # name -> stats() callable returning counters
+CACHE_GAUGES = ('entries', 'bytes')
+
+
+def register_cache(name, stats):
+    """Exports a cache's stats() counters (hits, misses, ...) and hit_ratio on /metrics."""
+    _caches[name] = stats
+
+
+_upstreams = {} # service -> stats() callable returning counters and the circuit state
+
+
+def register_upstream(service, stats):
+    """Exports an upstream client's call counters and circuit state on /metrics."""
+    _upstreams[service] = stats
+
+
+# --- Exposition ---
+def collect():
+    """This process's metric families as [name, type, help, [(sample name, [(label, value)], value)]]."""
+    families = [[m.name, 'histogram', m.help, m.collect()] for m in REGISTRY]
+
+    cache_events, cache_gauges = [], {'hit_ratio': [], 'entries': [], 'bytes': []}
+    for name, stats in sorted(_caches.items()):
+        for event, value in sorted(stats().items()):
+            if event == 'hit_ratio' or event in CACHE_GAUGES:
+                cache_gauges[event].append((f"cache_{event}", [('cache', name)], value))
+            else:
+                cache_events.append(('cache_events_total', [('cache', name), ('event', event)], value))
+    families.append(['cache_events_total', 'counter', 'Cache lookups by outcome.', cache_events])
+    families.append(['cache_hit_ratio', 'gauge', 'Share of cache lookups served without recomputing.', cache_gauges['hit_ratio']])
+    for gauge in CACHE_GAUGES:
+        families.append([f"cache_{gauge}", 'gauge', f"Cache {gauge}.", cache_gauges[gauge]])
+
+    upstream_events, circuits = [], []
+    for service, stats in sorted(_upstreams.items()):
+        stats = stats()
+        circuit = stats.pop('circuit')
+        circuits.append(('upstream_circuit_open', [('service', service)], {'open': 1, 'half-open': 0.5}.get(circuit, 0)))
+        upstream_events += [('upstream_events_total', [('service', service), ('event', event)], value)
+                            for event, value in sorted(stats.items())]
+    families.append(['upstream_events_total', 'counter',
+                     'Upstream calls, retries, failures and calls skipped by quota or circuit.', upstream_events])
+    families.append(['upstream_circuit_open', 'gauge',
+                     'Whether calls to the service are being skipped (1) or probed (0.5).', circuits])
+
+    quantiles = []
+    for name, summary in sorted(latency.summary().items()):
+        if not summary['count']:
+            continue
+        for quantile in ('p50', 'p95', 'p99'):
+            quantiles.append(('dashboard_source_seconds', [('source', name), ('quantile', '0.' + quantile[1:])],
+                              round(summary[quantile + '_ms'] / 1000, 6)))
+        quantiles.append(('dashboard_source_seconds_count', [('source', name)], summary['count']))
+    families.append(['dashboard_source_seconds', 'summary', 'Dashboard source latency over the recent window.', quantiles])
+    return families
+
+
+def merge(snapshots, live_pids):
+    """
+    One set of families from every worker's: counters and histograms are
+    summed (a dead worker's counts still stand), gauges and the latency
+    summary can't be added up so they get a pid label, live workers only.
+    """
+    merged = {} # name -> (type, help, {(sample name, labels): value})
+    for pid, families in sorted(snapshots.items()):
+        for name, kind, help_text, samples in families:
+            values = merged.setdefault(name, (kind, help_text, {}))[2]
+            per_worker = kind in ('gauge', 'summary')
+            if per_worker and pid not in live_pids:
+                continue
+            for sample, labels, value in samples:
+                key = (sample, tuple(map(tuple, labels)) + ((('pid', str(pid)),) if per_worker else ()))
+                values[key] = values.get(key, 0) + value
+    return [[name, kind, help_text, [(sample, list(labels), value) for (sample, labels), value in values.items()]]
+            for name, (kind, help_text, values) in merged.items()]
+
+
+def render(families):
+    """Prometheus text exposition format."""
+    lines = []
+    for name, kind, help_text, samples in families:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for sample, labels, value in samples:
+            if isinstance(value, float):
+                value = f"{value:.6f}"
+            lines.append(f"{sample}{_labels([k for k, _ in labels], [v for _, v in labels])} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def expose():
+    """The Prometheus text for this process, or for every worker when METRICS_DIR is set."""
+    if not METRICS_DIR:
+        return render(collect())
+    flush()
+    snapshots = {}
+    for entry in os.scandir(METRICS_DIR):
+        pid, _, ext = entry.name.partition('.')
+        if ext != 'json' or not pid.isdigit():
+            continue
+        try:
+            with open(entry.path) as f:
+                snapshots[int(pid)] = json.load(f)
+        except (OSError, ValueError):
+            continue # being replaced right now; the next scrape gets it
+    return render(merge(snapshots, {pid for pid in snapshots if _alive(pid)}))
+
+
+# --- Multi-process ---
+_flusher_pid = None
+
+
+def flush():
+    """Writes this worker's metrics to METRICS_DIR/<pid>.json."""
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    with open(path + '.tmp', 'w') as f:
+        json.dump(collect(), f)
+    os.replace(path + '.tmp', path)
+
+
+def start_flusher():
+    """In each worker, writes its metrics every METRICS_FLUSH_S seconds and at exit."""
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    # A preloading master's own observations (e.g. warming the BESS presets)
+    # would otherwise be counted once per forked worker
+    for metric in REGISTRY:
+        metric.reset()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    def run():
+        while True:
+            time.sleep(METRICS_FLUSH_S)
+            try:
+                flush()
+            except OSError as e:
+                log.warning("Could not write metrics: %r", e)
+    threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+    atexit.register(flush)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# --- Per-request spans (Server-Timing) ---
+class RequestStats:
+    """Time spent per span ('db', 'upstream-twelvedata', ...) during one request."""
+
+    def __init__(self):
+        self.spans = {} # name -> [count, seconds]
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            span = self.spans.setdefault(name, [0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+
+    def server_timing(self, total):
+        parts = [f"app;dur={total * 1000:.1f}"]
+        with self._lock:
+            for name, (count, seconds) in sorted(self.spans.items()):
+                parts.append(f'{name};dur={seconds * 1000:.1f};desc="{count} call{"s" if count != 1 else ""}"')
+        return ", ".join(parts)
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def submit(pool, fn, *args):
+    """pool.submit that keeps the caller's request context, so worker-thread spans count."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def record_query(seconds):
+    sqlite_seconds.observe(seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.add('db', seconds)
+
+
+@contextmanager
+def upstream(service):
+    """Times a call to an external API, by service and outcome."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        seconds = time.perf_counter() - start
+        upstream_seconds.observe(seconds, service, outcome)
+        stats = _current.get()
+        if stats is not None:
+            stats.add(f"upstream-{service}", seconds)
+
+
+@contextmanager
+def compute(kind):
+    """Times a BESS model computation."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        bess_seconds.observe(seconds, kind)
+        stats = _current.get()
+        if stats is not None:
+            stats.add(f"bess-{kind}", seconds)
+
+
+# --- Sampling profiler ---
+class SamplingProfiler:
+    """Samples one thread's stack every interval seconds; report() gives collapsed stacks."""
+
+    def __init__(self, thread_id, interval=PROFILER_INTERVAL_S):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self, top=40):
+        """Self-time by function, then the hottest collapsed stacks (flamegraph.pl input)."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        lines = [f"{self.samples} samples every {self.interval * 1000:g} ms", "", "self samples  function"]
+        lines += [f"{count:12d}  {leaf}" for leaf, count in leaves.most_common(top)]
+        lines += ["", "collapsed stacks"]
+        lines += [f"{stack} {count}" for stack, count in self.stacks.most_common(top)]
+        return "\n".join(lines) + "\n"
+
+
+# --- Flask integration ---
+def init_app(app):
+    """Request timing, Server-Timing headers, GET /metrics and the opt-in ?profile=1 profiler."""
+    from flask import Response, g, request
+    from services import db # imports this module
+
+    @app.before_request
+    def _start_request():
+        start_flusher() # once per worker, after the fork
+        g._metrics_start = time.perf_counter()
+        g._metrics_token = _current.set(RequestStats())
+        if PROFILER_ENABLED and request.args.get('profile') == '1':
+            if db.cooperative():
+                return Response("?profile=1 needs GUNICORN_PROFILE=sync or gthread: a gevent worker's requests "
+                                "share one OS thread, which is all the sampler can see\n", 501, mimetype='text/plain')
+            g._profiler = SamplingProfiler(threading.get_ident()).__enter__()
+
+    @app.after_request
+    def _finish_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        stats = _current.get()
+        request_seconds.observe(total, endpoint, request.method, response.status_code)
+        queries = stats.spans.get('db', (0, 0.0))[0]
+        sqlite_queries.observe(queries, endpoint)
+        response.headers['Server-Timing'] = stats.server_timing(total)
+
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.__exit__(None, None, None)
+            return Response(profiler.report(), mimetype='text/plain', headers={'Server-Timing': response.headers['Server-Timing']})
+        return response
+
+    @app.teardown_request
+    def _reset_request(exc):
+        token = g.pop('_metrics_token', None)
+        if token is not None:
+            _current.reset(token)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(expose(), mimetype='text/plain; version=0.0.4')
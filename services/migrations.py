@@ -0,0 +1,261 @@
+# runtimes_app/services/migrations.py
+
+from services import db
+from services.data_versions import POSTS, bump
+from services.headlines import ensure_dedup_index, headline_hash
+from services.posts import render_post
+from services.search import ensure_search_source
+
+# The schema version lives in PRAGMA user_version. Each migration runs once,
+# in its own transaction, in order. Migrations must tolerate databases that
+# already have some of their objects, since headlines.db predates this module.
+# Each step spells out its own DDL rather than calling the live ensure_*
+# helpers, so a database at a given user_version always has the same schema
+# however those helpers change later; later changes are new migrations.
+
+HEADLINE_TABLES = ('reuters_headlines', 'CNBC_headlines')
+SUMMARY_TABLES = ('reuters_headlines_summary', 'CNBC_headlines_summary')
+
+
+def ensure_source_tables(conn, table):
+    """
+    Headline + summary tables for a newly configured scraper source, in the
+    current schema (what the migrations produce for the built-in sources).
+    """
+    for name in (table, f"{table}_summary"):
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {name} (timestamp TEXT, news TEXT)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{name}_timestamp ON {name}(timestamp)")
+    ensure_dedup_index(conn, table)
+    ensure_search_source(conn, table, 'headline')
+    ensure_search_source(conn, f"{table}_summary", 'summary')
+
+
+def _base_tables(conn):
+    for table in HEADLINE_TABLES + SUMMARY_TABLES:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (timestamp TEXT, news TEXT)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _headline_hashes(conn):
+    # Only the first copy of a repeated headline gets its hash, so older
+    # duplicates are kept but never matched again
+    for table in HEADLINE_TABLES:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if 'news_hash' in columns:
+            continue
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN news_hash TEXT")
+        seen, updates = set(), []
+        for rowid, news in conn.execute(f"SELECT rowid, news FROM {table} ORDER BY rowid"):
+            digest = headline_hash(news or '')
+            if digest not in seen:
+                seen.add(digest)
+                updates.append((digest, rowid))
+        conn.executemany(f"UPDATE {table} SET news_hash = ? WHERE rowid = ?", updates)
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{table}_news_hash ON {table}(news_hash)")
+
+def _cache_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS price_cache (
+            symbol TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            outputsize INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (symbol, interval, outputsize)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS figure_cache (
+            name TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            artifact TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS headline_summary_cache (
+            set_hash TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            headline_hashes TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+
+def _fred_tables(conn):
+    conn.execute('CREATE TABLE IF NOT EXISTS fred_cpi_data ("date_column" TIMESTAMP)')
+    conn.execute('CREATE TABLE IF NOT EXISTS fred_cpi_update_time ("index" TEXT, "Latest update" TIMESTAMP)')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS ux_fred_cpi_data_date_column ON fred_cpi_data ("date_column")')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS ux_fred_cpi_update_time_index ON fred_cpi_update_time ("index")')
+
+def _sortable_timestamps(conn):
+    # 'YYYY-MM-DD HH:MM:SS' sorts lexicographically in time order, so day and
+    # date-range filters become index range scans. Older scraper runs stored
+    # microseconds ('... 11:04:36.638050'); trim them to the same form.
+    for table in HEADLINE_TABLES + SUMMARY_TABLES:
+        conn.execute(f"UPDATE {table} SET timestamp = substr(timestamp, 1, 19) WHERE length(timestamp) > 19")
+
+def _timestamp_indexes(conn):
+    for table in HEADLINE_TABLES + SUMMARY_TABLES + ('posts',):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_timestamp ON {table}(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_headline_summary_cache_table_created ON headline_summary_cache(table_name, created_at)")
+
+def _scheduler_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            finished_at REAL,
+            seconds REAL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            result TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_job_runs_job_started ON job_runs(job, started_at)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS job_leases (
+            job TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+
+def _post_markdown(conn):
+    # Older posts stored only HTML (or plain text) in content; that becomes
+    # their Markdown source, since Markdown passes HTML through
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(posts)")}
+    for column in ('content_md', 'excerpt'):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE posts ADD COLUMN {column} TEXT")
+    rows = conn.execute("SELECT id, coalesce(content_md, content) FROM posts WHERE content_md IS NULL OR excerpt IS NULL").fetchall()
+    conn.executemany("UPDATE posts SET content_md = ?, content = ?, excerpt = ? WHERE id = ?",
+                     [(content_md, *render_post(content_md), post_id) for post_id, content_md in rows])
+    bump(conn, POSTS)
+
+def _search_index(conn):
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(title, body, tokenize = 'porter unicode61 remove_diacritics 2')")
+    conn.execute("INSERT INTO search_index(search_index, rank) VALUES ('rank', 'bm25(5.0, 1.0)')")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_sources (
+            code INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            kind TEXT NOT NULL
+        )
+    """)
+    # Packed rowid: unix time << 31 | source rowid << 4 | source code
+    def rowid(alias, code):
+        return (f"(coalesce(CAST(strftime('%s', {alias}.timestamp) AS INTEGER), 0) << 31) "
+                f"| ({alias}.rowid << 4) | {code}")
+
+    sources = [(table, 'headline') for table in HEADLINE_TABLES] + [(table, 'summary') for table in SUMMARY_TABLES] + [('posts', 'post')]
+    for code, (table, kind) in enumerate(sources):
+        if conn.execute("SELECT 1 FROM search_sources WHERE name = ?", (table,)).fetchone():
+            continue
+        conn.execute("INSERT INTO search_sources(code, name, kind) VALUES (?, ?, ?)", (code, table, kind))
+        if table == 'posts':
+            title, body, depends_on = "{0}.title", "coalesce({0}.content_md, {0}.content)", 'timestamp, title, content, content_md'
+        else:
+            title, body, depends_on = "''", "{0}.news", 'timestamp, news'
+        insert = f"INSERT INTO search_index(rowid, title, body) VALUES ({rowid('NEW', code)}, {title.format('NEW')}, {body.format('NEW')});"
+        delete = f"DELETE FROM search_index WHERE rowid = {rowid('OLD', code)};"
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS search_{table}_insert AFTER INSERT ON {table} BEGIN {insert} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS search_{table}_delete AFTER DELETE ON {table} BEGIN {delete} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS search_{table}_update AFTER UPDATE OF {depends_on} ON {table} BEGIN {delete} {insert} END")
+        conn.execute(f"INSERT INTO search_index(rowid, title, body) SELECT {rowid(table, code)}, {title.format(table)}, {body.format(table)} FROM {table}")
+
+def _bess_results(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bess_results (
+            key TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_bess_results_created_at ON bess_results(created_at)")
+
+def _bess_jobs(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bess_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            paths INTEGER NOT NULL,
+            completed INTEGER NOT NULL,
+            seed INTEGER,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            finished_at REAL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_bess_jobs_created_at ON bess_jobs(created_at)")
+
+def _windowed_headline_dedup(conn):
+    # Headlines were unique forever (ux_<table>_news_hash); now only within
+    # the summary day, checked on insert against (news_hash, timestamp)
+    tables = [row[0] for row in conn.execute(
+        "SELECT tbl_name FROM sqlite_master WHERE type = 'index' AND name = 'ux_' || tbl_name || '_news_hash'")]
+    for table in tables:
+        conn.execute(f"DROP INDEX ux_{table}_news_hash")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_news_hash_timestamp ON {table}(news_hash, timestamp)")
+
+
+MIGRATIONS = [
+    (1, 'headline, summary and posts tables', _base_tables),
+    (2, 'headline dedup hashes', _headline_hashes),
+    (3, 'price, figure and summary cache tables', _cache_tables),
+    (4, 'FRED tables with unique keys', _fred_tables),
+    (5, 'sortable headline timestamps', _sortable_timestamps),
+    (6, 'timestamp indexes', _timestamp_indexes),
+    (7, 'job runs, job leases and data versions', _scheduler_tables),
+    (8, 'post Markdown source and excerpts', _post_markdown),
+    (9, 'full-text search index', _search_index),
+    (10, 'BESS result cache', _bess_results),
+    (11, 'Monte Carlo jobs shared by all workers', _bess_jobs),
+    (12, 'headline dedup within the summary day', _windowed_headline_dedup),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(db_file=None, verbose=False):
+    """Applies pending migrations; safe to call from several processes at once."""
+    conn = db.connect(db_file)
+    try:
+        if current_version(conn) >= LATEST_VERSION:
+            return LATEST_VERSION
+        for version, name, apply in MIGRATIONS:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if current_version(conn) >= version: # another process got here first
+                    conn.rollback()
+                    continue
+                apply(conn)
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            if verbose:
+                print(f"Applied migration {version}: {name}")
+        return current_version(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,51 @@
+# runtimes_app/services/posts.py
+
+import re
+from html import unescape
+
+# posts.content_md is the Markdown as written and posts.content the HTML
+# rendered from it once, on create (or by the backfill for older posts), so
+# views never run Markdown. The listing reads only id, title, timestamp and
+# the plain-text excerpt.
+EXCERPT_CHARS = 150
+PAGE_SIZE = 10
+LISTING_COLUMNS = "id, title, timestamp, excerpt"
+
+_TAG = re.compile(r"<[^>]+>")
+
+
+def _markdown():
+    import markdown # see HEAVY_MODULES in app.py
+    return markdown
+
+
+def render_post(content_md):
+    """(html, excerpt) for a post's Markdown source."""
+    html = _markdown().markdown(content_md)
+    text = " ".join(unescape(_TAG.sub("", html)).split())
+    return html, text[:EXCERPT_CHARS]
+
+
+def list_page(conn, before=None, limit=PAGE_SIZE):
+    """
+    Listing rows newest first, keyset-paginated on (timestamp, id) so any page
+    is an index range scan. before is the id of the last post on the previous
+    page. Returns (rows, id to pass as before for the next page, or None).
+    """
+    if before is None:
+        rows = conn.execute(f"SELECT {LISTING_COLUMNS} FROM posts ORDER BY timestamp DESC, id DESC LIMIT ?",
+                            (limit + 1,)).fetchall()
+    else:
+        rows = conn.execute(f"SELECT {LISTING_COLUMNS} FROM posts WHERE (timestamp, id) < (SELECT timestamp, id FROM posts WHERE id = ?) "
+                            "ORDER BY timestamp DESC, id DESC LIMIT ?", (before, limit + 1)).fetchall()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]['id']
+    return rows, None
+
+
+def create_post(conn, title, content_md):
+    """Stores a post with its rendered HTML and excerpt; returns its id."""
+    html, excerpt = render_post(content_md)
+    cursor = conn.execute("INSERT INTO posts (title, content, content_md, excerpt) VALUES (?, ?, ?, ?)",
+                          (title, html, content_md, excerpt))
+    return cursor.lastrowid
@@ -0,0 +1,288 @@
+# runtimes_app/services/price_cache.py
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from services import db
+
+# --- Configuration ---
+MARKET_TZ = ZoneInfo('America/New_York')
+# Twelve Data publishes the daily bar shortly after the 16:00 close
+DAILY_BAR_READY = (16, 15)
+INTRADAY_TTL_SECONDS = 60
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def next_daily_bar(now=None):
+    """Returns the epoch time at which the next daily bar becomes available."""
+    now = now or datetime.now(MARKET_TZ)
+    ready = now.replace(hour=DAILY_BAR_READY[0], minute=DAILY_BAR_READY[1], second=0, microsecond=0)
+    if now >= ready:
+        ready += timedelta(days=1)
+    while ready.weekday() >= 5: # Saturday / Sunday have no new bar
+        ready += timedelta(days=1)
+    return ready.timestamp()
+
+
+def expiry_for(interval, now=None):
+    """Daily (and longer) series stay valid until the next close; intraday ones for a minute."""
+    if interval in ('1day', '1week', '1month'):
+        return next_daily_bar(now)
+    return time.time() + INTRADAY_TTL_SECONDS
+
+
+class _Flight:
+    """An in-progress fetch that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.failed = False # get_many: the fetch failed and nothing was stored
+
+
+class PriceCache:
+    """
+    TTL + LRU cache for Twelve Data time series keyed by (symbol, interval, outputsize).
+
+    Entries expire at the next daily bar, the total payload size is capped at
+    max_bytes (least recently used entries are evicted first), and concurrent
+    misses for the same key share a single upstream fetch. When persist is set,
+    entries are also stored in SQLite so a restarted worker starts warm.
+
+    batch_fetcher(symbols, interval, outputsize) -> {symbol: values or None}
+    lets get_many() load all of its misses in one upstream call; symbols it
+    leaves out of the result count as failed fetches, and get_many() leaves
+    them out of its own result too unless stale values stand in.
+
+    When a fetch raises one of stale_errors (upstream down, quota spent,
+    circuit open) the last values stored for the key are served even if
+    expired, and the error only propagates when there are none.
+    """
+
+    def __init__(self, fetcher, persist=False, max_bytes=DEFAULT_MAX_BYTES, batch_fetcher=None, stale_errors=()):
+        self.fetcher = fetcher
+        self.batch_fetcher = batch_fetcher
+        self.stale_errors = stale_errors
+        self.persist = persist
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> (expires_at, values, size)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'db_hits': 0, 'coalesced': 0, 'evictions': 0, 'stale': 0}
+
+    # --- Public API ---
+    def get(self, symbol, interval='1day', outputsize=365):
+        """Returns the list of bar dicts for the key, or None if the upstream has no data."""
+        key = (symbol.upper(), interval, int(outputsize))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                return entry[1]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._counters['misses'] += 1
+            else:
+                self._counters['coalesced'] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._load(key)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+        return flight.result
+
+    def get_many(self, symbols, interval='1day', outputsize=365):
+        """
+        Returns {symbol: values or None}. Hits are served from memory, keys
+        already being fetched are waited on, and the remaining misses are
+        loaded together (one batch upstream call when batch_fetcher is set).
+        A symbol whose fetch failed with nothing stored to fall back on is
+        left out.
+        """
+        keys = {symbol: (symbol.upper(), interval, int(outputsize)) for symbol in symbols}
+        results, leading, waiting = {}, {}, {}
+        with self._lock:
+            now = time.time()
+            for symbol, key in keys.items():
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    results[symbol] = entry[1]
+                elif key in leading:
+                    waiting[symbol] = leading[key]
+                elif key in self._inflight:
+                    waiting[symbol] = self._inflight[key]
+                    self._counters['coalesced'] += 1
+                else:
+                    leading[key] = self._inflight[key] = _Flight()
+                    self._counters['misses'] += 1
+
+        if leading:
+            error = None
+            try:
+                loaded = self._load_many(list(leading))
+            except Exception as e:
+                loaded, error = {}, e
+            finally:
+                with self._lock:
+                    for key in leading:
+                        self._inflight.pop(key, None)
+            for key, flight in leading.items():
+                flight.result, flight.error, flight.failed = loaded.get(key), error, key not in loaded
+                flight.event.set()
+            if error is not None:
+                raise error
+            for symbol, key in keys.items():
+                if key in loaded:
+                    results[symbol] = loaded[key]
+
+        for symbol, flight in waiting.items():
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            if not flight.failed:
+                results[symbol] = flight.result
+        return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = round((stats['hits'] + stats['coalesced']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # --- Internals ---
+    def _load(self, key):
+        if self.persist:
+            stored = self._read_db(key)
+            if stored is not None:
+                with self._lock:
+                    self._counters['db_hits'] += 1
+                self._store(key, *stored)
+                return stored[1]
+
+        try:
+            values = self.fetcher(*key)
+        except self.stale_errors:
+            values = self._stale(key)
+            if values is None:
+                raise
+            return values
+        if values is None: # Invalid ticker / API error: don't cache
+            return None
+        expires_at = expiry_for(key[1])
+        payload = json.dumps(values)
+        self._store(key, expires_at, values, len(payload))
+        if self.persist:
+            self._write_db(key, expires_at, payload)
+        return values
+
+    def _load_many(self, keys):
+        if self.batch_fetcher is None:
+            return {key: self._load(key) for key in keys}
+
+        loaded, missing = {}, []
+        for key in keys:
+            stored = self._read_db(key) if self.persist else None
+            if stored is None:
+                missing.append(key)
+                continue
+            with self._lock:
+                self._counters['db_hits'] += 1
+            self._store(key, *stored)
+            loaded[key] = stored[1]
+        if not missing:
+            return loaded
+
+        _, interval, outputsize = missing[0] # get_many keys share interval/outputsize
+        try:
+            fetched = self.batch_fetcher([key[0] for key in missing], interval, outputsize)
+        except self.stale_errors:
+            fetched = {}
+        expires_at = expiry_for(interval)
+        for key in missing:
+            if key[0] not in fetched: # the fetch for this symbol failed
+                stale = self._stale(key)
+                if stale is not None:
+                    loaded[key] = stale
+                continue
+            values = fetched[key[0]]
+            loaded[key] = values
+            if values is None:
+                continue
+            payload = json.dumps(values)
+            self._store(key, expires_at, values, len(payload))
+            if self.persist:
+                self._write_db(key, expires_at, payload)
+        return loaded
+
+    def _stale(self, key):
+        """The last values kept for key, expired or not, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+        stored = entry if entry is not None else self._read_db(key, fresh=False) if self.persist else None
+        if stored is None:
+            return None
+        with self._lock:
+            self._counters['stale'] += 1
+        return stored[1]
+
+    def _store(self, key, expires_at, values, size):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (expires_at, values, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[2]
+                self._counters['evictions'] += 1
+
+    def _read_db(self, key, fresh=True):
+        try:
+            with db.read_connection() as conn:
+                row = conn.execute(
+                    "SELECT expires_at, payload FROM price_cache WHERE symbol = ? AND interval = ? AND outputsize = ?",
+                    key).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or (fresh and row[0] <= time.time()):
+            return None
+        return row[0], json.loads(row[1]), len(row[1])
+
+    def _write_db(self, key, expires_at, payload):
+        try:
+            with db.transaction() as conn:
+                conn.execute("INSERT OR REPLACE INTO price_cache VALUES (?, ?, ?, ?, ?)", (*key, expires_at, payload))
+        except sqlite3.Error:
+            pass # Persistence is best effort; the in-process tier still works
@@ -0,0 +1,165 @@
+# runtimes_app/services/scheduler.py
+
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from services import db
+
+MAX_CONCURRENT_JOBS = 4
+
+
+class Job:
+    """
+    A function run every interval seconds.
+
+    jitter: each run is delayed by up to this fraction of the interval, so
+    jobs (and scheduler replicas) don't fire in lockstep.
+    retries / backoff: a failed attempt is retried after backoff * 2**n
+    seconds (+-50% jitter), up to retries extra attempts.
+    lease: how long another scheduler process is kept from running the same
+    job; must exceed the job's worst-case runtime including retries.
+    """
+
+    def __init__(self, name, func, interval, jitter=0.1, retries=2, backoff=30, lease=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.retries = retries
+        self.backoff = backoff
+        self.lease = lease or interval
+        self.next_run = 0.0
+        self.running = False
+
+    def schedule_next(self, now=None):
+        now = time.time() if now is None else now
+        self.next_run = now + self.interval * (1 + random.uniform(0, self.jitter))
+
+
+class Scheduler:
+    """
+    Runs registered jobs on a small thread pool. A job never overlaps itself:
+    in process it is skipped while running, across processes it must hold a
+    lease row in job_leases. Every run is recorded in job_runs.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS):
+        self.jobs = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.stop_event = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        self.jobs[job.name] = job
+        return job
+
+    # --- Loop ---
+    def run_forever(self, poll=1.0):
+        """Fires due jobs until stop() is called; first runs are spread over each job's jitter."""
+        now = time.time()
+        for job in self.jobs.values():
+            job.next_run = now + job.interval * random.uniform(0, job.jitter)
+        while not self.stop_event.is_set():
+            now = time.time()
+            for job in self.jobs.values():
+                with self._lock:
+                    due = not job.running and job.next_run <= now
+                    if due:
+                        job.running = True
+                if due:
+                    self._pool.submit(self._run_scheduled, job)
+            next_due = min((job.next_run for job in self.jobs.values()), default=now + poll)
+            self.stop_event.wait(min(poll, max(0.0, next_due - time.time())))
+        self._pool.shutdown(wait=True)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run_scheduled(self, job):
+        try:
+            self.run_job(job)
+        finally:
+            with self._lock:
+                job.running = False
+                job.schedule_next()
+
+    # --- One run ---
+    def run_job(self, job):
+        """Runs job once (with retries) if its lease is free; returns the job_runs status."""
+        if not self._acquire_lease(job):
+            self._record(job, time.time(), 'skipped', 0, error="lease held by another scheduler")
+            return 'skipped'
+
+        started = time.time()
+        run_id = self._record(job, started, 'running', 0)
+        attempts, error, result, status = 0, None, None, 'failed'
+        try:
+            while attempts <= job.retries:
+                attempts += 1
+                try:
+                    result = job.func()
+                    status, error = 'ok', None
+                    break
+                except Exception:
+                    error = traceback.format_exc(limit=5)
+                    print(f"Job {job.name} attempt {attempts} failed:\n{error}")
+                if attempts <= job.retries:
+                    delay = job.backoff * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+                    if self.stop_event.wait(delay):
+                        status = 'cancelled'
+                        break
+        finally:
+            self._finish(run_id, started, status, attempts, error, result)
+            self._release_lease(job)
+        print(f"Job {job.name}: {status} after {attempts} attempt(s) in {time.time() - started:.1f}s")
+        return status
+
+    # --- Persistence ---
+    def _acquire_lease(self, job):
+        now = time.time()
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO job_leases(job, owner, expires_at) VALUES (?, ?, ?) "
+                         "ON CONFLICT(job) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                         "WHERE job_leases.expires_at < ? OR job_leases.owner = ?",
+                         (job.name, self.owner, now + job.lease, now, self.owner))
+            owner = conn.execute("SELECT owner FROM job_leases WHERE job = ?", (job.name,)).fetchone()[0]
+        return owner == self.owner
+
+    def _release_lease(self, job):
+        try:
+            with db.transaction() as conn:
+                conn.execute("DELETE FROM job_leases WHERE job = ? AND owner = ?", (job.name, self.owner))
+        except sqlite3.Error as e: # the lease still expires on its own
+            print(f"Job {job.name}: could not release lease: {e!r}")
+
+    def _record(self, job, started, status, attempts, error=None):
+        with db.transaction() as conn:
+            cursor = conn.execute("INSERT INTO job_runs(job, started_at, status, attempts, error) VALUES (?, ?, ?, ?, ?)",
+                                  (job.name, started, status, attempts, error))
+        return cursor.lastrowid
+
+    def _finish(self, run_id, started, status, attempts, error, result):
+        finished = time.time()
+        with db.transaction() as conn:
+            conn.execute("UPDATE job_runs SET finished_at = ?, seconds = ?, status = ?, attempts = ?, error = ?, result = ? WHERE id = ?",
+                         (finished, finished - started, status, attempts, error,
+                          json.dumps(result, default=str) if result is not None else None, run_id))
+
+
+def recent_runs(conn, job=None, limit=20):
+    """Latest job_runs rows, newest first, optionally for one job."""
+    sql = "SELECT job, started_at, seconds, status, attempts, error, result FROM job_runs"
+    params = ()
+    if job:
+        sql += " WHERE job = ?"
+        params = (job,)
+    return conn.execute(sql + " ORDER BY started_at DESC LIMIT ?", params + (limit,)).fetchall()
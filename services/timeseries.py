@@ -0,0 +1,168 @@
+# runtimes_app/services/timeseries.py
+
+import fcntl
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from services import db
+
+# Each series is a pair of column files under the store directory:
+#   <name>.date   int32 days since 1970-01-01, strictly increasing
+#   <name>.value  float64
+# Readers memory-map them and slice the tail without copying or parsing.
+# Writers hold an exclusive flock on <name>.lock: revised points are
+# overwritten in place and new ones appended (values before dates, so the
+# date file never gets ahead). A write that lands before the last stored
+# point (e.g. a longer price history) rewrites both files and renames them
+# into place. Readers remap under a shared lock when either file changed.
+STORE_DIR = os.environ.get('TIMESERIES_DIR', db.DB_FILE + '.series')
+DATE_DTYPE = np.dtype('<i4')
+VALUE_DTYPE = np.dtype('<f8')
+_NAME = re.compile(r"^[\w .-]+(/[\w .-]+)*$")
+
+
+def to_days(dates):
+    """Dates (ISO strings, datetime64, date objects) -> int32 days since the epoch."""
+    return np.asarray(dates, dtype='datetime64[D]').astype(DATE_DTYPE)
+
+
+class SeriesStore:
+    """Append-only, memory-mapped float64 series keyed by name (e.g. 'fred/CPI', 'prices/NVDA/close')."""
+
+    def __init__(self, root=None):
+        self.root = root or STORE_DIR
+        self._maps = {} # name -> (file identities, dates, values)
+        self._lock = threading.Lock()
+
+    def _path(self, name, suffix):
+        if not _NAME.match(name) or '..' in name.split('/'):
+            raise ValueError(f"Invalid series name {name!r}")
+        return os.path.join(self.root, f"{name}.{suffix}")
+
+    @contextmanager
+    def _flock(self, name, mode):
+        path = self._path(name, 'lock')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as f:
+            fcntl.flock(f, mode)
+            yield # closing the file releases the lock
+
+    @staticmethod
+    def _identity(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size
+
+    # --- Reads ---
+    def _mapped(self, name):
+        date_path, value_path = self._path(name, 'date'), self._path(name, 'value')
+        identity = (self._identity(date_path), self._identity(value_path))
+        cached = self._maps.get(name)
+        if cached is not None and cached[0] == identity:
+            return cached[1], cached[2]
+        if identity[0] is None or identity[1] is None:
+            return np.empty(0, DATE_DTYPE), np.empty(0, VALUE_DTYPE)
+        with self._flock(name, fcntl.LOCK_SH):
+            identity = (self._identity(date_path), self._identity(value_path))
+            n = min(identity[0][1] // DATE_DTYPE.itemsize, identity[1][1] // VALUE_DTYPE.itemsize)
+            if n == 0:
+                return np.empty(0, DATE_DTYPE), np.empty(0, VALUE_DTYPE)
+            dates = np.memmap(date_path, DATE_DTYPE, mode='r', shape=(n,))
+            values = np.memmap(value_path, VALUE_DTYPE, mode='r', shape=(n,))
+        with self._lock:
+            self._maps[name] = (identity, dates, values)
+        return dates, values
+
+    def read(self, name, last=None, start=None, end=None):
+        """
+        (dates, values) views of a series, optionally limited to start..end
+        (inclusive) and then to the last N points. Empty arrays if missing.
+        The arrays are read-only and share memory with the files.
+        """
+        dates, values = self._mapped(name)
+        lo, hi = 0, len(dates)
+        if start is not None:
+            lo = int(np.searchsorted(dates, to_days(start), 'left'))
+        if end is not None:
+            hi = int(np.searchsorted(dates, to_days(end), 'right'))
+        if last is not None:
+            lo = max(lo, hi - last)
+        return dates[lo:hi], values[lo:hi]
+
+    def last_date(self, name):
+        """Last stored date as datetime64[D], or None."""
+        dates, _ = self._mapped(name)
+        return dates[-1].astype('datetime64[D]') if len(dates) else None
+
+    def names(self, prefix=''):
+        found = []
+        for directory, _, files in os.walk(os.path.join(self.root, prefix)):
+            for file in files:
+                if file.endswith('.date'):
+                    found.append(os.path.relpath(os.path.join(directory, file[:-5]), self.root).replace(os.sep, '/'))
+        return sorted(found)
+
+    # --- Writes ---
+    def write(self, name, dates, values):
+        """
+        Merges points into a series: dates already stored get the new value,
+        later ones are appended. Returns the number of points written.
+        """
+        dates, values = to_days(dates), np.asarray(values, dtype=VALUE_DTYPE)
+        order = np.argsort(dates, kind='stable')
+        dates, values = dates[order], values[order]
+        keep = np.append(dates[1:] != dates[:-1], True) # last value wins for repeated dates
+        dates, values = dates[keep], values[keep]
+        if not len(dates):
+            return 0
+
+        date_path, value_path = self._path(name, 'date'), self._path(name, 'value')
+        with self._flock(name, fcntl.LOCK_EX):
+            stored = np.fromfile(date_path, DATE_DTYPE) if os.path.exists(date_path) else np.empty(0, DATE_DTYPE)
+            pos = int(np.searchsorted(stored, dates[0]))
+            overlap = stored[pos:]
+            if len(overlap) <= len(dates) and np.array_equal(overlap, dates[:len(overlap)]):
+                # The common case: a revised tail plus new points
+                with open(value_path, 'r+b' if os.path.exists(value_path) else 'wb') as f:
+                    f.seek(pos * VALUE_DTYPE.itemsize)
+                    f.write(values.tobytes())
+                with open(date_path, 'ab') as f:
+                    f.write(dates[len(overlap):].tobytes())
+            else:
+                self._rewrite(date_path, value_path, stored, dates, values)
+        return len(dates)
+
+    @staticmethod
+    def _rewrite(date_path, value_path, stored, dates, values):
+        old_values = np.fromfile(value_path, VALUE_DTYPE)[:len(stored)]
+        merged = np.union1d(stored, dates)
+        merged_values = np.full(len(merged), np.nan)
+        merged_values[np.searchsorted(merged, stored)] = old_values
+        merged_values[np.searchsorted(merged, dates)] = values
+        for path, array in ((value_path, merged_values), (date_path, merged.astype(DATE_DTYPE))):
+            array.tofile(path + '.tmp')
+            os.replace(path + '.tmp', path)
+
+    def get_marker(self, name):
+        """A small text marker (e.g. the source data version a group was synced from)."""
+        try:
+            with open(self._path(name, 'marker')) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set_marker(self, name, value):
+        path = self._path(name, 'marker')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            f.write(value)
+        os.replace(path + '.tmp', path)
+
+
+store = SeriesStore()
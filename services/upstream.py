@@ -0,0 +1,287 @@
+# runtimes_app/services/upstream.py
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services import metrics
+
+# Every call to Twelve Data and FRED goes through an UpstreamClient:
+#   - one keep-alive session per client with a bounded connection pool
+#   - strict (connect, read) timeouts, so a stalled upstream can't pin a worker
+#   - up to RETRIES retries of connection errors, timeouts, 429 and 5xx with
+#     full-jitter exponential backoff (Retry-After is honoured when short)
+#   - a token bucket per API matching the provider's quota; a call waits at
+#     most RATE_LIMIT_MAX_WAIT_S for a token and otherwise fails fast. Callers
+#     with their own budget (the live feed's price poll) draw from a separate
+#     bucket, so neither can spend the other's share
+#   - a circuit breaker: after BREAKER_FAILURES failed calls in a row the host
+#     is skipped for BREAKER_COOLDOWN_S, then one probe call decides whether
+#     it closes again. Callers (PriceCache) serve stale data meanwhile.
+# Buckets live in each process, so every gunicorn worker gets 1/WEB_CONCURRENCY
+# of the plan's quota (gunicorn.conf.py exports the worker count; flask run is
+# one process).
+CONNECT_TIMEOUT_S = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT_S', 3.05))
+READ_TIMEOUT_S = float(os.environ.get('UPSTREAM_READ_TIMEOUT_S', 10))
+RETRIES = 2
+BACKOFF_BASE_S = 0.2
+BACKOFF_CAP_S = 2.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_MAX_WAIT_S = 2.0
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN_S = 30.0
+POOL_SIZE = 16
+
+# Point at a local stub server for testing, e.g. TWELVEDATA_API_URL=http://127.0.0.1:8001/twelvedata
+TWELVEDATA_API_URL = os.environ.get('TWELVEDATA_API_URL', 'https://api.twelvedata.com')
+FRED_API_URL = os.environ.get('FRED_API_URL', 'https://api.stlouisfed.org/fred')
+# Twelve Data's Basic plan allows 8 API credits a minute (one per symbol in a
+# batch request), of which TWELVEDATA_FEED_SHARE is kept for the live feed's
+# poll and the rest for page and API requests; FRED allows 120 requests a
+# minute per key and is only called by the scheduler.
+TWELVEDATA_CREDITS_PER_MINUTE = float(os.environ.get('TWELVEDATA_CREDITS_PER_MINUTE', 8))
+TWELVEDATA_FEED_SHARE = float(os.environ.get('TWELVEDATA_FEED_SHARE', 0.25))
+FRED_REQUESTS_PER_MINUTE = float(os.environ.get('FRED_REQUESTS_PER_MINUTE', 120))
+WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+
+
+class UpstreamError(Exception):
+    """An upstream call failed: retries exhausted, quota exceeded or circuit open."""
+
+
+class RateLimited(UpstreamError):
+    pass
+
+
+class CircuitOpen(UpstreamError):
+    pass
+
+
+class UpstreamHTTPError(UpstreamError):
+    """The upstream refused the request itself (a 4xx other than 429)."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class RateLimiter:
+    """
+    Token bucket: limit tokens per period, bursting up to limit. A call costing
+    more than the bucket holds waits for a full one and leaves it in debt, so
+    the calls after it wait until the whole cost is paid back.
+    """
+
+    def __init__(self, limit, period=60.0):
+        self.capacity = limit
+        self.rate = limit / period
+        self._tokens = limit
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost=1, max_wait=RATE_LIMIT_MAX_WAIT_S):
+        """Takes cost tokens, sleeping up to max_wait for them; raises RateLimited otherwise."""
+        needed = min(cost, self.capacity)
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= cost
+                    return
+                wait = (needed - self._tokens) / self.rate
+            if now + wait > deadline:
+                raise RateLimited(f"quota exhausted; next {cost:g} credits in {wait:.1f}s")
+            time.sleep(wait)
+
+    def wait_time(self, cost=1):
+        """Seconds until cost tokens are available."""
+        with self._lock:
+            tokens = min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+            return max(0.0, (min(cost, self.capacity) - tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """closed -> open after `failures` consecutive failures -> half-open (one probe) after `cooldown`."""
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN_S):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self._failed = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go ahead; in half-open state only the first caller probes."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = 'half-open'
+                return True
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.state, self._failed = 'closed', 0
+                return
+            self._failed += 1
+            if self.state == 'half-open' or self._failed >= self.failures:
+                self.state, self._opened_at = 'open', time.monotonic()
+
+    def cancel_probe(self):
+        """A half-open probe that never reached the upstream; the next caller probes instead."""
+        with self._lock:
+            if self.state == 'half-open':
+                self.state = 'open'
+
+    def retry_in(self):
+        with self._lock:
+            return max(0.0, self._opened_at + self.cooldown - time.monotonic()) if self.state == 'open' else 0.0
+
+    def current_state(self):
+        with self._lock:
+            return self.state
+
+
+def _backoff(attempt, retry_after=None):
+    """Full jitter: uniform in [0, min(cap, base * 2^attempt)], or the server's Retry-After if it is short."""
+    if retry_after is not None and retry_after <= BACKOFF_CAP_S:
+        return retry_after
+    return random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class UpstreamClient:
+    """
+    JSON GETs against one API. body_status(data) may map an error reported in
+    a 200 response body (Twelve Data does this) to an HTTP-like status code so
+    it is retried and counted like the real thing. budgets names extra
+    RateLimiters a call can draw from instead of limiter.
+    """
+
+    def __init__(self, service, base_url, limiter=None, breaker=None, connect_timeout=CONNECT_TIMEOUT_S,
+                 read_timeout=READ_TIMEOUT_S, retries=RETRIES, pool_size=POOL_SIZE, body_status=None, budgets=None):
+        self.service = service
+        self.base_url = base_url.rstrip('/')
+        self.limiter = limiter
+        self.budgets = budgets or {}
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.body_status = body_status
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._counters = {'calls': 0, 'retries': 0, 'failures': 0, 'rejected': 0, 'rate_limited': 0, 'refused': 0}
+        self._lock = threading.Lock()
+        metrics.register_upstream(service, self.stats)
+
+    def get_json(self, path, params=None, cost=1, max_wait=RATE_LIMIT_MAX_WAIT_S, budget=None):
+        """
+        The decoded JSON body of GET base_url + path; raises UpstreamError
+        when it can't be had. cost tokens come from budgets[budget], or from
+        limiter when no budget is named.
+        """
+        self._count('calls')
+        if not self.breaker.allow():
+            self._count('rejected')
+            metrics.upstream_seconds.observe(0.0, self.service, 'rejected')
+            raise CircuitOpen(f"{self.service} circuit open; retry in {self.breaker.retry_in():.0f}s")
+        limiter = self.budgets[budget] if budget is not None else self.limiter
+        if limiter is not None:
+            try:
+                limiter.acquire(cost, max_wait)
+            except RateLimited:
+                self.breaker.cancel_probe()
+                self._count('rate_limited')
+                metrics.upstream_seconds.observe(0.0, self.service, 'rate_limited')
+                raise
+
+        error = None
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    retry_after = getattr(error, 'retry_after', None)
+                    if retry_after is not None and retry_after > BACKOFF_CAP_S:
+                        break # the upstream asked for a longer pause than a request can wait
+                    self._count('retries')
+                    time.sleep(_backoff(attempt - 1, retry_after))
+                try:
+                    with metrics.upstream(self.service):
+                        response = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+                        status = response.status_code
+                        data = response.json() if status < 400 else None
+                        if data is not None and self.body_status is not None:
+                            status = self.body_status(data) or status
+                        if status in RETRY_STATUSES:
+                            error = UpstreamError(f"{self.service} {path}: HTTP {status}")
+                            error.retry_after = _retry_after(response)
+                            raise error
+                except UpstreamError:
+                    continue
+                except (requests.RequestException, ValueError) as e: # ValueError: a truncated or non-JSON body
+                    error = UpstreamError(f"{self.service} {path}: {e!r}")
+                    continue
+                self.breaker.record(True) # a refused request still reached a healthy upstream
+                if response.status_code >= 400:
+                    self._count('refused')
+                    raise UpstreamHTTPError(f"{self.service} {path}: HTTP {response.status_code}", response.status_code)
+                return data
+        except BaseException:
+            self.breaker.cancel_probe()
+            raise
+
+        self._count('failures')
+        self.breaker.record(False)
+        raise error
+
+    def wait_time(self, cost=1, budget=None):
+        """Seconds until a call costing cost could go ahead, by quota and circuit."""
+        limiter = self.budgets[budget] if budget is not None else self.limiter
+        return max(limiter.wait_time(cost) if limiter is not None else 0.0, self.breaker.retry_in())
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return dict(counters, circuit=self.breaker.current_state())
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+
+def _twelvedata_status(data):
+    """Twelve Data answers errors (429 quota, 5xx) with HTTP 200 and {'status': 'error', 'code': ...}."""
+    if isinstance(data, dict) and data.get('status') == 'error':
+        return data.get('code')
+    return None
+
+
+_twelvedata_credits = TWELVEDATA_CREDITS_PER_MINUTE / WORKERS
+twelvedata = UpstreamClient('twelvedata', TWELVEDATA_API_URL, RateLimiter(_twelvedata_credits * (1 - TWELVEDATA_FEED_SHARE)),
+                            body_status=_twelvedata_status,
+                            budgets={'feed': RateLimiter(_twelvedata_credits * TWELVEDATA_FEED_SHARE)})
+fred = UpstreamClient('fred', FRED_API_URL, RateLimiter(FRED_REQUESTS_PER_MINUTE), read_timeout=30)
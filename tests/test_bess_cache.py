@@ -0,0 +1,60 @@
+# runtimes_app/tests/test_bess_cache.py
+# Run from the repo root: python -m pytest tests
+
+import json
+
+from services import db
+from services.bess_cache import BessResultCache, canonical_inputs, input_key
+from services.bess_model import PRESET_CASES
+from services.migrations import migrate
+
+BASE = PRESET_CASES['base']
+
+
+def counting_compute():
+    calls = []
+    def compute(canonical):
+        calls.append(canonical)
+        return json.dumps(canonical)
+    return compute, calls
+
+
+def test_equivalent_inputs_share_a_key():
+    variants = [
+        BASE,
+        dict(reversed(list(BASE.items()))),
+        {**BASE, 'asset_life': 20.0, 'BESS_size_MW': 10.0},
+        {**BASE, 'overbuild': 0.1 + 0.05},
+    ]
+    assert len({input_key(canonical_inputs(inputs)) for inputs in variants}) == 1
+    assert input_key(canonical_inputs({**BASE, 'opex_esc': -0.0})) == input_key(canonical_inputs({**BASE, 'opex_esc': 0}))
+    assert input_key(canonical_inputs({**BASE, 'overbuild': 0.16})) != input_key(canonical_inputs(BASE))
+
+
+def test_computes_once_per_key_and_evicts_least_recently_used():
+    compute, calls = counting_compute()
+    good, bad = PRESET_CASES['good'], PRESET_CASES['bad']
+    size = {name: len(compute(canonical_inputs(PRESET_CASES[name]))) for name in PRESET_CASES}
+    calls.clear()
+    cache = BessResultCache(compute, max_bytes=size['base'] + max(size['good'], size['bad'])) # room for two
+
+    assert cache.get(BASE) == cache.get({**BASE}) == json.dumps(canonical_inputs(BASE))
+    cache.get(good)
+    cache.get(BASE) # now the most recently used
+    cache.get(bad) # evicts good
+    cache.get(BASE)
+    cache.get(good)
+    assert len(calls) == 4
+    assert cache.stats()['evictions'] == 2
+
+
+def test_results_persist_for_other_workers(tmp_path, monkeypatch):
+    path = str(tmp_path / 'headlines.db')
+    migrate(path)
+    monkeypatch.setattr(db, 'DB_FILE', path)
+    compute, calls = counting_compute()
+    BessResultCache(compute, persist=True).get(BASE)
+
+    other = BessResultCache(compute, persist=True)
+    assert other.get(BASE) == json.dumps(canonical_inputs(BASE))
+    assert len(calls) == 1 and other.stats()['db_hits'] == 1
@@ -0,0 +1,43 @@
+# runtimes_app/tests/test_bess_model.py
+# Run from the repo root: python -m pytest tests
+
+import numpy as np
+import pytest
+
+from routes.bess_routes import calculate_bess_financials
+from services.bess_model import BESS_PARAMS, PRESET_CASES, evaluate_scenarios, expand_grid, scenarios_to_params
+
+BASE = PRESET_CASES['base']
+
+
+def test_batch_matches_the_single_case_model():
+    scenarios = [PRESET_CASES['good'], PRESET_CASES['bad'], {'asset_life': 5, 't4_usd_MWh': 40}]
+    results = evaluate_scenarios(scenarios_to_params(BASE, scenarios))
+    for scenario, irr in zip(scenarios, results['irr']):
+        inputs = {**BASE, **scenario}
+        _, final_irr = calculate_bess_financials(*(inputs[name] for name in BESS_PARAMS))
+        assert final_irr == ('N/A' if np.isnan(irr) else f"{irr:.2f}%")
+
+
+def test_grid_is_the_cartesian_product_in_c_order():
+    params, axes = expand_grid(BASE, {'duration': [2, 4], 'rte': {'start': 0.8, 'stop': 0.9, 'num': 3}})
+    assert [len(values) for values in axes.values()] == [2, 3]
+    assert params['duration'].tolist() == [2, 2, 2, 4, 4, 4]
+    assert params['rte'] == pytest.approx([0.8, 0.85, 0.9] * 2)
+    assert params['opex_esc'] == BASE['opex_esc']
+
+
+@pytest.mark.parametrize('grid, error', [
+    ({'duration': []}, 'non-empty list'),
+    ({'duration': 4}, 'non-empty list'),
+    ({'duration': [[1, 2], [3, 4]]}, 'flat list of numbers'),
+    ({'duration': ['a']}, 'flat list of numbers'),
+    ({'duration': {'start': 1, 'stop': 4}}, 'num must be a positive integer'),
+    ({'duration': {'start': 1, 'stop': 4, 'num': True}}, 'num must be a positive integer'),
+    ({'duration': {'start': '1', 'stop': 4, 'num': 2}}, 'start and stop must be numbers'),
+    ({'duration': {'start': 1, 'stop': 4, 'num': 10 ** 12}, 'rte': {'start': 0.8, 'stop': 0.9, 'num': 10 ** 12}},
+     'grid points requested'),
+])
+def test_malformed_grids_are_rejected_before_any_axis_is_built(grid, error):
+    with pytest.raises(ValueError, match=error):
+        expand_grid(BASE, grid)
@@ -0,0 +1,46 @@
+# runtimes_app/tests/test_bess_montecarlo.py
+# Run from the repo root: python -m pytest tests
+
+import pytest
+
+from routes.bess_routes import _parse_discount_rate
+from services.bess_montecarlo import validate_distributions
+
+NORMAL = {'dist': 'normal', 'mean': 0.02, 'std': 0.005}
+
+
+def test_valid_distributions_have_no_errors():
+    assert validate_distributions({
+        'degradation': {**NORMAL, 'min': 0, 'max': 0.2},
+        'rte': {'dist': 'triangular', 'low': 0.85, 'mode': 0.9, 'high': 0.92},
+        'spread': {'dist': 'uniform', 'low': 80, 'high': 120},
+    }) == []
+
+
+@pytest.mark.parametrize('distributions, error', [
+    (['degradation'], 'must map parameter names'),
+    ({'asset_life': NORMAL}, 'cannot be sampled'),
+    ({'degradation': {'dist': 'beta'}}, 'dist must be one of'),
+    ({'degradation': {**NORMAL, 'std': '0.005'}}, 'needs numeric std'),
+    ({'degradation': {**NORMAL, 'mean': True}}, 'needs numeric mean'),
+    ({'degradation': {**NORMAL, 'min': None}}, 'needs numeric min'),
+    ({'degradation': {**NORMAL, 'std': -1}}, 'std must not be negative'),
+    ({'rte': {'dist': 'uniform', 'low': 0.95, 'high': 0.9}}, 'low must not exceed high'),
+    ({'rte': {'dist': 'triangular', 'low': 0.9, 'mode': 0.95, 'high': 0.92}}, 'low <= mode <= high'),
+    ({'rte': {'dist': 'triangular', 'low': 0.9, 'mode': 0.9, 'high': 0.9}}, 'low < high'),
+    ({'degradation': {**NORMAL, 'min': 0.1, 'max': 0}}, 'min must not exceed max'),
+])
+def test_invalid_distributions_are_reported_before_the_job_starts(distributions, error):
+    (message,) = validate_distributions(distributions)
+    assert error in message
+
+
+@pytest.mark.parametrize('data, rate', [({}, 0.08), ({'discount_rate': 0.1}, 0.1), ({'discount_rate': 0}, 0.0)])
+def test_discount_rate(data, rate):
+    assert _parse_discount_rate(data) == (rate, None)
+
+
+@pytest.mark.parametrize('value', ['x', None, True, -0.1, 2, float('nan')])
+def test_invalid_discount_rate(value):
+    rate, error = _parse_discount_rate({'discount_rate': value})
+    assert rate is None and 'discount_rate' in error
@@ -0,0 +1,46 @@
+# runtimes_app/tests/test_irr.py
+# Run from the repo root: python -m pytest tests
+
+import numpy as np
+import numpy_financial as npf
+import pytest
+
+from services.irr import irr_rows, prefix_irr
+
+ROWS = {
+    'single change': [-100, 30, 40, 50],
+    'single change, reversed signs': [100, -30, -40, -50],
+    'single change with gaps and padding': [-100, 0, 0, 150, 0],
+    'zero irr': [-100, 100],
+    'two changes': [-100, 230, -132],
+    'three changes, negative irr': [10, -30, 30, -5],
+    'no root: all negative': [-100, -10, -5],
+    'no root: all positive': [100, 10, 5],
+    'no root: all zero': [0, 0, 0],
+    'no root: two changes': [-1, 3, -3],
+}
+
+
+@pytest.mark.parametrize('flows', ROWS.values(), ids=ROWS.keys())
+def test_matches_numpy_financial(flows):
+    expected = npf.irr(flows)
+    assert irr_rows([flows])[0] == pytest.approx(expected, rel=1e-9, nan_ok=True)
+
+
+def test_rows_are_solved_independently():
+    width = max(len(flows) for flows in ROWS.values())
+    padded = [flows + [0] * (width - len(flows)) for flows in ROWS.values()]
+    expected = [npf.irr(flows) for flows in ROWS.values()]
+    assert irr_rows(padded) == pytest.approx(expected, rel=1e-9, nan_ok=True)
+
+
+@pytest.mark.parametrize('flows', [[-100, np.nan, 50], [np.nan] * 3, [-np.inf, 60, 60]])
+def test_rows_with_nan_or_inf_have_no_irr(flows):
+    # numpy_financial raises LinAlgError on these; a batch row must not fail the batch
+    assert np.isnan(irr_rows([flows, [-100, 60, 60]])).tolist() == [True, False]
+
+
+def test_prefix_irr_solves_every_prefix():
+    flows = [-1000, 100, 250, 400, 400, -50, 300]
+    expected = [npf.irr(flows[:n]) for n in range(1, len(flows) + 1)]
+    assert prefix_irr(flows) == pytest.approx(expected, rel=1e-9, nan_ok=True)
@@ -0,0 +1,85 @@
+# runtimes_app/tests/test_live_feed.py
+# Two LiveFeed instances on one database stand in for two gunicorn workers.
+# Run from the repo root: python -m pytest tests
+
+import pytest
+
+from services import db
+from services.headlines import insert_new_headlines
+from services.live_feed import LiveFeed, StreamLimitReached
+from services.migrations import migrate
+
+TABLES = {'reuters_headlines': 'headline', 'reuters_headlines_summary': 'summary'}
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'headlines.db')
+    migrate(path)
+    monkeypatch.setattr(db, 'DB_FILE', path)
+    # The tests poll by hand; a producer thread would outlive the patched DB_FILE
+    monkeypatch.setattr(LiveFeed, '_ensure_started', lambda self: None)
+    return path
+
+
+def add_headlines(db_file, headlines, now='2025-06-18 09:00:00'):
+    conn = db.connect(db_file)
+    with conn:
+        insert_new_headlines(conn, 'reuters_headlines', headlines, now)
+    conn.close()
+
+
+def drain(subscriber):
+    events = []
+    while not subscriber.queue.empty():
+        events.append(subscriber.queue.get_nowait())
+    return events
+
+
+def feed(**kwargs):
+    return LiveFeed(lambda symbols: {}, TABLES, **kwargs)
+
+
+def test_reconnect_to_another_worker_replays_missed_rows(db_file):
+    add_headlines(db_file, ['Already on the page'])
+    first, second = feed(), feed()
+    subscriber = first.subscribe({'NVDA'})
+    (snapshot,) = drain(subscriber)
+    first.unsubscribe(subscriber)
+
+    add_headlines(db_file, ['Missed one', 'Missed two'])
+    first._poll_headlines() # the first worker publishes them after the client left
+    events = drain(second.subscribe({'NVDA'}, snapshot['id']))
+
+    assert [e['event'] for e in events] == ['headline', 'headline', 'snapshot']
+    assert [e['data']['news'] for e in events[:2]] == ['Missed one', 'Missed two']
+    assert events[-1]['id'] == second.stats()['position'] == first.stats()['position']
+
+
+def test_reconnect_ahead_of_the_worker_skips_rows_already_seen(db_file):
+    first, second = feed(), feed()
+    second.subscribe({'NVDA'})
+    add_headlines(db_file, ['Seen on the first worker'])
+    first._poll_headlines()
+    first._poll_headlines()
+    position = first.stats()['position']
+
+    events = drain(second.subscribe({'NVDA'}, position))
+    assert [e['event'] for e in events] == ['snapshot']
+    assert events[0]['id'] == position
+
+
+def test_unknown_event_id_gets_only_a_snapshot(db_file):
+    add_headlines(db_file, ['Old news'])
+    events = drain(feed().subscribe({'NVDA'}, 'a1b2c3d4-17'))
+    assert [e['event'] for e in events] == ['snapshot']
+
+
+def test_subscribers_past_the_cap_are_rejected(db_file):
+    live = feed(max_subscribers=1)
+    subscriber = live.subscribe({'NVDA'})
+    with pytest.raises(StreamLimitReached):
+        live.subscribe({'AAPL'})
+    live.unsubscribe(subscriber)
+    live.subscribe({'AAPL'})
+    assert live.stats()['rejected'] == 1
@@ -0,0 +1,33 @@
+# runtimes_app/tests/test_metrics.py
+# Run from the repo root: python -m pytest tests
+
+from services import metrics
+
+
+def worker(requests, entries):
+    return [
+        ['http_request_duration_seconds', 'histogram', 'Latency.',
+         [('http_request_duration_seconds_count', [('endpoint', '/'), ('status', '200')], requests)]],
+        ['cache_entries', 'gauge', 'Cache entries.', [('cache_entries', [('cache', 'price')], entries)]],
+    ]
+
+
+def test_merge_sums_counters_and_labels_gauges_by_live_worker():
+    merged = metrics.merge({101: worker(3, 7), 102: worker(4, 9), 103: worker(5, 11)}, live_pids={101, 102})
+    text = metrics.render(merged)
+
+    # 103 has exited: its requests still count, its cache is gone
+    assert 'http_request_duration_seconds_count{endpoint="/",status="200"} 12\n' in text
+    assert 'cache_entries{cache="price",pid="101"} 7\n' in text
+    assert 'cache_entries{cache="price",pid="102"} 9\n' in text
+    assert 'pid="103"' not in text
+
+
+def test_flush_and_expose_read_every_worker_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, '_alive', lambda pid: True)
+    (tmp_path / '1.json').write_text('[["jobs_total", "counter", "Jobs.", [["jobs_total", [], 2]]]]')
+    metrics.flush()
+    text = metrics.expose()
+    assert 'jobs_total 2\n' in text
+    assert '# TYPE http_request_duration_seconds histogram' in text
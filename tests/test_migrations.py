@@ -0,0 +1,99 @@
+# runtimes_app/tests/test_migrations.py
+# Run from the repo root: python -m pytest tests
+
+import sqlite3
+
+import pytest
+
+from services.migrations import LATEST_VERSION, migrate
+
+# The schema the app created before services/migrations.py existed
+LEGACY_SCHEMA = """
+    CREATE TABLE reuters_headlines(timestamp TEXT, news TEXT);
+    CREATE TABLE CNBC_headlines(timestamp TEXT, news TEXT);
+    CREATE TABLE reuters_headlines_summary(timestamp TEXT, news TEXT);
+    CREATE TABLE CNBC_headlines_summary(timestamp TEXT, news TEXT);
+    CREATE TABLE posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        content TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO reuters_headlines VALUES
+        ('2025-06-18 09:00:00.638050', 'Fed holds rates'),
+        ('2025-06-18 10:00:00.120000', 'Fed holds rates'),
+        ('2025-06-18 11:00:00.000001', 'Oil climbs');
+    INSERT INTO posts (title, content) VALUES ('Hello', '<p>First post</p>');
+"""
+
+
+def schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(conn.execute("SELECT type, name, sql FROM sqlite_master")), conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def query(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def set_version(path, version):
+    conn = sqlite3.connect(path)
+    conn.execute(f'PRAGMA user_version = {version}')
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def fresh(tmp_path):
+    return str(tmp_path / 'fresh.db')
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+    return path
+
+
+def test_fresh_database_migrates_once(fresh):
+    assert migrate(fresh) == LATEST_VERSION
+    migrated = schema(fresh)
+    assert migrate(fresh) == LATEST_VERSION
+    assert schema(fresh) == migrated
+
+
+def test_existing_database_keeps_its_rows_and_gets_the_fresh_schema(fresh, legacy):
+    migrate(fresh)
+    assert migrate(legacy) == LATEST_VERSION
+    objects = lambda path: {(kind, name) for kind, name, _ in schema(path)[0]}
+    assert objects(legacy) == objects(fresh)
+
+    # Both copies of the repeat are kept, only the first can be matched again
+    assert query(legacy, "SELECT timestamp, news, news_hash IS NOT NULL FROM reuters_headlines ORDER BY rowid") == [
+        ('2025-06-18 09:00:00', 'Fed holds rates', 1),
+        ('2025-06-18 10:00:00', 'Fed holds rates', 0),
+        ('2025-06-18 11:00:00', 'Oil climbs', 1),
+    ]
+    assert query(legacy, "SELECT content_md, excerpt FROM posts") == [('<p>First post</p>', 'First post')]
+
+
+@pytest.mark.parametrize('from_version', [0, 1, 6])
+def test_every_step_tolerates_objects_it_already_created(legacy, from_version):
+    # headlines.db predates the migrations, so every step must cope with finding its objects already there
+    migrate(legacy)
+    migrated = schema(legacy)
+    rows = query(legacy, "SELECT * FROM reuters_headlines ORDER BY rowid")
+    set_version(legacy, from_version)
+
+    assert migrate(legacy) == LATEST_VERSION
+    assert schema(legacy) == migrated
+    assert query(legacy, "SELECT * FROM reuters_headlines ORDER BY rowid") == rows
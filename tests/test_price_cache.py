@@ -0,0 +1,81 @@
+# runtimes_app/tests/test_price_cache.py
+# Run from the repo root: python -m pytest tests
+
+import threading
+import time
+
+import pytest
+
+from services import db, price_cache
+from services.migrations import migrate
+from services.price_cache import PriceCache
+from services.upstream import RateLimited
+
+BARS = [{'datetime': '2025-06-18', 'close': '145.48'}]
+
+
+@pytest.fixture
+def expired(monkeypatch):
+    """Entries are stored already expired, so the next lookup fetches again."""
+    monkeypatch.setattr(price_cache, 'expiry_for', lambda interval: time.time() - 1)
+
+
+def test_concurrent_misses_share_one_fetch():
+    calls, release = [], threading.Event()
+    def fetch(symbol, interval, outputsize):
+        calls.append(symbol)
+        release.wait(5)
+        return BARS
+    cache = PriceCache(fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('nvda'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['NVDA']
+    assert results == [BARS] * 8
+    assert cache.get('NVDA') == BARS and cache.stats()['hits'] == 1
+
+
+def test_expired_values_stand_in_while_upstream_is_down(expired):
+    calls = []
+    def fetch(symbol, interval, outputsize):
+        calls.append(symbol)
+        if len(calls) > 1:
+            raise RateLimited('quota spent')
+        return BARS
+    cache = PriceCache(fetch, stale_errors=(RateLimited,))
+
+    assert cache.get('NVDA') == BARS
+    assert cache.get('NVDA') == BARS # refetch fails, expired entry served
+    assert cache.stats()['stale'] == 1
+    with pytest.raises(RateLimited): # nothing stored for this key
+        cache.get('AAPL')
+
+
+def test_a_restarted_worker_falls_back_to_the_database(expired, tmp_path, monkeypatch):
+    path = str(tmp_path / 'headlines.db')
+    migrate(path)
+    monkeypatch.setattr(db, 'DB_FILE', path)
+    PriceCache(lambda *key: BARS, persist=True).get('NVDA')
+
+    def down(*key):
+        raise RateLimited('quota spent')
+    assert PriceCache(down, persist=True, stale_errors=(RateLimited,)).get('NVDA') == BARS
+
+
+def test_get_many_leaves_out_failed_symbols_with_nothing_stale(expired):
+    batches = iter([{'NVDA': BARS, 'AAPL': BARS}, {'AAPL': BARS, 'BOGUS': None}])
+    cache = PriceCache(lambda symbol, *args: pytest.fail('single fetch'),
+                       batch_fetcher=lambda symbols, interval, outputsize: next(batches), stale_errors=(RateLimited,))
+    cache.get_many(['NVDA', 'AAPL'])
+
+    # NVDA failed but is stale-served, MSFT failed with nothing stored, BOGUS has no data upstream
+    results = cache.get_many(['NVDA', 'AAPL', 'MSFT', 'BOGUS'])
+    assert results == {'NVDA': BARS, 'AAPL': BARS, 'BOGUS': None}
+    assert cache.stats()['stale'] == 1
@@ -0,0 +1,55 @@
+# runtimes_app/tests/test_scheduler.py
+# Run from the repo root: python -m pytest tests
+
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+import scheduler
+import scrape_headlines
+
+ROOT = pathlib.Path(__file__).parent.parent
+SOURCES = [{'name': 'reuters'}, {'name': 'cnbc'}]
+
+
+def test_headline_job_scrapes_every_source_in_one_run_and_retries_only_failures(monkeypatch):
+    calls = []
+    outcomes = iter([
+        {'reuters': ['a', 'b'], 'cnbc': TimeoutError('slow')},
+        {'cnbc': ['c']},
+        {'reuters': ['d'], 'cnbc': ['e']},
+    ])
+    def run(sources):
+        calls.append([source['name'] for source in sources])
+        return next(outcomes)
+    monkeypatch.setattr(scrape_headlines, 'run', run)
+
+    job = scheduler.headline_job(SOURCES, retries=2)
+    with pytest.raises(RuntimeError, match='cnbc'):
+        job()
+    assert job() == {'headlines': {'cnbc': 1}}
+    assert job() == {'headlines': {'reuters': 1, 'cnbc': 1}}
+    assert calls == [['reuters', 'cnbc'], ['cnbc'], ['reuters', 'cnbc']]
+
+
+def test_headline_job_starts_over_after_its_last_retry(monkeypatch):
+    calls = []
+    def run(sources):
+        calls.append([source['name'] for source in sources])
+        return {'reuters': [], 'cnbc': TimeoutError('slow')}
+    monkeypatch.setattr(scrape_headlines, 'run', run)
+
+    job = scheduler.headline_job(SOURCES, retries=1)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            job()
+    assert calls == [['reuters', 'cnbc'], ['cnbc'], ['reuters', 'cnbc']]
+
+
+def test_once_only_accepts_known_jobs():
+    result = subprocess.run([sys.executable, 'scheduler.py', '--once', 'headlines.reuters'],
+                            cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert 'invalid choice' in result.stderr and 'headlines.reuters' in result.stderr
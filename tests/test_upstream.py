@@ -0,0 +1,53 @@
+# runtimes_app/tests/test_upstream.py
+# The upstream client against the local stub (benchmarks/stub_upstream.py).
+# Run from the repo root: python -m pytest tests
+
+import threading
+
+import pytest
+
+from benchmarks.stub_upstream import StubUpstream
+from services.upstream import RateLimited, RateLimiter, UpstreamClient, UpstreamError, UpstreamHTTPError
+
+PARAMS = {'symbol': 'NVDA', 'interval': '1day', 'outputsize': 5, 'apikey': 'stub'}
+
+
+@pytest.fixture(scope='module')
+def stub():
+    with StubUpstream(latency_ms=0) as stub:
+        yield stub
+
+
+def test_refused_request_is_an_upstream_error(stub):
+    client = UpstreamClient('test-refused', f"{stub.url}/twelvedata")
+    with pytest.raises(UpstreamHTTPError) as caught:
+        client.get_json('/no_such_endpoint')
+    assert isinstance(caught.value, UpstreamError) and caught.value.status == 404
+    stats = client.stats()
+    assert stats['refused'] == 1 and stats['failures'] == 0 and stats['circuit'] == 'closed'
+
+
+def test_budgets_are_separate(stub):
+    client = UpstreamClient('test-budgets', f"{stub.url}/twelvedata", RateLimiter(2), budgets={'feed': RateLimiter(1)})
+    client.get_json('/price', {'symbol': 'NVDA'}, max_wait=0, budget='feed')
+    with pytest.raises(RateLimited):
+        client.get_json('/price', {'symbol': 'NVDA'}, max_wait=0, budget='feed')
+    client.get_json('/time_series', PARAMS, cost=2, max_wait=0) # the feed spent none of these
+
+
+def test_call_bigger_than_the_bucket_leaves_it_in_debt():
+    limiter = RateLimiter(3)
+    limiter.acquire(8, max_wait=0) # a full bucket lets it through
+    assert limiter.wait_time(1) == pytest.approx(6 / limiter.rate, rel=0.01)
+    with pytest.raises(RateLimited):
+        limiter.acquire(1, max_wait=0)
+
+
+def test_counters_are_exact_under_concurrent_calls(stub):
+    client = UpstreamClient('test-counters', f"{stub.url}/twelvedata")
+    threads = [threading.Thread(target=lambda: [client.get_json('/time_series', PARAMS) for _ in range(25)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert client.stats()['calls'] == 200